@@ -0,0 +1,258 @@
+"""Local OHLCV bar store — compact, memory-mapped daily history on disk.
+
+Each ticker's bars live in data/bars/<ticker>/ as one fixed-dtype .npy file
+per column: day.npy (int32 day ordinals), open/high/low/close.npy (float32,
+in the provider's quote currency) and volume.npy (int64, -1 when missing).
+Files are opened memory-mapped, so indicator code can read years of history
+for hundreds of tickers without materialising per-ticker DataFrames.
+
+fetch_ohlcv reads the store first and only downloads the date range it does
+not already hold.
+"""
+
+import logging
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Array name -> (DataFrame column, on-disk dtype)
+FIELDS = {
+    "day": (None, np.int32),
+    "open": ("Open", np.float32),
+    "high": ("High", np.float32),
+    "low": ("Low", np.float32),
+    "close": ("Close", np.float32),
+    "volume": ("Volume", np.int64),
+}
+VOLUME_MISSING = -1
+
+# Relative tolerance when comparing stored closes against re-fetched closes.
+# Yahoo back-adjusts history (auto_adjust=True) on dividends and splits, so a
+# mismatch on the overlap means the stored bars have been restated.
+RESTATEMENT_TOLERANCE = 5e-4
+
+
+def ticker_dir(store_dir, sym):
+    """Return the directory holding a ticker's column files."""
+    return Path(store_dir) / sym
+
+
+def load_arrays(store_dir, sym, mmap=True):
+    """Load a ticker's column arrays, memory-mapped read-only by default.
+
+    Returns dict of array name -> np.ndarray (see FIELDS), or None if the
+    ticker has no stored history.
+    """
+    _migrate_legacy(store_dir, sym)
+    path = ticker_dir(store_dir, sym)
+    if not (path / "day.npy").exists():
+        return None
+
+    try:
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None)
+            for name in FIELDS
+        }
+    except (OSError, ValueError) as e:
+        log.warning("  %s: unreadable bar store files (%s), ignoring", sym, e)
+        return None
+
+    if len({len(a) for a in arrays.values()}) != 1:
+        log.warning("  %s: bar store columns have mismatched lengths, ignoring", sym)
+        return None
+    return arrays
+
+
+def save_arrays(store_dir, sym, arrays):
+    """Write a ticker's column arrays, replacing any existing history."""
+    path = ticker_dir(store_dir, sym)
+    path.mkdir(parents=True, exist_ok=True)
+
+    # Write then rename so an interrupted run never leaves a truncated column
+    arrays = {name: np.ascontiguousarray(arrays[name], dtype=dtype)
+              for name, (_, dtype) in FIELDS.items()}
+    for name, values in arrays.items():
+        tmp = path / f"{name}.tmp.npy"
+        np.save(tmp, values)
+        tmp.replace(path / f"{name}.npy")
+
+
+def frame_to_arrays(df, compact=True):
+    """Convert an OHLCV DataFrame to store arrays (see FIELDS).
+
+    With compact=False prices and volume stay float64 (volume keeps NaN),
+    for callers that want the arrays layout without the on-disk precision.
+    """
+    df = normalize_bars(df)
+    arrays = {"day": np.array([d.toordinal() for d in df.index.date], dtype=np.int32)}
+    for name, (col, dtype) in FIELDS.items():
+        if col is None:
+            continue
+        values = df[col].to_numpy(dtype=np.float64)
+        if compact:
+            if name == "volume":
+                values = np.where(np.isnan(values), VOLUME_MISSING, values)
+            values = values.astype(dtype)
+        arrays[name] = values
+    return arrays
+
+
+def column(arrays, name):
+    """Return one column as float64, with missing volume as NaN."""
+    values = np.asarray(arrays[name], dtype=np.float64)
+    if name == "volume" and arrays[name].dtype.kind == "i":
+        values[arrays[name] == VOLUME_MISSING] = np.nan
+    return values
+
+
+def arrays_to_frame(arrays):
+    """Convert store arrays to an OHLCV DataFrame indexed by date."""
+    index = pd.DatetimeIndex(
+        [date.fromordinal(int(d)) for d in arrays["day"]], name="Date"
+    )
+    data = {col: column(arrays, name) for name, (col, _) in FIELDS.items() if col}
+    return pd.DataFrame(data, index=index)
+
+
+def load_bars(store_dir, sym):
+    """Load stored bars for a ticker as a DataFrame, or None if none stored."""
+    arrays = load_arrays(store_dir, sym)
+    if arrays is None:
+        return None
+    return arrays_to_frame(arrays)
+
+
+def save_bars(store_dir, sym, df):
+    """Write a ticker's bars to the store, replacing any existing history."""
+    save_arrays(store_dir, sym, frame_to_arrays(df))
+
+
+def append_bars(store_dir, sym, new):
+    """Merge newly fetched bars into stored history. New values win on overlap."""
+    new_arrays = frame_to_arrays(new)
+    old = load_arrays(store_dir, sym)
+    if old is None or not len(new_arrays["day"]):
+        if old is None:
+            save_arrays(store_dir, sym, new_arrays)
+        return
+
+    keep = int(np.searchsorted(old["day"], new_arrays["day"][0]))
+    merged = {name: np.concatenate([old[name][:keep], new_arrays[name]])
+              for name in FIELDS}
+    del old  # release the memory maps before the files are replaced
+    save_arrays(store_dir, sym, merged)
+
+
+def tail_frame(arrays, n):
+    """Return the last n stored bars as a DataFrame."""
+    return arrays_to_frame({name: a[-n:] for name, a in arrays.items()})
+
+
+def window(arrays, period, today=None):
+    """Slice arrays to the bars covered by a yfinance-style period (views, no copy).
+
+    If today is given the period ends there and later bars are dropped.
+    """
+    if today is not None:
+        end = int(np.searchsorted(arrays["day"], today.toordinal(), side="right"))
+        arrays = {name: a[:end] for name, a in arrays.items()}
+    start = period_start(period, today)
+    if start is None:
+        return arrays
+    first = int(np.searchsorted(arrays["day"], start.toordinal()))
+    return {name: a[first:] for name, a in arrays.items()}
+
+
+def load_window(store_dir, sym, period, as_of=None):
+    """load_arrays sliced to period ending at as_of (default today).
+
+    Returns None if nothing readable is stored.
+    """
+    arrays = load_arrays(store_dir, sym)
+    return window(arrays, period, as_of) if arrays is not None else None
+
+
+def normalize_bars(df):
+    """Return bars with a tz-naive, date-only, sorted and de-duplicated index."""
+    df = df[[c for c in COLUMNS if c in df.columns]].copy()
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.normalize().rename("Date")
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    return df
+
+
+def is_restated(existing, new, tolerance=RESTATEMENT_TOLERANCE):
+    """Check whether re-fetched bars disagree with stored bars on their overlap.
+
+    Returns True if any overlapping Close differs by more than the relative
+    tolerance, meaning the provider has back-adjusted history.
+    """
+    new = normalize_bars(new)
+    overlap = existing.index.intersection(new.index)
+    if overlap.empty:
+        return False
+
+    old_close = existing.loc[overlap, "Close"].to_numpy(dtype=np.float64)
+    new_close = new.loc[overlap, "Close"].to_numpy(dtype=np.float64)
+    valid = ~(np.isnan(old_close) | np.isnan(new_close))
+    if not valid.any():
+        return False
+
+    diff = np.abs(new_close[valid] - old_close[valid])
+    scale = np.maximum(np.abs(old_close[valid]), 1e-12)
+    return bool((diff / scale > tolerance).any())
+
+
+def period_start(period, today=None):
+    """Convert a yfinance-style period ("1y", "6mo", "30d") to a start date.
+
+    Returns None for "max" or an unrecognised period.
+    """
+    today = today or date.today()
+    period = period.strip().lower()
+    try:
+        if period.endswith("mo"):
+            return today - timedelta(days=31 * int(period[:-2]))
+        if period.endswith("y"):
+            return today - timedelta(days=365 * int(period[:-1]))
+        if period.endswith("d"):
+            return today - timedelta(days=int(period[:-1]))
+        if period.endswith("wk"):
+            return today - timedelta(weeks=int(period[:-2]))
+    except ValueError:
+        pass
+    return None
+
+
+def trim_to_period(df, period, today=None):
+    """Return the slice of stored bars covered by a yfinance-style period."""
+    start = period_start(period, today)
+    if start is None:
+        return df
+    return df[df.index >= pd.Timestamp(start)]
+
+
+def _migrate_legacy(store_dir, sym):
+    """Convert a ticker stored in the older single-file .npz layout."""
+    legacy = Path(store_dir) / f"{sym}.npz"
+    if not legacy.exists() or (ticker_dir(store_dir, sym) / "day.npy").exists():
+        return
+
+    try:
+        with np.load(legacy) as old:
+            index = pd.DatetimeIndex([date.fromordinal(int(d)) for d in old["date"]])
+            df = pd.DataFrame({col: old[col] for col in COLUMNS}, index=index)
+    except (OSError, KeyError, ValueError) as e:
+        log.warning("  %s: unreadable legacy bar store file (%s), dropping", sym, e)
+    else:
+        save_bars(store_dir, sym, df)
+        log.info("  %s: migrated bar store to column files", sym)
+    legacy.unlink()
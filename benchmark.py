@@ -0,0 +1,196 @@
+"""End-to-end run benchmark — bot.py over replayed data and a mock Claude API.
+
+Copies the bot into a scratch directory and runs the full daily cycle there
+several times, offline: market data comes from the replay provider and the
+decision engine talks to mock_anthropic.py through ANTHROPIC_BASE_URL.
+positions.json and the equity history are reset before every run so each
+iteration sees identical inputs. Stage timings come from each run's
+run_metrics record and are printed as latest / p50 / p95. Pass
+--no-fast-path through to bot.py to time the Claude call on days the rule
+engine would otherwise decide.
+
+Usage:
+    python benchmark.py --runs 5                      # synthetic bars, recorded response
+    python benchmark.py --fixtures DIR --date 2026-08-21 --latency-ms 3000
+    python benchmark.py --runs 5 --cold -- --compact-prompt --stream
+                                                      # extra args go to bot.py
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import data_pipeline
+import mock_anthropic
+import providers
+import run_metrics
+import trading_calendar
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+SANDBOX_FILES = ["system_prompt.txt", "config.json", "universe.csv",
+                 "positions.json", "equity_history.json"]
+RESET_FILES = ["positions.json", "equity_history.json"]
+SYNTHETIC_BARS = 400
+
+
+def last_trading_day(today=None):
+    """Most recent trading day on or before today."""
+    day = today or date.today()
+    while not trading_calendar.get_trading_calendar(day)["is_trading_day"]:
+        day -= timedelta(days=1)
+    return day
+
+
+def make_synthetic_fixtures(universe_path, fixture_dir, end, bars=SYNTHETIC_BARS):
+    """Write deterministic random-walk bars for every universe ticker.
+
+    Prices are in pence, ending on `end`; each ticker's series is seeded
+    from its symbol so repeated benchmarks see the same data.
+    """
+    universe = data_pipeline.load_universe(universe_path)
+    index = pd.bdate_range(end=end, periods=bars)
+    frames, currencies = {}, {}
+    for t in universe:
+        sym = t["ticker"]
+        rng = np.random.default_rng(zlib.crc32(sym.encode()))
+        close = 500 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, bars)))
+        spread = close * rng.uniform(0.002, 0.02, bars)
+        frames[sym] = pd.DataFrame({
+            "Open": close + rng.normal(0, 0.3, bars) * spread,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(200_000, 5_000_000, bars).astype(float),
+        }, index=index)
+        currencies[sym] = "GBP" if t.get("instrument_type") == "ETF" else "GBp"
+    providers.write_fixtures(frames, fixture_dir, currencies)
+
+
+def make_sandbox(workdir):
+    """Copy the bot's code and inputs into workdir."""
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    for path in BASE_DIR.glob("*.py"):
+        shutil.copy2(path, workdir / path.name)
+    for name in SANDBOX_FILES:
+        if (BASE_DIR / name).exists():
+            shutil.copy2(BASE_DIR / name, workdir / name)
+    (workdir / "logs").mkdir(exist_ok=True)
+    (workdir / "pristine").mkdir(exist_ok=True)
+    for name in RESET_FILES:
+        if (workdir / name).exists():
+            shutil.copy2(workdir / name, workdir / "pristine" / name)
+    return workdir
+
+
+def run_benchmark(workdir, fixture_dir, as_of, runs, base_url, cold=False,
+                  bot_args=()):
+    """Run bot.py `runs` times in the sandbox. Returns harness wall times."""
+    workdir = Path(workdir)
+    env = {**os.environ, "ANTHROPIC_BASE_URL": base_url,
+           "ANTHROPIC_API_KEY": "mock-key"}
+    command = [sys.executable, "bot.py", "--provider", "replay",
+               "--fixtures", str(fixture_dir), "--date", as_of.isoformat(),
+               "--response-cache", "bypass", *bot_args]
+
+    walls = []
+    for i in range(runs):
+        for name in RESET_FILES:
+            if (workdir / "pristine" / name).exists():
+                shutil.copy2(workdir / "pristine" / name, workdir / name)
+        if cold or i == 0:
+            shutil.rmtree(workdir / "data", ignore_errors=True)
+
+        started = time.perf_counter()
+        result = subprocess.run(command, cwd=workdir, env=env,
+                                capture_output=True, text=True)
+        walls.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            log.error("Run %d failed:\n%s", i + 1, result.stderr[-2000:])
+            break
+        log.info("Run %d/%d: %.2fs%s", i + 1, runs, walls[-1],
+                 " (cold store)" if cold or i == 0 else "")
+    return walls
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Offline end-to-end run benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--fixtures", help="Bar fixture directory (default: synthetic)")
+    parser.add_argument("--responses", help="Recorded response fixtures for the mock API "
+                                            "(default: fixtures/mock_api)")
+    parser.add_argument("--date", type=date.fromisoformat, default=None,
+                        help="Trading day to replay (default: last trading day)")
+    parser.add_argument("--latency-ms", type=int, default=0,
+                        help="Mock API response time")
+    parser.add_argument("--ttft-ms", type=int, default=0,
+                        help="Mock API time to first token when streaming")
+    parser.add_argument("--overload-rate", type=float, default=0.0,
+                        help="Fraction of mock API requests failing with 529")
+    parser.add_argument("--tail-rate", type=float, default=0.0,
+                        help="Fraction of mock API responses delayed by --tail-ms")
+    parser.add_argument("--tail-ms", type=int, default=0)
+    parser.add_argument("--cold", action="store_true",
+                        help="Clear the bar store and caches before every run")
+    parser.add_argument("--workdir", help="Sandbox directory (default: a temp dir)")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    parser.add_argument("bot_args", nargs=argparse.REMAINDER,
+                        help="Extra arguments for bot.py, after --")
+    args = parser.parse_args()
+
+    as_of = args.date or last_trading_day()
+    workdir = make_sandbox(args.workdir or tempfile.mkdtemp(prefix="bot-bench-"))
+    fixture_dir = args.fixtures
+    if not fixture_dir:
+        fixture_dir = workdir / "bar_fixtures"
+        make_synthetic_fixtures(BASE_DIR / "universe.csv", fixture_dir, as_of)
+
+    server, url = mock_anthropic.start_in_thread(
+        mock_anthropic.load_fixtures(args.responses),
+        latency_ms=args.latency_ms, ttft_ms=args.ttft_ms,
+        overload_rate=args.overload_rate, tail_rate=args.tail_rate, tail_ms=args.tail_ms,
+    )
+    log.info("Sandbox %s, replaying %s, mock API at %s", workdir, as_of, url)
+    try:
+        walls = run_benchmark(workdir, fixture_dir, as_of, args.runs, url,
+                              cold=args.cold,
+                              bot_args=[a for a in args.bot_args if a != "--"])
+    finally:
+        server.shutdown()
+
+    history = run_metrics.load_history(workdir / "logs" / "run_metrics.jsonl",
+                                       limit=args.runs)
+    print()
+    print("\n".join(run_metrics.summary_lines(history)))
+    if walls:
+        print(f"\n  Process wall time: p50 {run_metrics.percentile(walls, 50):.2f}s, "
+              f"p95 {run_metrics.percentile(walls, 95):.2f}s over {len(walls)} runs")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "as_of": as_of.isoformat(),
+                "process_wall_sec": walls,
+                "stages": [
+                    {"stage": s, "latest": last, "p50": p50, "p95": p95}
+                    for s, last, p50, p95 in run_metrics.stage_summary(history)
+                ],
+            }, f, indent=2)
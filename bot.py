@@ -4,6 +4,22 @@ Usage:
     python bot.py              # Execute one daily trading cycle
     python bot.py --status     # Print portfolio summary
     python bot.py --dry-run    # Run pipeline + Claude but don't apply trades
+    python bot.py --provider replay --fixtures DIR
+                               # Use on-disk bar fixtures instead of Yahoo
+    python bot.py --workers 4  # Sharded market data build for large universes
+    python bot.py --response-cache refresh
+                               # Re-call Claude even if inputs are unchanged
+    python bot.py --compact-prompt
+                               # Compact, pre-filtered prompt encoding
+    python bot.py --stream     # Stream the response; stop early on BLOCKED/NO_TRADES
+    python bot.py --output-mode tool
+                               # Structured tool output validated against a schema
+    python bot.py --shadow     # Also shadow-test the other strategy profiles
+    python bot.py --provider replay --fixtures DIR --date 2026-08-21
+                               # Replay a past trading day (bars kept in data/replay)
+    python bot.py --no-fast-path
+                               # Call Claude even on days the rule engine decides
+    python bot.py --cascade    # Small model first, escalate on failed checks
 """
 
 import argparse
@@ -14,6 +30,8 @@ from datetime import date
 from pathlib import Path
 
 import portfolio
+import portfolio_journal
+import run_metrics
 import trading_calendar
 
 logging.basicConfig(
@@ -23,6 +41,9 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).parent
+METRICS_PATH = BASE_DIR / "logs" / "run_metrics.jsonl"
+# How long a finished run waits for shadow evaluation (config "shadow_wait_sec")
+SHADOW_WAIT_SEC = 30.0
 
 
 def load_config():
@@ -42,7 +63,9 @@ def status():
     print(f"  Cash:           £{pos['cash_balance_gbp']:.2f}")
     unsettled = pos.get("unsettled_sell_proceeds_gbp", 0)
     if unsettled > 0:
-        print(f"  Unsettled:      £{unsettled:.2f} (due {pos.get('settlement_due_date', '?')})")
+        pending = len(portfolio.settlement_queue(pos))
+        print(f"  Unsettled:      £{unsettled:.2f} (due {pos.get('settlement_due_date', '?')}"
+              + (f", {pending} settlements pending)" if pending > 1 else ")"))
     print(f"  Equity value:   £{pos['equity_value_gbp']:.2f}")
     print(f"  Peak equity:    £{pos['portfolio_peak_equity_gbp']:.2f}")
 
@@ -68,18 +91,65 @@ def status():
     else:
         print(f"\n  Positions:      (none)")
 
+    runs = run_metrics.load_history(METRICS_PATH)
+    if runs:
+        print()
+        print("\n".join(run_metrics.summary_lines(runs)))
+
     print(f"{'='*60}\n")
 
 
-def run(dry_run=False):
-    """Execute one daily trading cycle."""
+def run(dry_run=False, provider=None, workers=None, response_cache_mode="replay",
+        prompt_encoding="full", stream=False, stop_early=True,
+        output_mode="sections", shadow=False, as_of=None, fast_path=True,
+        cascade=False):
+    """Execute one daily trading cycle.
+
+    provider is a providers.MarketDataProvider; defaults to Yahoo Finance.
+    If workers is set, market data is built in sharded mode with indicator
+    computation spread over that many processes (for large universes).
+    response_cache_mode ("replay", "refresh" or "bypass") controls reuse of
+    stored Claude responses for identical inputs. prompt_encoding is "full"
+    or "compact" (see prompt_encoding.py). stream streams the Claude
+    response; with stop_early it stops once run_status is BLOCKED or NO_TRADES.
+    output_mode is "sections" or "tool" (see decision_engine.OUTPUT_MODES).
+    shadow evaluates the other strategy profiles on the same inputs alongside
+    the live call (see shadow_eval.py); their results are not applied. It is
+    skipped when the rule engine decides the day without Claude, and the run
+    waits at most shadow_wait_sec for it once the live call is done.
+    as_of runs the cycle for a given date instead of today (for replays).
+    fast_path lets rule_engine decide days the deterministic rules settle
+    (drawdown liquidation, stop exits only, nothing to buy) without Claude.
+    cascade starts with a small model and escalates to a larger one on
+    invalid, constraint-breaking or low-confidence answers (see
+    decision_engine.run_cascade).
+    Stage timings are appended to logs/run_metrics.jsonl.
+    """
+    run_metrics.start_run(dry_run=dry_run)
+    try:
+        _run(dry_run, provider, workers, response_cache_mode, prompt_encoding,
+             stream, stop_early, output_mode, shadow, as_of, fast_path, cascade)
+    except Exception:
+        run_metrics.annotate(status="ERROR")
+        raise
+    finally:
+        run_metrics.finish_run(METRICS_PATH)
+
+
+def _run(dry_run, provider, workers, response_cache_mode, prompt_encoding,
+         stream, stop_early, output_mode, shadow, as_of, fast_path, cascade):
+    """One daily trading cycle (see run)."""
     from dotenv import load_dotenv
+    import call_policy
     import data_pipeline
     import decision_engine
+    import rule_engine
+    import stop_engine
 
     load_dotenv()
     config = load_config()
-    today = date.today()
+    today = as_of or date.today()
+    run_metrics.annotate(date=today.isoformat(), model=config.get("claude_model"))
 
     log.info("=" * 60)
     log.info("Daily Equity Trader Run: %s", today.isoformat())
@@ -94,10 +164,11 @@ def run(dry_run=False):
         return
 
     # Step 2: Trading calendar
-    cal = trading_calendar.get_trading_calendar(today)
-    data_dir = BASE_DIR / "data"
-    data_dir.mkdir(exist_ok=True)
-    trading_calendar.save_trading_calendar(cal, str(data_dir / "trading_calendar.json"))
+    with run_metrics.span("calendar"):
+        cal = trading_calendar.get_trading_calendar(today)
+        data_dir = BASE_DIR / "data"
+        data_dir.mkdir(exist_ok=True)
+        trading_calendar.save_trading_calendar(cal, str(data_dir / "trading_calendar.json"))
 
     if not cal["is_trading_day"]:
         log.info("Not a trading day (weekend or bank holiday). Exiting.")
@@ -109,85 +180,207 @@ def run(dry_run=False):
 
     # Step 3: Fetch market data and compute indicators
     log.info("Fetching market data and computing indicators...")
-    data_ok = data_pipeline.build_market_data(
-        universe_path=str(BASE_DIR / "universe.csv"),
-        output_path=str(data_dir / "market_data.csv"),
-    )
+    store_dir = market_store_dir(data_dir, provider)
+    with run_metrics.span("market_data") as span:
+        if workers:
+            import sharded_pipeline
+
+            market_data, _ = sharded_pipeline.build_market_data_sharded(
+                universe_path=str(BASE_DIR / "universe.csv"),
+                output_path=str(data_dir / "market_data.csv"),
+                store_dir=str(store_dir / "bars"),
+                currency_cache_path=str(store_dir / "currency_cache.json"),
+                provider=provider,
+                workers=workers,
+                as_of=as_of,
+            )
+        else:
+            market_data = data_pipeline.build_market_data(
+                universe_path=str(BASE_DIR / "universe.csv"),
+                output_path=str(data_dir / "market_data.csv"),
+                store_dir=str(store_dir / "bars"),
+                currency_cache_path=str(store_dir / "currency_cache.json"),
+                indicator_state_path=str(store_dir / "indicator_state.json"),
+                provider=provider,
+                as_of=as_of,
+            )
+        span["tickers"] = len(market_data)
 
-    if not data_ok:
+    if not market_data:
         log.error("Market data fetch failed for all tickers.")
         _write_status("BLOCKED", "Market data unavailable", today)
         return
 
-    # Step 4: Load and update positions
-    pos = portfolio.load_positions(str(BASE_DIR / "positions.json"))
-    pos = portfolio.settle_proceeds(pos, today)
-
-    market_data = data_pipeline.load_market_data(str(data_dir / "market_data.csv"))
-    pos = portfolio.compute_position_metrics(pos, market_data)
-    pos = portfolio.update_equity_and_drawdown(pos, market_data)
-    pos["as_of_date"] = today.isoformat()
-
-    # Save updated positions before Claude call
-    portfolio.save_positions(pos, str(BASE_DIR / "positions.json"))
+    # Step 4: Load and update positions. Changes are appended to the
+    # journal as they happen; positions.json is written once, at the end.
+    with run_metrics.span("positions") as span:
+        pos = portfolio.load_positions(str(BASE_DIR / "positions.json"))
+        journal = portfolio_journal.Journal().open(pos)
+        pos = portfolio.settle_proceeds(pos, today, journal)
+        pos = portfolio.compute_position_metrics(pos, market_data)
+        pos = portfolio.update_equity_and_drawdown(pos, market_data)
+        pos["as_of_date"] = today.isoformat()
+        journal.record(today, "mark", pos)
+        span["positions"] = len(pos["positions"])
+
+    # Step 4b: Enforce stops (DAILY_CHECK) before anything is decided
+    with run_metrics.span("stops") as span:
+        exits = stop_engine.check_stops(pos, market_data, config)
+        span["exits"] = len(exits)
+        if exits and not dry_run:
+            log.info("Stops triggered: %s", ", ".join(e["ticker"] for e in exits))
+            pos = portfolio.apply_paper_trades(
+                pos, stop_engine.stop_orders_csv(exits, today), market_data, config, journal
+            )
+            pos = portfolio.update_equity_and_drawdown(pos, market_data)
+            journal.record(today, "mark", pos)
+            _append_trade_log(stop_engine.trade_log_entry(exits, today))
+        elif exits:
+            log.info("Dry run — not applying triggered stops: %s",
+                     ", ".join(e["ticker"] for e in exits))
 
     log.info(
         "Portfolio: cash=£%.2f, equity=£%.2f, positions=%d",
         pos["cash_balance_gbp"], pos["equity_value_gbp"], len(pos["positions"]),
     )
 
-    # Step 5: Call Claude decision engine
-    log.info("Calling Claude decision engine...")
-    try:
-        outputs = decision_engine.run_decision_engine(config, BASE_DIR)
-    except Exception as e:
-        log.error("Decision engine failed: %s", e, exc_info=True)
-        _write_status("BLOCKED", f"Decision engine error: {e}", today)
-        return
-
-    # Step 6: Check run status
-    run_status = outputs.get("run_status", {})
-    status_code = run_status.get("status", "BLOCKED")
-    reason = run_status.get("reason", "Unknown")
-    log.info("Run status: %s — %s", status_code, reason)
-
-    if dry_run:
-        log.info("Dry run complete — not applying trades.")
-        return
-
-    if status_code != "OK":
-        log.info("Status is %s, no trades to apply.", status_code)
-        return
-
-    # Step 7: Apply paper trades
-    orders_csv = outputs.get("orders_csv", "")
-    if orders_csv and orders_csv.strip():
-        pos = portfolio.apply_paper_trades(pos, orders_csv, market_data, config)
-        pos = portfolio.update_equity_and_drawdown(pos, market_data)
-
-        # Update stop prices from trade plan
-        trade_plan = outputs.get("trade_plan", {})
-        _update_stop_prices(pos, trade_plan)
-
-        portfolio.save_positions(pos, str(BASE_DIR / "positions.json"))
-    else:
-        log.info("No orders in output.")
-
-    # Step 8: Append to trade log
-    trade_log_entry = outputs.get("trade_log_update")
-    if trade_log_entry and trade_log_entry.get("entries"):
-        _append_trade_log(trade_log_entry)
+    # The decision engine and shadow evaluation read today's state from here
+    positions_json = json.dumps(pos, indent=2)
 
-    # Step 9: Record equity snapshot for dashboard history
-    _append_equity_history(pos, today)
-
-    log.info("=" * 60)
-    log.info("Run complete.")
-    log.info("=" * 60)
+    try:
+        # Step 5: Decide locally if the rules are unambiguous, else call Claude
+        outputs = None
+        universe = rule_engine.load_universe_rows(BASE_DIR / "universe.csv")
+        if fast_path:
+            with run_metrics.span("rule_engine") as span:
+                outputs = rule_engine.decide(config, market_data, pos, universe, cal)
+                span["decided"] = outputs is not None
+            if outputs:
+                decision_engine.write_outputs(outputs, rule_engine.render_response(outputs),
+                                              BASE_DIR / "output")
+
+        # Shadow runs alongside a live Claude call only, not on rule-engine days
+        shadow_thread = (_start_shadow(config, prompt_encoding, output_mode, positions_json)
+                         if shadow and outputs is None else None)
+        try:
+            if outputs is None:
+                log.info("Calling Claude decision engine...")
+                with run_metrics.span("decision_engine"):
+                    outputs = decision_engine.run_decision_engine(
+                        config, BASE_DIR, cache_mode=response_cache_mode,
+                        encoding=prompt_encoding, stream=stream, stop_early=stop_early,
+                        output_mode=output_mode, cascade=cascade,
+                        positions_json=positions_json, market_data=market_data,
+                    )
+        except call_policy.ClaudeUnavailable as e:
+            # Keep managing stops rather than losing the day to BLOCKED
+            log.error("Claude unavailable: %s", e)
+            outputs = rule_engine.manage_stops_only(config, market_data, pos, universe, cal,
+                                                    str(e))
+            decision_engine.write_outputs(outputs, rule_engine.render_response(outputs),
+                                          BASE_DIR / "output")
+        except Exception as e:
+            log.error("Decision engine failed: %s", e, exc_info=True)
+            _write_status("BLOCKED", f"Decision engine error: {e}", today)
+            return
+        finally:
+            if shadow_thread:
+                _finish_shadow(shadow_thread, config.get("shadow_wait_sec", SHADOW_WAIT_SEC))
+
+        # Step 6: Check run status
+        run_status = outputs.get("run_status", {})
+        status_code = run_status.get("status", "BLOCKED")
+        reason = run_status.get("reason", "Unknown")
+        log.info("Run status: %s — %s", status_code, reason)
+        run_metrics.annotate(status=status_code)
+
+        if dry_run:
+            log.info("Dry run complete — not applying trades.")
+            return
+
+        if status_code != "OK":
+            log.info("Status is %s, no trades to apply.", status_code)
+            return
+
+        # Step 7: Apply paper trades
+        orders_csv = outputs.get("orders_csv", "")
+        if orders_csv and orders_csv.strip():
+            with run_metrics.span("apply_trades"):
+                pos = portfolio.apply_paper_trades(pos, orders_csv, market_data, config,
+                                                   journal)
+                pos = portfolio.update_equity_and_drawdown(pos, market_data)
+                journal.record(today, "mark", pos)
+
+                # Update stop prices from trade plan
+                trade_plan = outputs.get("trade_plan", {})
+                stops = _update_stop_prices(pos, trade_plan)
+                journal.record(today, "stop", pos, stops=stops)
+        else:
+            log.info("No orders in output.")
+
+        # Step 8: Append to trade log
+        trade_log_entry = outputs.get("trade_log_update")
+        with run_metrics.span("history"):
+            if trade_log_entry and trade_log_entry.get("entries"):
+                _append_trade_log(trade_log_entry)
+
+            # Step 9: Record equity snapshot for dashboard history
+            _append_equity_history(pos, today)
+
+        log.info("=" * 60)
+        log.info("Run complete.")
+        log.info("=" * 60)
+    finally:
+        with run_metrics.span("save_positions"):
+            journal.checkpoint(pos)
+            portfolio.save_positions(pos, str(BASE_DIR / "positions.json"))
+
+
+def market_store_dir(data_dir, provider):
+    """Directory for the bar store and market data caches.
+
+    Replays get their own under data/replay, so fixture bars never reach
+    the live store and live bars never leak into a replayed day.
+    """
+    if getattr(provider, "name", None) == "replay":
+        return Path(data_dir) / "replay"
+    return Path(data_dir)
+
+
+def _start_shadow(config, prompt_encoding, output_mode, positions_json):
+    """Run shadow evaluation of the non-live profiles in a background thread."""
+    import threading
+
+    import shadow_eval
+
+    profiles = [p for p in shadow_eval.PROFILES if p != config["strategy_profile"]]
+
+    def evaluate():
+        try:
+            shadow_eval.run_shadow(config, BASE_DIR, profiles=profiles,
+                                   encoding=prompt_encoding, output_mode=output_mode,
+                                   positions_json=positions_json)
+        except Exception as e:
+            log.error("Shadow evaluation failed: %s", e, exc_info=True)
+
+    # Daemon, so a shadow call still running never keeps the process alive
+    thread = threading.Thread(target=evaluate, name="shadow-eval", daemon=True)
+    thread.start()
+    return thread
+
+
+def _finish_shadow(thread, wait_sec):
+    """Give shadow evaluation up to wait_sec more, then carry on without it."""
+    thread.join(timeout=wait_sec)
+    if thread.is_alive():
+        log.warning("Shadow evaluation still running after a further %.0fs — "
+                    "continuing without its results (output/shadow not updated)",
+                    wait_sec)
 
 
 def _write_status(status_code, reason, as_of_date):
     """Write run_status.json for non-OK outcomes."""
+    run_metrics.annotate(status=status_code)
     output_dir = BASE_DIR / "output"
     output_dir.mkdir(exist_ok=True)
 
@@ -207,7 +400,10 @@ def _write_status(status_code, reason, as_of_date):
 
 
 def _update_stop_prices(positions, trade_plan):
-    """Update position stop prices from Claude's trade plan decisions."""
+    """Update position stop prices from Claude's trade plan decisions.
+
+    Returns the {ticker: stop} map that was applied.
+    """
     decisions = trade_plan.get("decisions", [])
     stop_map = {}
     for d in decisions:
@@ -216,9 +412,11 @@ def _update_stop_prices(positions, trade_plan):
         if ticker and stop.get("price_gbp"):
             stop_map[ticker] = stop["price_gbp"]
 
+    applied = {}
     for pos in positions["positions"]:
         if pos["ticker"] in stop_map:
-            pos["current_stop_gbp"] = stop_map[pos["ticker"]]
+            pos["current_stop_gbp"] = applied[pos["ticker"]] = stop_map[pos["ticker"]]
+    return applied
 
 
 def _append_trade_log(entry):
@@ -283,9 +481,51 @@ if __name__ == "__main__":
     parser.add_argument("--status", action="store_true", help="Show portfolio summary")
     parser.add_argument("--dry-run", action="store_true",
                         help="Run pipeline + Claude without applying trades")
+    parser.add_argument("--provider", choices=["yahoo", "replay"], default="yahoo",
+                        help="Market data provider (default: yahoo)")
+    parser.add_argument("--fixtures", help="Fixture directory for --provider replay")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Build market data in sharded mode with N worker processes")
+    parser.add_argument("--response-cache", choices=["replay", "refresh", "bypass"],
+                        default="replay",
+                        help="Reuse stored Claude responses for identical inputs "
+                             "(default: replay)")
+    parser.add_argument("--compact-prompt", action="store_true",
+                        help="Send a compact, eligibility-pre-filtered prompt encoding")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream the Claude response, stopping early on "
+                             "BLOCKED/NO_TRADES")
+    parser.add_argument("--no-stop-early", action="store_true",
+                        help="With --stream, always generate the full response")
+    parser.add_argument("--output-mode", choices=["sections", "tool"], default="sections",
+                        help="Receive outputs as text sections or one structured "
+                             "tool call (default: sections)")
+    parser.add_argument("--shadow", action="store_true",
+                        help="Shadow-test the other strategy profiles concurrently")
+    parser.add_argument("--no-fast-path", action="store_true",
+                        help="Always call Claude, even when the rule engine could decide")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Start with a small model and escalate to a larger one "
+                             "only when its answer fails checks")
+    parser.add_argument("--date", type=date.fromisoformat, default=None,
+                        help="Run as of this date (YYYY-MM-DD) instead of today")
     args = parser.parse_args()
 
     if args.status:
         status()
     else:
-        run(dry_run=args.dry_run)
+        import providers
+
+        if args.provider == "replay":
+            if not args.fixtures:
+                parser.error("--provider replay requires --fixtures")
+            provider = providers.get_provider("replay", fixture_dir=args.fixtures,
+                                              as_of=args.date)
+        else:
+            provider = providers.get_provider("yahoo")
+        run(dry_run=args.dry_run, provider=provider, workers=args.workers,
+            response_cache_mode=args.response_cache,
+            prompt_encoding="compact" if args.compact_prompt else "full",
+            stream=args.stream, stop_early=not args.no_stop_early,
+            output_mode=args.output_mode, shadow=args.shadow, as_of=args.date,
+            fast_path=not args.no_fast_path, cascade=args.cascade)
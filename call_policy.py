@@ -0,0 +1,270 @@
+"""Latency-budgeted call policy for the Claude decision call.
+
+A single unbounded API call can hold the whole Actions job, and one
+transient error used to turn the day into BLOCKED. call() wraps a send
+function with:
+
+- a per-attempt timeout (passed to the SDK client, with its own retries off)
+- a hedged request: if an attempt has not returned after the
+  hedge_percentile of recent claude_call latencies (from run_metrics
+  history), an identical second request is sent and the first response to
+  arrive wins
+- bounded retries with jittered exponential backoff on overload, rate
+  limit, 5xx, timeout and connection errors
+- a circuit breaker persisted to data/circuit_breaker.json: after
+  breaker_threshold consecutive days with a failed call the call is
+  skipped on the next breaker_cooldown_days days the bot runs, then tried
+  again (half-open). Failures are counted once per day, so the tiers of a
+  cascade or a same-day rerun do not open it early.
+
+When the call cannot be made because retries ran out or the breaker is
+open, ClaudeUnavailable is raised and bot.py falls back to
+rule_engine.manage_stops_only. Errors that retrying cannot fix (bad
+request, authentication, prompt too long) are re-raised unchanged.
+
+Defaults are in DEFAULT_POLICY; config.json may override any of them
+under "claude_call_policy".
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import rate_limit
+import run_metrics
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+HISTORY_PATH = BASE_DIR / "logs" / "run_metrics.jsonl"
+BREAKER_PATH = BASE_DIR / "data" / "circuit_breaker.json"
+
+DEFAULT_POLICY = {
+    "attempt_timeout_sec": 180.0,
+    "max_attempts": 3,
+    "backoff_base_sec": 2.0,
+    "hedge_percentile": 90,     # None disables hedging
+    "hedge_min_sec": 10.0,
+    "hedge_default_sec": 60.0,  # until there are enough samples
+    "hedge_min_samples": 5,
+    "breaker_threshold": 3,
+    "breaker_cooldown_days": 1,  # run days skipped once the breaker opens
+}
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, 5xx, overloaded
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+LATENCY_STAGE = "claude_call"
+
+
+class ClaudeUnavailable(Exception):
+    """The decision call could not be made (retries exhausted or breaker open)."""
+
+
+def policy_from_config(config):
+    """DEFAULT_POLICY with config['claude_call_policy'] overrides applied."""
+    return {**DEFAULT_POLICY, **config.get("claude_call_policy", {})}
+
+
+def hedge_delay(policy, history_path=HISTORY_PATH):
+    """Seconds to wait before hedging, from recent claude_call latencies.
+
+    Returns None if hedging is disabled.
+    """
+    pct = policy.get("hedge_percentile")
+    if pct is None:
+        return None
+    # attempt_sec is the winning request alone, without retries and backoff
+    samples = [
+        s.get("attempt_sec", s.get("wall_sec"))
+        for r in run_metrics.load_history(history_path)
+        for s in r.get("spans", [])
+        if s["name"].split(".")[-1] == LATENCY_STAGE and "wall_sec" in s
+    ]
+    if len(samples) < policy["hedge_min_samples"]:
+        delay = policy["hedge_default_sec"]
+    else:
+        delay = run_metrics.percentile(samples, pct)
+    return min(max(delay, policy["hedge_min_sec"]), policy["attempt_timeout_sec"])
+
+
+def is_retryable(error):
+    """True for overload, rate limit, 5xx, timeout and connection errors."""
+    import anthropic
+
+    if isinstance(error, (anthropic.APIConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+def _today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class CircuitBreaker:
+    """Consecutive-failed-day breaker whose state survives between runs."""
+
+    def __init__(self, path, threshold, cooldown_days):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.cooldown_days = cooldown_days
+        self.state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return self._closed()
+
+    def _closed(self):
+        return {"failures": 0, "failed_on": None, "opened_at": None,
+                "skipped_days": [], "last_error": None}
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.state, f, indent=2)
+
+    def allow(self):
+        """True unless the breaker is open and still cooling down.
+
+        While open, each new day it is asked on counts as one skipped run
+        day; after cooldown_days of them the next day is let through.
+        """
+        opened = self.state.get("opened_at")
+        if not opened:
+            return True
+        today = _today()
+        skipped = self.state.get("skipped_days", [])
+        if opened[:10] == today or today in skipped:
+            return False
+        if len(skipped) < self.cooldown_days:
+            self.state["skipped_days"] = skipped + [today]
+            self._save()
+            return False
+        log.info("Circuit breaker half-open after %d skipped day(s) — trying Claude",
+                 len(skipped))
+        return True
+
+    def record_success(self):
+        if self.state.get("failures") or self.state.get("opened_at"):
+            log.info("Circuit breaker closed")
+        self.state = self._closed()
+        self._save()
+
+    def record_failure(self, error):
+        """Count a failed day; further failures on the same day are not counted."""
+        today = _today()
+        self.state["last_error"] = str(error)[:500]
+        if self.state.get("failed_on") != today:
+            self.state["failures"] = self.state.get("failures", 0) + 1
+            self.state["failed_on"] = today
+            if self.state["failures"] >= self.threshold:
+                self.state["opened_at"] = datetime.now(timezone.utc).isoformat(
+                    timespec="seconds")
+                self.state["skipped_days"] = []
+                log.warning("Circuit breaker open after %d consecutive failed days",
+                            self.state["failures"])
+        self._save()
+
+
+def call(send, policy, span=None, history_path=None, breaker_path=None):
+    """Run send(timeout) under the policy and return its result.
+
+    send makes one attempt with the given per-attempt timeout and returns
+    its result or raises. If span is given, attempts, hedging and the
+    winning request are recorded on it. Raises ClaudeUnavailable when the
+    breaker is open or every attempt failed with a retryable error; other
+    errors are re-raised as they are and do not count towards the breaker.
+    """
+    span = span if span is not None else {}
+    breaker = CircuitBreaker(breaker_path or BREAKER_PATH, policy["breaker_threshold"],
+                             policy["breaker_cooldown_days"])
+    if not breaker.allow():
+        span["breaker"] = "open"
+        raise ClaudeUnavailable(
+            f"circuit breaker open since {breaker.state['opened_at']} "
+            f"({breaker.state.get('last_error')})"
+        )
+
+    delay = hedge_delay(policy, history_path or HISTORY_PATH)
+    span.update(attempts=0, hedged=0)
+    error = None
+    for attempt in range(policy["max_attempts"]):
+        span["attempts"] += 1
+        try:
+            result, hedged, winner = _hedged(send, policy["attempt_timeout_sec"], delay)
+        except Exception as e:
+            error = e
+            if not is_retryable(e):
+                log.error("Claude attempt %d failed with a non-retryable error: %s",
+                          attempt + 1, e)
+                raise
+            retry = attempt + 1 < policy["max_attempts"]
+            log.warning("Claude attempt %d failed: %s%s", attempt + 1, e,
+                        " — retrying" if retry else "")
+            if not retry:
+                break
+            time.sleep(rate_limit.backoff_delay(attempt, base=policy["backoff_base_sec"]))
+            continue
+        span["hedged"] += hedged
+        span["winner"] = winner
+        breaker.record_success()
+        return result
+
+    breaker.record_failure(error)
+    raise ClaudeUnavailable(f"{span['attempts']} attempt(s) failed: {error}") from error
+
+
+def _hedged(send, timeout, hedge_after):
+    """One attempt, plus a hedged duplicate if it is slower than hedge_after.
+
+    Returns (result, hedged, winner). Requests run on daemon threads so a
+    losing request never holds up the process.
+    """
+    results = queue.Queue()
+
+    def attempt(label):
+        try:
+            results.put((label, send(timeout), None))
+        except Exception as e:
+            results.put((label, None, e))
+
+    def launch(label):
+        threading.Thread(target=attempt, args=(label,), name=f"claude-{label}",
+                         daemon=True).start()
+
+    launch("primary")
+    in_flight = 1
+    if hedge_after is None:
+        label, result, error = _next(results, timeout)
+    else:
+        try:
+            label, result, error = results.get(timeout=hedge_after)
+        except queue.Empty:
+            log.info("No response after %.1fs — sending hedged request", hedge_after)
+            launch("hedge")
+            in_flight = 2
+            label, result, error = _next(results, timeout)
+
+    if error is not None and in_flight == 2:
+        log.info("%s request failed (%s), waiting for the other", label, error)
+        label, result, error = _next(results, timeout)
+    if error is not None:
+        raise error
+    return result, in_flight - 1, label
+
+
+def _next(results, timeout):
+    """Next result from the queue, giving up a little after the attempt timeout."""
+    try:
+        return results.get(timeout=timeout + 5)
+    except queue.Empty:
+        raise TimeoutError(f"no response within {timeout:.0f}s") from None
@@ -0,0 +1,154 @@
+"""Currency metadata cache — quote currency per ticker with a TTL.
+
+Yahoo quotes most LSE equities in pence (GBp) and some ETFs in pounds (GBP).
+Looking that up with one metadata call per ticker on every run is the
+slowest step in the pipeline, so the result is cached in
+data/currency_cache.json, seeded from the currency column of universe.csv
+and refreshed in bulk only for entries that are missing or stale.
+
+universe.csv lists every LSE line as plain "GBP". Yahoo quotes LSE ordinary
+shares in pence, so those are seeded as GBp and only verified once their
+TTL runs out; other LSE instruments (ETFs quote either way) are looked up.
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import providers
+
+log = logging.getLogger(__name__)
+
+CACHE_TTL_DAYS = 30
+REFRESH_WORKERS = 8
+
+# Quote currencies meaning prices are in pence
+PENCE_CURRENCIES = {"GBp", "GBX", "GBx"}
+
+
+def load_cache(path):
+    """Load the currency cache. Returns an empty cache if missing or corrupt."""
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"tickers": {}}
+    cache.setdefault("tickers", {})
+    return cache
+
+
+def save_cache(cache, path):
+    """Write the currency cache."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def divisor_for(currency):
+    """Return the price divisor that converts a quote currency to GBP."""
+    return 100.0 if currency in PENCE_CURRENCIES else 1.0
+
+
+def seed_from_universe(cache, universe, today):
+    """Add entries for tickers not yet cached, using universe.csv's currency.
+
+    A pence code (GBp/GBX) or a non-sterling currency in universe.csv is
+    taken as authoritative. Plain "GBP" on an LSE listing does not say
+    whether Yahoo quotes the line in pounds or pence: equities are seeded as
+    GBp checked today, so they are verified when the TTL runs out, and other
+    instruments are seeded as provisional (no checked date) and verified on
+    the next refresh.
+    """
+    entries = cache["tickers"]
+    for t in universe:
+        sym = t["ticker"]
+        currency = (t.get("currency") or "").strip()
+        if sym in entries or not currency:
+            continue
+
+        if currency == "GBP" and t.get("exchange", "LSE") == "LSE":
+            if t.get("instrument_type", "EQUITY") == "EQUITY":
+                entry = {"currency": "GBp", "source": "lse_equity",
+                         "checked": today.isoformat()}
+            else:
+                entry = {"currency": currency, "source": "universe", "checked": None}
+        else:
+            entry = {"currency": currency, "source": "universe", "checked": "static"}
+        entries[sym] = entry
+    return cache
+
+
+def is_stale(entry, today, ttl_days=CACHE_TTL_DAYS):
+    """Check whether a cache entry needs re-verifying with the data provider."""
+    checked = entry.get("checked")
+    if checked == "static":
+        return False
+    if not checked:
+        return True
+    return date.fromisoformat(checked) + timedelta(days=ttl_days) < today
+
+
+def refresh(cache, symbols, today, provider):
+    """Look up quote currencies for symbols in one concurrent bulk pass.
+
+    Symbols whose lookup fails keep their existing entry, if any.
+    """
+    if not symbols:
+        return cache
+
+    def lookup(sym):
+        try:
+            return provider.currency(sym)
+        except Exception as e:
+            log.debug("  %s: currency lookup failed — %s", sym, e)
+            return None
+
+    log.info("Refreshing currency metadata for %d tickers...", len(symbols))
+    with ThreadPoolExecutor(max_workers=REFRESH_WORKERS) as pool:
+        looked_up = dict(zip(symbols, pool.map(lookup, symbols)))
+
+    for sym, currency in looked_up.items():
+        if currency is None:
+            log.warning("  %s: currency lookup failed, keeping cached value", sym)
+            continue
+        cache["tickers"][sym] = {
+            "currency": currency,
+            "source": provider.name,
+            "checked": today.isoformat(),
+        }
+    return cache
+
+
+def get_divisors(universe, cache_path, ttl_days=CACHE_TTL_DAYS, today=None,
+                 provider=None):
+    """Return {ticker: divisor} for the whole universe.
+
+    Seeds the cache from the universe, refreshes missing or stale entries in
+    one bulk pass against the provider (Yahoo by default) and saves the cache
+    if anything changed.
+    """
+    today = today or date.today()
+    cache = load_cache(cache_path)
+    before = json.dumps(cache, sort_keys=True)
+
+    seed_from_universe(cache, universe, today)
+    entries = cache["tickers"]
+    stale = [
+        t["ticker"] for t in universe
+        if t["ticker"] not in entries or is_stale(entries[t["ticker"]], today, ttl_days)
+    ]
+    if stale:
+        refresh(cache, stale, today, provider or providers.YahooProvider())
+
+    if json.dumps(cache, sort_keys=True) != before:
+        save_cache(cache, cache_path)
+
+    divisors = {}
+    for t in universe:
+        entry = entries.get(t["ticker"])
+        # Same default as a failed lookup: assume the quote is already in GBP
+        divisors[t["ticker"]] = divisor_for(entry["currency"]) if entry else 1.0
+    return divisors
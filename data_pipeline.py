@@ -1,21 +1,71 @@
-"""Data pipeline — fetch Yahoo Finance data and compute all technical indicators.
+"""Data pipeline — fetch market data and compute all technical indicators.
 
 Fetches daily OHLCV for the universe, computes SMA, ATR, rolling highs/lows,
 volume metrics, and drawdowns. Outputs market_data.csv with one row per ticker
 containing all pre-computed fields the V2 system prompt expects.
+
+Bars and quote currencies come from a providers.MarketDataProvider (Yahoo
+Finance unless another provider is passed in).
+build_market_data computes indicators for the whole universe at once with
+indicator_panel; compute_indicators is the single-ticker reference.
 """
 
 import csv
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
+
+import bar_store
+import currency_cache
+import indicator_panel
+import indicator_state
+import providers
+import rate_limit
+import run_metrics
 
 log = logging.getLogger(__name__)
 
+# Bars re-fetched before the last stored date to detect restated history
+STORE_OVERLAP_BARS = 5
+
+MARKET_DATA_FIELDS = [
+    "date", "ticker", "close_gbp", "high_gbp", "low_gbp", "open_gbp", "volume",
+    "sma50_gbp", "sma200_gbp", "sma50_slope", "atr14_gbp",
+    "high_20d_gbp", "low_20d_gbp",
+    "avg_volume_20d", "avg_gbp_volume_20d",
+    "drawdown_from_20d_high_pct", "volume_ratio_20d", "close_vs_sma50_pct",
+    "consecutive_days_below_sma50",
+    "sector", "instrument_type", "uk_equity_flag",
+]
+TEXT_FIELDS = {"ticker", "date", "sma50_slope", "sector", "instrument_type", "uk_equity_flag"}
+INT_FIELDS = {"volume", "consecutive_days_below_sma50"}
+
+# Individual fallback fetch: concurrency, provider rate limit and retry policy.
+# The rate limit and time budget are shared by every fallback in a run.
+FALLBACK_WORKERS = 4
+FALLBACK_RATE_PER_SEC = 2.0
+FALLBACK_BURST = 4
+FALLBACK_RETRIES = 2
+FALLBACK_BACKOFF_SEC = 1.0
+FALLBACK_BUDGET_SEC = 60.0
+
+
+def fallback_limits():
+    """Rate limit and time budget for a run's individual fallback fetches.
+
+    Create one per run and pass it to every fetch in the run. The budget
+    clock starts at the first fallback.
+    """
+    return {
+        "bucket": rate_limit.TokenBucket(FALLBACK_RATE_PER_SEC, FALLBACK_BURST),
+        "deadline": None,
+    }
+
 
 def load_universe(universe_path):
     """Load universe.csv and return list of ticker dicts."""
@@ -29,88 +79,203 @@ def load_universe(universe_path):
     return tickers
 
 
-def fetch_ohlcv(tickers, period="1y"):
-    """Fetch daily OHLCV from Yahoo Finance for all tickers.
+def fetch_ohlcv(tickers, period="1y", store_dir=None, provider=None, as_of=None,
+                limits=None):
+    """Fetch daily OHLCV from the market data provider for all tickers.
+
+    provider is a providers.MarketDataProvider; defaults to Yahoo Finance.
+    as_of (replays) ends the history at that date; see sync_bar_store.
+    limits (see fallback_limits) is created here if not given.
+
+    If store_dir is given, bars already held in the local bar store are reused
+    and only the missing date range (plus a short overlap used to detect
+    restated history) is downloaded and merged in.
 
     Returns dict mapping ticker -> pd.DataFrame with columns:
     Open, High, Low, Close, Volume (raw, may be GBX for LSE equities).
     """
     ticker_symbols = [t["ticker"] for t in tickers]
-    log.info("Fetching OHLCV for %d tickers...", len(ticker_symbols))
+    provider = provider or providers.YahooProvider()
+    limits = limits or fallback_limits()
+
+    if store_dir is None:
+        log.info("Fetching OHLCV for %d tickers...", len(ticker_symbols))
+        results = _download(ticker_symbols, provider, limits, period=period)
+        log.info("Fetched data for %d/%d tickers", len(results), len(ticker_symbols))
+        return results
+
+    available = sync_bar_store(tickers, store_dir, period=period, provider=provider,
+                               as_of=as_of, limits=limits)
 
     results = {}
+    for sym in available:
+        arrays = bar_store.load_window(store_dir, sym, period, as_of)
+        if arrays is not None and len(arrays["day"]):
+            results[sym] = bar_store.arrays_to_frame(arrays)
+
+    log.info("Fetched data for %d/%d tickers", len(results), len(ticker_symbols))
+    return results
+
+
+def sync_bar_store(tickers, store_dir, period="1y", provider=None, as_of=None,
+                   limits=None):
+    """Bring the local bar store up to date for all tickers.
+
+    Tickers already in the store are re-fetched only from a few bars before
+    their last stored date (grouped into one batch call per start date).
+    Tickers with no history, or whose history the provider has restated,
+    are fetched in full for the given period.
+
+    With as_of (replays) stored bars after that date are ignored, so the
+    delta fetch starts from bars on or before it and replaces the rest.
+
+    limits (see fallback_limits) is created here if not given; pass one in
+    when syncing a run in several calls.
+
+    Returns the list of tickers with stored bars, in universe order.
+    """
+    ticker_symbols = [t["ticker"] for t in tickers]
+    provider = provider or providers.YahooProvider()
+    limits = limits or fallback_limits()
+
+    # Only the overlap bars are materialised, to check for restatement
+    stored_tails = {}
+    for sym in ticker_symbols:
+        arrays = bar_store.load_arrays(store_dir, sym)
+        if arrays is not None and as_of is not None:
+            arrays = bar_store.window(arrays, "max", as_of)
+        if arrays is not None and len(arrays["day"]):
+            stored_tails[sym] = bar_store.tail_frame(arrays, STORE_OVERLAP_BARS)
+
+    # Group stored tickers by delta start date so each group is one batch call
+    delta_groups = {}
+    for sym, tail in stored_tails.items():
+        delta_groups.setdefault(tail.index[0].date(), []).append(sym)
+
+    full = [s for s in ticker_symbols if s not in stored_tails]
+    log.info(
+        "Fetching OHLCV: %d tickers from bar store (delta), %d full history",
+        len(stored_tails), len(full),
+    )
+
+    for start, syms in sorted(delta_groups.items()):
+        fetched = _download(syms, provider, limits, start=start.isoformat())
+        for sym in syms:
+            new = fetched.get(sym)
+            if new is None:
+                log.warning("  %s: delta fetch failed, using stored bars", sym)
+            elif bar_store.is_restated(stored_tails[sym], new):
+                log.info("  %s: history restated by provider, refetching", sym)
+                full.append(sym)
+            else:
+                bar_store.append_bars(store_dir, sym, new)
+
+    available = set(stored_tails)
+    if full:
+        fetched = _download(full, provider, limits, period=period)
+        for sym, df in fetched.items():
+            bar_store.save_bars(store_dir, sym, df)
+            available.add(sym)
+        for sym in full:
+            if sym not in fetched and sym in stored_tails:
+                log.warning("  %s: full refetch failed, using stored bars", sym)
+
+    return [s for s in ticker_symbols if s in available]
+
+
+def _download(ticker_symbols, provider, limits, **window):
+    """Download OHLCV for a list of symbols over a period= or start= window.
+
+    Uses one batch provider download, then fetches any tickers missing from
+    the batch result individually, within limits (see fallback_limits).
+    """
+    results = {}
+    if not ticker_symbols:
+        return results
 
     # Batch download
     try:
-        data = yf.download(
-            ticker_symbols,
-            period=period,
-            group_by="ticker",
-            auto_adjust=True,
-            progress=False,
-            threads=True,
-        )
-
-        if data.empty:
-            log.warning("Batch download returned empty data, trying individual")
-        else:
-            for sym in ticker_symbols:
-                try:
-                    if len(ticker_symbols) == 1:
-                        df = data.copy()
-                    else:
-                        df = data[sym].copy()
-                    df = df.dropna(subset=["Close"])
-                    if not df.empty:
-                        results[sym] = df
-                        log.info("  %s: %d rows", sym, len(df))
-                    else:
-                        log.warning("  %s: no data after dropna", sym)
-                except (KeyError, TypeError):
-                    log.warning("  %s: not in batch result", sym)
-    except Exception as e:
-        log.warning("Batch download failed: %s — falling back to individual", e)
+        batch = provider.download(ticker_symbols, **window)
 
-    # Individual fallback for missing tickers
-    missing = [s for s in ticker_symbols if s not in results]
-    for sym in missing:
-        try:
-            log.info("  Fetching %s individually...", sym)
-            ticker = yf.Ticker(sym)
-            df = ticker.history(period=period, auto_adjust=True)
+        if not batch:
+            log.warning("Batch download returned empty data, trying individual")
+        for sym, df in batch.items():
             df = df.dropna(subset=["Close"])
             if not df.empty:
                 results[sym] = df
                 log.info("  %s: %d rows", sym, len(df))
             else:
-                log.warning("  %s: no data", sym)
-            time.sleep(0.5)  # Rate limit
-        except Exception as e:
-            log.warning("  %s: failed — %s", sym, e)
+                log.warning("  %s: no data after dropna", sym)
+    except Exception as e:
+        log.warning("Batch download failed: %s — falling back to individual", e)
+
+    # Individual fallback for missing tickers
+    missing = [s for s in ticker_symbols if s not in results]
+    if missing:
+        results.update(_fetch_individual(missing, provider, window, limits))
 
-    log.info("Fetched data for %d/%d tickers", len(results), len(ticker_symbols))
     return results
 
 
-def normalize_to_gbp(df, ticker_info):
+def _fetch_individual(symbols, provider, window, limits):
+    """Fetch tickers one at a time with bounded concurrency.
+
+    Requests share the run's token-bucket rate limit. Failed requests are
+    retried with jittered exponential backoff, and fallbacks stop once
+    FALLBACK_BUDGET_SEC has elapsed since the run's first fallback.
+    """
+    if limits["deadline"] is None:
+        limits["deadline"] = time.monotonic() + FALLBACK_BUDGET_SEC
+    bucket, deadline = limits["bucket"], limits["deadline"]
+
+    def fetch_one(sym):
+        for attempt in range(FALLBACK_RETRIES + 1):
+            if not bucket.acquire(deadline):
+                log.warning("  %s: skipped, fallback time budget exhausted", sym)
+                return None
+            try:
+                log.info("  Fetching %s individually...", sym)
+                df = provider.history(sym, **window)
+                df = df.dropna(subset=["Close"])
+                if df.empty:
+                    log.warning("  %s: no data", sym)
+                    return None
+                log.info("  %s: %d rows", sym, len(df))
+                return df
+            except Exception as e:
+                if attempt == FALLBACK_RETRIES:
+                    log.warning("  %s: failed — %s", sym, e)
+                    return None
+                delay = rate_limit.backoff_delay(attempt, FALLBACK_BACKOFF_SEC)
+                if time.monotonic() + delay > deadline:
+                    log.warning("  %s: failed — %s (no time left to retry)", sym, e)
+                    return None
+                log.info("  %s: attempt %d failed (%s), retrying in %.1fs",
+                         sym, attempt + 1, e, delay)
+                time.sleep(delay)
+        return None
+
+    workers = min(FALLBACK_WORKERS, len(symbols))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fetched = dict(zip(symbols, pool.map(fetch_one, symbols)))
+
+    return {sym: df for sym, df in fetched.items() if df is not None}
+
+
+def normalize_to_gbp(df, ticker_info, divisor=None, provider=None):
     """Convert GBX (pence) to GBP if needed.
 
     yfinance returns prices in GBX for most LSE equities.
     Heuristic: if currency is GBp (pence), divide by 100.
-    Also checks via yfinance ticker info if available.
+    If divisor is not given (e.g. from currency_cache.get_divisors), the
+    currency is looked up from the provider (Yahoo by default).
 
     Returns DataFrame with _gbp suffixed price columns.
     """
     df = df.copy()
 
-    # Try to detect currency from yfinance
-    try:
-        info = yf.Ticker(ticker_info["ticker"]).info
-        currency = info.get("currency", "GBP")
-    except Exception:
-        currency = "GBP"
-
-    divisor = 100.0 if currency == "GBp" else 1.0
+    if divisor is None:
+        divisor = lookup_divisor(ticker_info["ticker"], provider or providers.YahooProvider())
 
     if divisor != 1.0:
         log.info("  %s: converting from GBX to GBP (÷100)", ticker_info["ticker"])
@@ -124,6 +289,16 @@ def normalize_to_gbp(df, ticker_info):
     return df
 
 
+def lookup_divisor(sym, provider):
+    """Detect a ticker's quote currency from the provider and return its divisor."""
+    try:
+        currency = provider.currency(sym) or "GBP"
+    except Exception:
+        currency = "GBP"
+
+    return 100.0 if currency == "GBp" else 1.0
+
+
 def compute_indicators(df, ticker_sym):
     """Compute all V2-required indicators for a single ticker.
 
@@ -269,35 +444,103 @@ def _round(value, decimals=4):
     return round(float(value), decimals)
 
 
-def build_market_data(universe_path, output_path):
+def build_market_data(universe_path, output_path, store_dir=None,
+                      currency_cache_path=None, indicator_state_path=None,
+                      provider=None, period="1y", as_of=None):
     """Main entry point. Fetch data, compute indicators, write market_data.csv.
 
-    Returns True if at least one ticker has valid data.
+    If store_dir is given, OHLCV history is kept in a local bar store there,
+    only new bars are downloaded each run and indicators read the
+    memory-mapped history directly. If currency_cache_path is
+    given, GBX/GBP divisors come from the currency metadata cache instead of
+    a per-ticker yfinance info call. If indicator_state_path is given,
+    indicators are advanced incrementally from persisted per-ticker state
+    instead of being recomputed from the full history. provider defaults to
+    Yahoo Finance. as_of (replays) ends the history at that date, so no
+    later bar can reach the indicators.
+
+    Also writes a typed snapshot (market_data.npz) next to the CSV for
+    load_market_data.
+
+    Returns dict of ticker -> row dict (the same table load_market_data
+    gives), empty if no ticker has valid data.
     """
     universe = load_universe(universe_path)
-    raw_data = fetch_ohlcv(universe)
-
-    if not raw_data:
+    provider = provider or providers.YahooProvider()
+
+    with run_metrics.span("fetch", tickers=len(universe)) as s:
+        if store_dir:
+            # Read history straight from the memory-mapped store: no DataFrames
+            available = sync_bar_store(universe, store_dir, period=period,
+                                       provider=provider, as_of=as_of)
+            bars = {sym: bar_store.load_window(store_dir, sym, period, as_of)
+                    for sym in available}
+            bars = {sym: arrays for sym, arrays in bars.items()
+                    if arrays is not None and len(arrays["day"])}
+        else:
+            raw_data = fetch_ohlcv(universe, period=period, provider=provider)
+            bars = {
+                sym: bar_store.window(bar_store.frame_to_arrays(df, compact=False),
+                                      "max", as_of)
+                for sym, df in raw_data.items()
+            }
+        s["fetched"] = len(bars)
+
+    if not bars:
         log.error("No data fetched for any ticker")
-        return False
+        return {}
+
+    with run_metrics.span("currency", tickers=len(bars)):
+        if currency_cache_path:
+            divisors = currency_cache.get_divisors(
+                [t for t in universe if t["ticker"] in bars], currency_cache_path,
+                provider=provider,
+            )
+        else:
+            divisors = {sym: lookup_divisor(sym, provider) for sym in bars}
+
+    pence = [sym for sym, d in divisors.items() if d != 1.0]
+    if pence:
+        log.info("Converting %d tickers from GBX to GBP (÷100)", len(pence))
+
+    with run_metrics.span("indicators", tickers=len(bars)) as s:
+        if indicator_state_path:
+            # Advance persisted state by the bars added since the last run
+            s["mode"] = "incremental"
+            states = indicator_state.load_state(indicator_state_path)
+            all_indicators = {
+                sym: indicator_state.update_arrays(states, sym, arrays,
+                                                   divisors.get(sym, 1.0))
+                for sym, arrays in bars.items()
+            }
+            indicator_state.save_state(states, indicator_state_path)
+        else:
+            # Compute indicators for the whole universe in one panel pass
+            s["mode"] = "panel"
+            panel = indicator_panel.align_arrays(bars, divisors)
+            all_indicators = indicator_panel.compute_panel_indicators(panel)
 
-    # Build universe lookup by ticker symbol
-    universe_lookup = {t["ticker"]: t for t in universe}
+    with run_metrics.span("write") as s:
+        market_data = write_market_data(universe, all_indicators, output_path)
+        s["tickers"] = len(market_data)
+    return market_data
 
+
+def write_market_data(universe, all_indicators, output_path):
+    """Attach universe metadata to indicator rows and write the outputs.
+
+    Writes market_data.csv and its typed snapshot. Tickers without an
+    indicator row are skipped. Returns dict of ticker -> row dict, empty if
+    no ticker has valid data.
+    """
     rows = []
     for ticker_info in universe:
         sym = ticker_info["ticker"]
-        if sym not in raw_data:
+        if sym not in all_indicators:
             log.warning("  %s: skipped (no data)", sym)
             continue
 
-        df = raw_data[sym]
-
-        # Normalize to GBP
-        df = normalize_to_gbp(df, ticker_info)
-
-        # Compute indicators
-        indicators = compute_indicators(df, sym)
+        indicators = all_indicators[sym]
         if indicators is None:
             log.warning("  %s: skipped (insufficient data for indicators)", sym)
             continue
@@ -311,45 +554,97 @@ def build_market_data(universe_path, output_path):
 
     if not rows:
         log.error("No tickers produced valid indicator data")
-        return False
+        return {}
+
+    market_data = {row["ticker"]: row for row in rows}
 
-    # Write CSV
+    # Write CSV (the rendered input for the decision engine prompt)
     output = Path(output_path)
     output.parent.mkdir(parents=True, exist_ok=True)
 
-    fieldnames = [
-        "date", "ticker", "close_gbp", "high_gbp", "low_gbp", "open_gbp", "volume",
-        "sma50_gbp", "sma200_gbp", "sma50_slope", "atr14_gbp",
-        "high_20d_gbp", "low_20d_gbp",
-        "avg_volume_20d", "avg_gbp_volume_20d",
-        "drawdown_from_20d_high_pct", "volume_ratio_20d", "close_vs_sma50_pct",
-        "consecutive_days_below_sma50",
-        "sector", "instrument_type", "uk_equity_flag",
-    ]
-
     with open(output, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=MARKET_DATA_FIELDS)
         writer.writeheader()
         for row in rows:
-            writer.writerow({k: row.get(k, "") for k in fieldnames})
+            writer.writerow({k: row.get(k, "") for k in MARKET_DATA_FIELDS})
+
+    save_snapshot(market_data, snapshot_path(output))
 
     log.info("Wrote market_data.csv: %d tickers", len(rows))
-    return True
+    return market_data
 
 
-def load_market_data(csv_path):
-    """Load market_data.csv into a dict keyed by ticker.
+def snapshot_path(csv_path):
+    """Return the typed snapshot path that sits next to market_data.csv."""
+    return Path(csv_path).with_suffix(".npz")
+
+
+def save_snapshot(market_data, path):
+    """Write market data as a typed columnar snapshot (.npz, one array per field).
+
+    Float fields are float64 with NaN for missing values, integer fields are
+    int64 and text fields are fixed-width unicode arrays.
+    """
+    rows = list(market_data.values())
+    arrays = {}
+    for key in MARKET_DATA_FIELDS:
+        values = [row.get(key) for row in rows]
+        if key in TEXT_FIELDS:
+            arrays[key] = np.array(["" if v is None else str(v) for v in values])
+        elif key in INT_FIELDS:
+            arrays[key] = np.array([0 if v is None else v for v in values], dtype=np.int64)
+        else:
+            arrays[key] = np.array([np.nan if v is None else v for v in values],
+                                   dtype=np.float64)
+
+    path = Path(path)
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp, **arrays)
+    tmp.replace(path)
+
+
+def load_snapshot(path):
+    """Load a typed market data snapshot into a dict keyed by ticker."""
+    with np.load(path, allow_pickle=False) as arrays:
+        columns = {}
+        for key in arrays.files:
+            a = arrays[key]
+            if a.dtype.kind == "f":
+                # NaN back to None, as in the CSV loader
+                a = np.where(np.isnan(a), None, a.astype(object))
+            columns[key] = a.tolist()
+
+    keys = list(columns)
+    return {
+        row["ticker"]: row
+        for row in (dict(zip(keys, values)) for values in zip(*columns.values()))
+    }
+
+
+def load_market_data(path):
+    """Load market data into a dict keyed by ticker.
+
+    Reads the typed .npz snapshot when given one, or when a snapshot at
+    least as new as the given market_data.csv (or no CSV at all) sits next
+    to it; otherwise parses the CSV.
 
     Returns dict of ticker -> row dict.
     """
+    path = Path(path)
+    snapshot = path if path.suffix == ".npz" else snapshot_path(path)
+    if snapshot.exists() and (
+        snapshot == path or not path.exists()
+        or snapshot.stat().st_mtime >= path.stat().st_mtime
+    ):
+        return load_snapshot(snapshot)
+
     result = {}
-    with open(csv_path, newline="") as f:
+    with open(path, newline="") as f:
         reader = csv.DictReader(f)
         for row in reader:
             # Convert numeric fields
             for key in row:
-                if key in ("ticker", "date", "sma50_slope", "sector",
-                           "instrument_type", "uk_equity_flag"):
+                if key in TEXT_FIELDS:
                     continue
                 try:
                     if row[key] == "" or row[key] is None:
@@ -4,17 +4,44 @@ Assembles input files, calls Claude with the V2 system prompt,
 and parses the structured outputs (trade_plan.json, orders.csv, etc.).
 """
 
+import csv
+import io
 import json
 import logging
 import os
 import re
+import time
 from pathlib import Path
 
 from anthropic import Anthropic
 
+import call_policy
+import output_schema
+import prompt_encoding
+import response_cache
+import run_metrics
+
 log = logging.getLogger(__name__)
 BASE_DIR = Path(__file__).parent
 
+# Prompt cache marker for the static prefix (system prompt, config, universe)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+SECTION_HEADER = re.compile(r"===\s*(\S+\.(?:json|csv|md))\s*===")
+
+# Statuses after which a streamed response can be cut short
+EARLY_STOP_STATUSES = {"BLOCKED", "NO_TRADES"}
+
+# How Claude returns the five files: === filename === text sections, or one
+# forced submit_daily_outputs tool call (see output_schema)
+OUTPUT_MODES = ("sections", "tool")
+
+# Tool outputs that must validate for the run to go ahead
+BLOCKING_FILES = {"run_status.json", "trade_plan.json", "orders.csv"}
+
+# Model cascade default (see run_cascade); the tiers come from config["claude_cascade"]
+DEFAULT_MIN_BUY_CONFIDENCE = 0.7
+
 
 def load_system_prompt():
     """Load V2 system prompt from system_prompt.txt."""
@@ -25,66 +52,299 @@ def load_system_prompt():
 
 def assemble_user_message(config, market_data_csv, positions_json,
                           universe_csv, trading_calendar_json,
-                          signals_json=None):
+                          signals_json=None, prefilter_json=None, compact=False,
+                          output_mode="sections"):
     """Build the user message containing all input files.
 
-    Each file is clearly delimited so Claude can parse them.
+    Each file is clearly delimited so Claude can parse them. prefilter_json
+    lists tickers removed by the compact-mode eligibility pre-filter; compact
+    serialises config without indentation. output_mode selects the output
+    instructions (see OUTPUT_MODES). Returns a list
+    of two text content blocks: the static context (config and universe),
+    marked cacheable so it is reused with the system prompt across runs, and
+    the daily data (market data, positions, calendar, signals) followed by
+    the output instructions.
     """
-    sections = [
-        f"=== config.json ===\n{json.dumps(config, indent=2)}",
+    config_json = prompt_encoding.compact_json(config) if compact else json.dumps(config, indent=2)
+    static_sections = [
+        f"=== config.json ===\n{config_json}",
+        f"=== universe.csv ===\n{universe_csv}",
+    ]
+    daily_sections = [
         f"=== market_data.csv ===\n{market_data_csv}",
         f"=== positions.json ===\n{positions_json}",
-        f"=== universe.csv ===\n{universe_csv}",
         f"=== trading_calendar.json ===\n{trading_calendar_json}",
     ]
 
     if signals_json:
-        sections.append(f"=== signals.json ===\n{signals_json}")
-
-    sections.append(
-        "\n--- OUTPUT INSTRUCTIONS ---\n"
-        "Output each file delimited by === filename === headers, "
-        "in this exact order:\n"
-        "=== run_status.json ===\n"
-        "=== trade_plan.json ===\n"
-        "=== orders.csv ===\n"
-        "=== daily_report.md ===\n"
-        "=== trade_log_update.json ===\n"
-        "Output valid JSON for .json files (no markdown code fences). "
-        "Output raw CSV for orders.csv. Output raw markdown for daily_report.md."
-    )
+        daily_sections.append(f"=== signals.json ===\n{signals_json}")
+    if prefilter_json:
+        daily_sections.append(f"=== prefilter_excluded.json ===\n{prefilter_json}")
+
+    if output_mode == "tool":
+        daily_sections.append(
+            "\n--- OUTPUT INSTRUCTIONS ---\n"
+            f"Submit all five output files in a single call to the {output_schema.TOOL_NAME} "
+            "tool instead of writing === filename === sections: run_status, "
+            "trade_plan and trade_log_update as JSON objects, orders as the list "
+            "of orders.csv rows (empty unless status is OK), daily_report as "
+            "markdown."
+        )
+    else:
+        daily_sections.append(
+            "\n--- OUTPUT INSTRUCTIONS ---\n"
+            "Output each file delimited by === filename === headers, "
+            "in this exact order:\n"
+            "=== run_status.json ===\n"
+            "=== trade_plan.json ===\n"
+            "=== orders.csv ===\n"
+            "=== daily_report.md ===\n"
+            "=== trade_log_update.json ===\n"
+            "Output valid JSON for .json files (no markdown code fences). "
+            "Output raw CSV for orders.csv. Output raw markdown for daily_report.md."
+        )
+
+    return [
+        {"type": "text", "text": "\n\n".join(static_sections),
+         "cache_control": CACHE_CONTROL},
+        {"type": "text", "text": "\n\n".join(daily_sections)},
+    ]
 
-    return "\n\n".join(sections)
 
+def message_text(content):
+    """Flatten user message content blocks (or a plain string) to text."""
+    if isinstance(content, str):
+        return content
+    return "\n\n".join(block["text"] for block in content)
 
-def call_claude(system_prompt, user_message, config):
+
+def call_claude(system_prompt, user_message, config, stream=False, stop_early=True,
+                output_mode="sections", call_info=None):
     """Call Claude API and return the full response text.
 
     Uses config['claude_model'] and config['claude_max_tokens'].
     API key from ANTHROPIC_API_KEY environment variable.
-    """
-    client = Anthropic()
 
-    model = config.get("claude_model", "claude-haiku-4-5-20251001")
-    max_tokens = config.get("claude_max_tokens", 8000)
+    The system prompt is sent as a cacheable block; together with the
+    cacheable static section of user_message (see assemble_user_message) it
+    forms a prefix the API serves from its prompt cache on later runs.
+
+    With stream=True the response is streamed and split into sections as it
+    arrives. If stop_early is also set and run_status.json comes back
+    BLOCKED or NO_TRADES, generation is stopped there and the text so far
+    is returned.
+
+    With output_mode="tool" Claude is forced to call submit_daily_outputs
+    and the returned text is the tool input as JSON (early stop does not
+    apply).
+
+    If call_info is a dict it is updated with the claude_call span fields,
+    including stop_reason ("early_stop" for a truncated stream).
+
+    The call runs under call_policy (per-attempt timeout, hedged request,
+    retries, circuit breaker) and raises call_policy.ClaudeUnavailable if
+    it cannot be completed.
+    """
+    model, max_tokens = model_settings(config)
 
-    log.info("Calling Claude API (model=%s, max_tokens=%d)...", model, max_tokens)
+    log.info("Calling Claude API (model=%s, max_tokens=%d%s)...", model, max_tokens,
+             ", streaming" if stream else "")
     log.info("System prompt: %d chars, User message: %d chars",
-             len(system_prompt), len(user_message))
+             len(system_prompt), len(message_text(user_message)))
+
+    request = build_request(system_prompt, user_message, config, output_mode)
+
+    def send(timeout):
+        """One attempt; returns (response_text, response, attempt stats)."""
+        client = Anthropic(timeout=timeout, max_retries=0)
+        stats = {}
+        started = time.perf_counter()
+        if stream:
+            response_text, response = _stream_response(client, request, stop_early, stats)
+        else:
+            response = client.messages.create(**request)
+            response_text = response_text_of(response, output_mode)
+        if stream and output_mode == "tool":
+            response_text = response_text_of(response, output_mode)
+        stats["attempt_sec"] = round(time.perf_counter() - started, 3)
+        return response_text, response, stats
+
+    with run_metrics.span("claude_call", model=model, streamed=stream,
+                          output_mode=output_mode) as span:
+        response_text, response, stats = call_policy.call(
+            send, call_policy.policy_from_config(config), span,
+        )
+        span.update(stats)
+        usage = response.usage
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        span.update(input_tokens=usage.input_tokens,
+                    output_tokens=usage.output_tokens,
+                    cache_read_tokens=cache_read,
+                    cache_write_tokens=cache_write)
+
+    if call_info is not None:
+        call_info.update(span)
+    log.info("Claude response: %d chars, stop_reason=%s",
+             len(response_text), span.get("stop_reason", response.stop_reason))
+    log.info("Token usage: input=%d, output=%d, cache_read=%d, cache_write=%d",
+             usage.input_tokens, usage.output_tokens, cache_read, cache_write)
+
+    return response_text
+
 
-    response = client.messages.create(
+def build_request(system_prompt, user_message, config, output_mode="sections"):
+    """Return the Messages API request parameters for a decision call."""
+    model, max_tokens = model_settings(config)
+    request = dict(
         model=model,
         max_tokens=max_tokens,
-        system=system_prompt,
+        system=[{"type": "text", "text": system_prompt,
+                 "cache_control": CACHE_CONTROL}],
         messages=[{"role": "user", "content": user_message}],
     )
+    if output_mode == "tool":
+        request["tools"] = [output_schema.TOOL]
+        request["tool_choice"] = {"type": "tool", "name": output_schema.TOOL_NAME}
+    return request
 
-    response_text = response.content[0].text
-    log.info("Claude response: %d chars, stop_reason=%s",
-             len(response_text), response.stop_reason)
-    log.info("Token usage: input=%d, output=%d",
-             response.usage.input_tokens, response.usage.output_tokens)
 
+def response_text_of(message, output_mode="sections"):
+    """Return the text to parse from a complete Messages API response."""
+    if output_mode == "tool":
+        return _tool_input_text(message)
+    return message.content[0].text
+
+
+def _stream_response(client, request, stop_early, span):
+    """Stream a response, parsing sections as they arrive.
+
+    Returns (response_text, message). When generation is stopped early the
+    message is the stream's snapshot so far, so its output token count only
+    covers what was generated before the stop.
+    """
+    parser = SectionParser()
+    started = time.perf_counter()
+
+    with client.messages.stream(**request) as stream:
+        for text in stream.text_stream:
+            if "first_token_sec" not in span:
+                span["first_token_sec"] = round(time.perf_counter() - started, 3)
+            parser.feed(text)
+
+            run_status = parser.run_status()
+            if run_status is None or "run_status_sec" in span:
+                continue
+            span["run_status_sec"] = round(time.perf_counter() - started, 3)
+            status = run_status.get("status")
+            log.info("run_status.json complete after %.1fs: %s",
+                     span["run_status_sec"], status)
+            if stop_early and status in EARLY_STOP_STATUSES:
+                log.info("Status is %s — stopping generation early", status)
+                span["stop_reason"] = "early_stop"
+                return parser.text, stream.current_message_snapshot
+
+        return parser.text, stream.get_final_message()
+
+
+def _tool_input_text(message):
+    """Return the submit_daily_outputs tool input from a message, as JSON text."""
+    for block in message.content:
+        if getattr(block, "type", None) == "tool_use" and block.name == output_schema.TOOL_NAME:
+            return json.dumps(block.input)
+    log.error("Response has no %s tool call", output_schema.TOOL_NAME)
+    return ""
+
+
+class SectionParser:
+    """Incrementally split streamed response text on === filename === headers.
+
+    feed() takes text chunks in order. A section is complete once the next
+    header arrives; a JSON section also counts as complete as soon as its
+    content parses, so run_status.json is available before the model starts
+    on the next file.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.sections = {}
+        self._current = None  # (filename, content start) of the open section
+        self._scan_from = 0
+
+    def feed(self, chunk):
+        """Add the next chunk of streamed text."""
+        self.text += chunk
+        for match in SECTION_HEADER.finditer(self.text, self._scan_from):
+            if self._current:
+                name, start = self._current
+                self.sections[name] = self.text[start:match.start()].strip()
+            self._current = (match.group(1).strip(), match.end())
+            self._scan_from = match.end()
+
+    def section(self, name):
+        """Return a section's content once it is complete, else None."""
+        if name in self.sections:
+            return self.sections[name]
+        if self._current and self._current[0] == name and name.endswith(".json"):
+            content = self.text[self._current[1]:].strip()
+            if _loads_quietly(content) is not None:
+                return content
+        return None
+
+    def run_status(self):
+        """Return the parsed run_status.json once complete, else None."""
+        content = self.section("run_status.json")
+        if content is None:
+            return None
+        parsed = _loads_quietly(content)
+        return parsed if isinstance(parsed, dict) else None
+
+
+def _loads_quietly(text):
+    """Parse JSON (allowing code fences), returning None on failure."""
+    try:
+        return json.loads(re.sub(r"```(?:json)?\s*", "", text).strip())
+    except json.JSONDecodeError:
+        return None
+
+
+def model_settings(config):
+    """Return (model, max_tokens) from config, with defaults."""
+    return (config.get("claude_model", "claude-haiku-4-5-20251001"),
+            config.get("claude_max_tokens", 8000))
+
+
+def get_response(system_prompt, user_message, config, cache_dir,
+                 cache_mode=response_cache.DEFAULT_MODE, stream=False,
+                 stop_early=True, output_mode="sections"):
+    """Return Claude's response text, going through the response cache.
+
+    cache_mode is one of response_cache.MODES: "replay" reuses a stored
+    response for identical inputs, "refresh" always calls and overwrites,
+    "bypass" always calls without touching the cache. stream, stop_early and
+    output_mode are passed to call_claude. Responses cut short by stop_early
+    are not stored, since the key does not record the stop mode.
+    """
+    model, max_tokens = model_settings(config)
+    key = response_cache.cache_key(system_prompt, message_text(user_message),
+                                   model, max_tokens)
+
+    if cache_mode == "replay":
+        cached = response_cache.load(cache_dir, key)
+        if cached is not None:
+            log.info("Response cache hit (%s…), skipping Claude API call", key[:12])
+            run_metrics.annotate(response_cache="hit")
+            return cached
+
+    run_metrics.annotate(response_cache="miss" if cache_mode == "replay" else cache_mode)
+    call_info = {}
+    response_text = call_claude(system_prompt, user_message, config,
+                                stream=stream, stop_early=stop_early,
+                                output_mode=output_mode, call_info=call_info)
+    if call_info.get("stop_reason") == "early_stop":
+        log.info("Response was stopped early, not caching it")
+    elif cache_mode != "bypass":
+        response_cache.store(cache_dir, key, response_text, model)
     return response_text
 
 
@@ -103,7 +363,7 @@ def parse_outputs(response_text):
     outputs = {}
 
     # Split on === filename === pattern
-    sections = re.split(r"===\s*(\S+\.(?:json|csv|md))\s*===", response_text)
+    sections = SECTION_HEADER.split(response_text)
 
     # sections alternates: [preamble, filename1, content1, filename2, content2, ...]
     file_contents = {}
@@ -136,8 +396,54 @@ def parse_outputs(response_text):
     return outputs
 
 
+def parse_tool_outputs(response_text):
+    """Parse and validate a submit_daily_outputs tool input (JSON text).
+
+    Returns the same dict as parse_outputs, plus "validation_errors": a
+    dict of output filename -> list of errors. Files that fail validation
+    are returned empty, and if any of BLOCKING_FILES fails the run status
+    is replaced with BLOCKED and no orders are returned.
+    """
+    try:
+        tool_input = json.loads(response_text) if response_text else None
+    except json.JSONDecodeError as e:
+        log.error("Tool input is not valid JSON: %s", e)
+        tool_input = None
+
+    errors = output_schema.validate(tool_input)
+    for filename, file_errors in errors.items():
+        log.error("  Invalid %s: %s", filename, "; ".join(file_errors[:5]))
+        if len(file_errors) > 5:
+            log.error("  ... and %d more errors in %s", len(file_errors) - 5, filename)
+
+    outputs = output_schema.to_outputs(tool_input or {}, errors)
+
+    # Never act on a plan whose status, decisions or orders failed validation
+    blocking = sorted(set(errors) & BLOCKING_FILES)
+    if blocking:
+        outputs["run_status"] = {
+            "status": "BLOCKED",
+            "as_of_date": outputs["run_status"].get("as_of_date"),
+            "reason": f"Invalid structured output: {', '.join(blocking)}",
+            "currency": "GBP",
+        }
+        outputs["orders_csv"] = ""
+
+    for key, val in outputs.items():
+        if val:
+            log.info("  Parsed %s: %s", key,
+                     f"{len(val)} chars" if isinstance(val, str) else "OK")
+    outputs["validation_errors"] = errors
+    return outputs
+
+
 def _parse_json_section(text, name):
-    """Parse a JSON section, handling possible markdown code fences."""
+    """Parse a JSON section, handling possible markdown code fences.
+
+    If the section has prose around the JSON, the first complete object in
+    it is used. Sections mode stays the default output mode (tool mode
+    cannot stop early on a streamed run_status), so this recovery is kept.
+    """
     if not text:
         log.warning("Empty section: %s", name)
         return {}
@@ -152,60 +458,117 @@ def _parse_json_section(text, name):
         log.error("Failed to parse %s: %s", name, e)
         log.error("Content preview: %s", cleaned[:200])
 
-        # Try to extract JSON object from the text
-        match = re.search(r"\{[\s\S]*\}", cleaned)
-        if match:
-            try:
-                return json.loads(match.group())
-            except json.JSONDecodeError:
-                pass
-
+    # The first complete object only, not everything up to the last brace
+    start = cleaned.find("{")
+    if start < 0:
         return {}
+    try:
+        obj, _ = json.JSONDecoder().raw_decode(cleaned, start)
+    except json.JSONDecodeError:
+        return {}
+    log.warning("Recovered %s from the object at offset %d", name, start)
+    return obj
 
 
-def run_decision_engine(config, base_dir):
-    """Main entry point for the decision engine.
+def compact_inputs(config, base_dir, positions_json, universe_csv,
+                   trading_cal_json, market_data=None):
+    """Re-encode the input files for the compact prompt (see prompt_encoding).
 
-    1. Load system prompt
-    2. Read input files from disk
-    3. Assemble user message
-    4. Call Claude API
-    5. Parse outputs
-    6. Write output files to output/ directory
-
-    Returns the parsed outputs dict.
+    market_data is the typed table from build_market_data; it is loaded
+    from data/ if not given. Returns (market_data_csv, positions_json,
+    universe_csv, trading_cal_json, prefilter_json); prefilter_json is None
+    when nothing was filtered.
     """
+    import data_pipeline
+
     base_dir = Path(base_dir)
+    if market_data is None:
+        market_data = data_pipeline.load_market_data(base_dir / "data" / "market_data.csv")
+    positions = json.loads(positions_json)
+    universe = list(csv.DictReader(io.StringIO(universe_csv)))
+    held = {p["ticker"] for p in positions.get("positions", [])}
+
+    kept, excluded = prompt_encoding.prefilter(market_data, universe, config, held)
+    if excluded:
+        log.info("Eligibility pre-filter removed %d of %d tickers",
+                 len(excluded), len(market_data))
+
+    return (
+        prompt_encoding.encode_market_data(kept),
+        prompt_encoding.compact_json(positions),
+        prompt_encoding.encode_universe(universe_csv),
+        prompt_encoding.compact_json(json.loads(trading_cal_json)),
+        prompt_encoding.compact_json(excluded) if excluded else None,
+    )
 
-    # Load system prompt
-    system_prompt = load_system_prompt()
 
-    # Read input files
-    market_data_csv = (base_dir / "data" / "market_data.csv").read_text()
-    positions_json = (base_dir / "positions.json").read_text()
-    universe_csv = (base_dir / "universe.csv").read_text()
-    trading_cal_json = (base_dir / "data" / "trading_calendar.json").read_text()
+def read_inputs(base_dir, positions_json=None):
+    """Read the decision engine's input files as text.
 
-    # Optional signals
-    signals_json = None
+    Returns dict with market_data_csv, positions_json, universe_csv,
+    trading_cal_json and signals_json (None if there is no signals file).
+    positions_json, if given, is used instead of reading positions.json
+    (bot.run passes today's marked state, which is saved at the end).
+    """
+    base_dir = Path(base_dir)
     signals_path = base_dir / "data" / "signals.json"
-    if signals_path.exists():
-        signals_json = signals_path.read_text()
-
-    # Assemble and call
+    if positions_json is None:
+        positions_json = (base_dir / "positions.json").read_text()
+    return {
+        "market_data_csv": (base_dir / "data" / "market_data.csv").read_text(),
+        "positions_json": positions_json,
+        "universe_csv": (base_dir / "universe.csv").read_text(),
+        "trading_cal_json": (base_dir / "data" / "trading_calendar.json").read_text(),
+        "signals_json": signals_path.read_text() if signals_path.exists() else None,
+    }
+
+
+def prepare_user_message(config, base_dir, inputs, encoding="full",
+                         output_mode="sections", span=None, market_data=None):
+    """Assemble the user message from read_inputs() in the given encoding.
+
+    If span is given, prompt size estimates are recorded on it. market_data
+    is passed on to compact_inputs.
+    """
     user_message = assemble_user_message(
-        config, market_data_csv, positions_json,
-        universe_csv, trading_cal_json, signals_json
+        config, inputs["market_data_csv"], inputs["positions_json"],
+        inputs["universe_csv"], inputs["trading_cal_json"], inputs["signals_json"],
+        output_mode=output_mode,
     )
-
-    response_text = call_claude(system_prompt, user_message, config)
-
-    # Parse outputs
-    outputs = parse_outputs(response_text)
-
-    # Write output files
-    output_dir = base_dir / "output"
-    output_dir.mkdir(exist_ok=True)
+    span = span if span is not None else {}
+    if encoding == "compact":
+        full_tokens = prompt_encoding.estimate_tokens(message_text(user_message))
+        market_data_csv, positions_json, universe_csv, trading_cal_json, \
+            prefilter_json = compact_inputs(config, base_dir, inputs["positions_json"],
+                                            inputs["universe_csv"],
+                                            inputs["trading_cal_json"], market_data)
+        user_message = assemble_user_message(
+            config, market_data_csv, positions_json, universe_csv,
+            trading_cal_json, inputs["signals_json"], prefilter_json, compact=True,
+            output_mode=output_mode,
+        )
+        compact_tokens = prompt_encoding.estimate_tokens(message_text(user_message))
+        log.info("Compact encoding: user message ~%d -> ~%d tokens (%.0f%% smaller)",
+                 full_tokens, compact_tokens,
+                 100 * (1 - compact_tokens / full_tokens) if full_tokens else 0)
+        span["full_tokens_est"] = full_tokens
+    span.update(encoding=encoding,
+                user_chars=len(message_text(user_message)),
+                user_tokens_est=prompt_encoding.estimate_tokens(message_text(user_message)))
+    return user_message
+
+
+def parse_response(response_text, output_mode="sections"):
+    """Parse response text with the parser for the output mode."""
+    if output_mode == "tool":
+        return parse_tool_outputs(response_text)
+    return parse_outputs(response_text)
+
+
+def write_outputs(outputs, response_text, output_dir):
+    """Write parsed outputs and the raw response to output_dir."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
 
     if outputs.get("run_status"):
         with open(output_dir / "run_status.json", "w", encoding="utf-8") as f:
@@ -232,8 +595,179 @@ def run_decision_engine(config, base_dir):
         with open(output_dir / "trade_log_update.json", "w", encoding="utf-8") as f:
             json.dump(outputs["trade_log_update"], f, indent=2)
 
+    validation_path = output_dir / "validation_errors.json"
+    if outputs.get("validation_errors"):
+        with open(validation_path, "w", encoding="utf-8") as f:
+            json.dump(outputs["validation_errors"], f, indent=2)
+    elif validation_path.exists():
+        validation_path.unlink()
+
     # Save raw response for debugging
     with open(output_dir / "raw_response.txt", "w", encoding="utf-8") as f:
         f.write(response_text)
 
+
+def run_decision_engine(config, base_dir, cache_mode=response_cache.DEFAULT_MODE,
+                        encoding="full", stream=False, stop_early=True,
+                        output_mode="sections", cascade=False, positions_json=None,
+                        market_data=None):
+    """Main entry point for the decision engine.
+
+    1. Load system prompt
+    2. Read input files from disk
+    3. Assemble user message
+    4. Call Claude API (or replay a cached response, see get_response)
+    5. Parse outputs
+    6. Write output files to output/ directory
+
+    encoding is "full" (input files verbatim) or "compact" (see
+    prompt_encoding). stream and stop_early select a streamed call that can
+    stop once run_status.json is BLOCKED or NO_TRADES (see call_claude).
+    output_mode is "sections" (=== filename === text) or "tool" (a forced
+    submit_daily_outputs call validated against output_schema). cascade
+    runs the model cascade (see run_cascade) instead of a single call.
+    positions_json overrides positions.json on disk (see read_inputs), and
+    market_data (the table build_market_data returned) saves re-reading
+    it from disk. Returns the parsed outputs dict.
+    """
+    base_dir = Path(base_dir)
+    if cascade:
+        response_text, outputs = run_cascade(config, base_dir, cache_mode, encoding,
+                                             stream, stop_early, output_mode,
+                                             positions_json, market_data)
+    else:
+        response_text, outputs = _decide(config, base_dir, cache_mode, encoding,
+                                         stream, stop_early, output_mode, positions_json,
+                                         market_data)
+    write_outputs(outputs, response_text, base_dir / "output")
     return outputs
+
+
+def _decide(config, base_dir, cache_mode, encoding, stream, stop_early, output_mode,
+            positions_json=None, market_data=None):
+    """Assemble, call and parse once. Returns (response_text, outputs)."""
+    with run_metrics.span("assemble_prompt") as span:
+        system_prompt = load_system_prompt()
+        inputs = read_inputs(base_dir, positions_json)
+        user_message = prepare_user_message(config, base_dir, inputs, encoding,
+                                            output_mode, span, market_data)
+        span["system_chars"] = len(system_prompt)
+
+    response_text = get_response(
+        system_prompt, user_message, config,
+        cache_dir=base_dir / "data" / "response_cache", cache_mode=cache_mode,
+        stream=stream, stop_early=stop_early, output_mode=output_mode,
+    )
+
+    # Parse outputs
+    with run_metrics.span("parse", response_chars=len(response_text)) as span:
+        outputs = parse_response(response_text, output_mode)
+        if "validation_errors" in outputs:
+            span["invalid_files"] = sorted(outputs["validation_errors"])
+    return response_text, outputs
+
+
+def cascade_settings(config):
+    """Return (models, min_buy_confidence) for the model cascade.
+
+    The tiers are config["claude_cascade"]["models"], cheapest first, with
+    its "min_buy_confidence". Without them the cascade is claude_model
+    alone and nothing is escalated.
+    """
+    settings = config.get("claude_cascade", {})
+    models = settings.get("models") or [model_settings(config)[0]]
+    if len(models) < 2:
+        log.warning("Model cascade has a single tier (%s); set claude_cascade.models "
+                    "in config.json to escalate", models[0])
+    return models, settings.get("min_buy_confidence", DEFAULT_MIN_BUY_CONFIDENCE)
+
+
+def run_cascade(config, base_dir, cache_mode=response_cache.DEFAULT_MODE,
+                encoding="full", stream=False, stop_early=True, output_mode="sections",
+                positions_json=None, market_data=None):
+    """Decide with the cheapest model first, escalating only when needed.
+
+    The first tier gets the compact encoding; later tiers get `encoding`.
+    A tier's answer is escalated if it fails schema validation, violates a
+    hard constraint (rule_engine.check_constraints) or proposes a BUY below
+    min_buy_confidence. Escalations are logged and recorded on the run's
+    metrics with their latency. If the last tier still fails validation of
+    BLOCKING_FILES or a hard constraint, the day is BLOCKED. market_data is
+    read from data/market_data.csv if not given.
+
+    Returns (response_text, outputs).
+    """
+    import data_pipeline
+    import rule_engine
+
+    models, min_confidence = cascade_settings(config)
+    if market_data is None:
+        market_data = data_pipeline.load_market_data(base_dir / "data" / "market_data.csv")
+    if positions_json is None:
+        positions_json = (base_dir / "positions.json").read_text()
+    positions = json.loads(positions_json)
+    universe = rule_engine.load_universe_rows(base_dir / "universe.csv")
+
+    escalations = []
+    for tier, model in enumerate(models):
+        tier_encoding = "compact" if tier == 0 else encoding
+        with run_metrics.span("cascade", tier=tier, model=model,
+                              encoding=tier_encoding) as span:
+            response_text, outputs = _decide(
+                {**config, "claude_model": model}, base_dir, cache_mode,
+                tier_encoding, stream, stop_early, output_mode, positions_json,
+                market_data,
+            )
+            reasons = escalation_reasons(outputs, config, market_data, positions,
+                                         universe, min_confidence)
+            span["escalation_reasons"] = reasons
+        if not reasons or tier == len(models) - 1:
+            break
+        log.warning("Escalating %s -> %s after %.1fs: %s", model, models[tier + 1],
+                    span["wall_sec"], "; ".join(reasons))
+        escalations.append({"from": model, "to": models[tier + 1], "reasons": reasons,
+                            "latency_sec": span["wall_sec"]})
+        run_metrics.annotate(escalations=escalations)
+
+    hard = [r for r in reasons if r.startswith("constraint")
+            or (r.startswith("schema") and r.split()[1].rstrip(":") in BLOCKING_FILES)]
+    if hard:
+        log.error("Final tier %s still fails: %s", model, "; ".join(hard))
+        outputs["run_status"] = {
+            "status": "BLOCKED",
+            "as_of_date": (outputs.get("run_status") or {}).get("as_of_date"),
+            "reason": f"Model cascade exhausted: {'; '.join(hard)}",
+            "currency": "GBP",
+        }
+        outputs["orders_csv"] = ""
+    return response_text, outputs
+
+
+def escalation_reasons(outputs, config, market_data, positions, universe,
+                       min_buy_confidence):
+    """Reasons to escalate a tier's answer; empty if it can be accepted.
+
+    Each reason starts with its kind: "schema <file>", "constraint" or
+    "low_confidence".
+    """
+    import rule_engine
+
+    errors = outputs.get("validation_errors")
+    if errors is None:
+        errors = output_schema.validate(output_schema.from_outputs(outputs))
+    status = (outputs.get("run_status") or {}).get("status")
+    if status in EARLY_STOP_STATUSES:
+        # Early-stopped or no-trade answers only need a valid run_status
+        errors = {k: v for k, v in errors.items() if k == "run_status.json"}
+
+    reasons = [f"schema {name}: {file_errors[0]}" for name, file_errors in sorted(errors.items())]
+    reasons += [f"constraint: {v}" for v in
+                rule_engine.check_constraints(outputs, config, market_data, positions,
+                                              universe)]
+    for d in (outputs.get("trade_plan") or {}).get("decisions", []):
+        confidence = d.get("confidence")
+        if d.get("action") == "BUY" and (not isinstance(confidence, (int, float))
+                                         or confidence < min_buy_confidence):
+            reasons.append(f"low_confidence: BUY {d.get('ticker')} at {confidence} "
+                           f"< {min_buy_confidence}")
+    return reasons
@@ -2,6 +2,8 @@
 
 Reads all JSON/CSV data files and produces a self-contained docs/index.html
 with embedded data, Chart.js charts, and responsive dark-theme layout.
+Latest closes for the positions table come from the typed market data
+snapshot (data/market_data.npz) the run leaves behind.
 Deployed to GitHub Pages for access from any device.
 """
 
@@ -32,6 +34,16 @@ def load_text(path):
         return ""
 
 
+def load_closes(path):
+    """Return ticker -> close_gbp from a market data snapshot, {} if missing."""
+    if not path.exists():
+        return {}
+    import data_pipeline
+
+    return {sym: row.get("close_gbp")
+            for sym, row in data_pipeline.load_market_data(path).items()}
+
+
 def markdown_to_html(md_text):
     """Simple markdown to HTML conversion (no external deps)."""
     if not md_text:
@@ -131,6 +143,7 @@ def generate():
     trade_log_update = load_json(BASE_DIR / "output" / "trade_log_update.json", {})
     equity_history = load_json(BASE_DIR / "equity_history.json", [])
     daily_report_md = load_text(BASE_DIR / "output" / "daily_report.md")
+    closes = load_closes(BASE_DIR / "data" / "market_data.npz")
 
     # Compute summary values
     equity = positions.get("equity_value_gbp", 100)
@@ -177,6 +190,7 @@ def generate():
         total_pnl_pct=total_pnl_pct,
         drawdown_pct=drawdown_pct,
         pos_list=pos_list,
+        closes=closes,
         as_of=as_of,
         status=status,
         max_positions=max_positions,
@@ -213,12 +227,17 @@ def _build_html(**data):
         mv = p.get("market_value_gbp", 0)
         pnl_pct = (pnl / (cost * p.get("quantity", 1)) * 100) if cost > 0 and p.get("quantity", 0) > 0 else 0
         stop = p.get("current_stop_gbp")
+        close = data["closes"].get(p.get("ticker"))
         stop_str = f"£{stop:.2f}" if stop else "—"
+        if stop and close:
+            stop_str += f" ({(stop / close - 1) * 100:+.1f}%)"
+        close_str = f"£{close:.2f}" if close else "—"
         pos_rows += f"""<tr>
             <td><strong>{p.get('ticker','')}</strong></td>
             <td>{p.get('sector','')}</td>
             <td>{p.get('quantity',0):.4f}</td>
             <td>£{cost:.2f}</td>
+            <td>{close_str}</td>
             <td>£{mv:.2f}</td>
             <td style="color:{pnl_c}">£{pnl:+.2f} ({pnl_pct:+.1f}%)</td>
             <td>{p.get('days_held',0)}</td>
@@ -226,7 +245,7 @@ def _build_html(**data):
         </tr>"""
 
     if not data["pos_list"]:
-        pos_rows = '<tr><td colspan="8" style="text-align:center;color:#64748b">No positions held</td></tr>'
+        pos_rows = '<tr><td colspan="9" style="text-align:center;color:#64748b">No positions held</td></tr>'
 
     # Candidates rows
     cand_rows = ""
@@ -357,7 +376,7 @@ details summary {{ font-size:0.85rem; color:#60a5fa; padding:4px 0; }}
     <div class="section-title">Positions</div>
     <div style="overflow-x:auto">
     <table>
-        <thead><tr><th>Ticker</th><th>Sector</th><th>Qty</th><th>Avg Cost</th><th>Mkt Value</th><th>P&L</th><th>Days</th><th>Stop</th></tr></thead>
+        <thead><tr><th>Ticker</th><th>Sector</th><th>Qty</th><th>Avg Cost</th><th>Close</th><th>Mkt Value</th><th>P&L</th><th>Days</th><th>Stop</th></tr></thead>
         <tbody>{pos_rows}</tbody>
     </table>
     </div>
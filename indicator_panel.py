@@ -0,0 +1,228 @@
+"""Vectorized cross-sectional indicator engine.
+
+Aligns every ticker's history into one bars x tickers matrix and computes all
+V2 indicators for the whole universe in single vectorized passes. Produces the
+same per-ticker rows as data_pipeline.compute_indicators.
+
+Histories are right-aligned by bar position rather than by calendar date, so
+each ticker's rolling windows cover exactly its own last N bars, just as they
+do when the ticker is computed on its own. Shorter histories are padded with
+NaN at the top of the matrix.
+"""
+
+import logging
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import bar_store
+
+log = logging.getLogger(__name__)
+
+MIN_ROWS = 20
+SLOPE_LOOKBACK = 5
+SLOPE_THRESHOLD = 0.001
+
+
+def align_panel(frames, divisors=None):
+    """Right-align per-ticker OHLCV DataFrames into GBP price matrices.
+
+    Args:
+        frames: dict of ticker -> DataFrame with Open/High/Low/Close/Volume
+        divisors: dict of ticker -> price divisor (100.0 for GBX), default 1.0
+
+    See align_arrays for the returned panel.
+    """
+    bars = {sym: bar_store.frame_to_arrays(df, compact=False) for sym, df in frames.items()}
+    return align_arrays(bars, divisors)
+
+
+PANEL_FIELDS = {
+    "open_gbp": "open", "high_gbp": "high", "low_gbp": "low",
+    "close_gbp": "close", "volume": "volume",
+}
+
+
+def panel_shape(bars):
+    """(n_bars, n_tickers) of the matrices align_arrays builds for bars."""
+    return max((len(arrays["day"]) for arrays in bars.values()), default=0), len(bars)
+
+
+def align_arrays(bars, divisors=None, out=None):
+    """Right-align per-ticker bar arrays (bar_store layout) into GBP price matrices.
+
+    Args:
+        bars: dict of ticker -> dict of day/open/high/low/close/volume arrays,
+            e.g. memory-mapped from the bar store
+        divisors: dict of ticker -> price divisor (100.0 for GBX), default 1.0
+        out: optional dict of field -> preallocated float64 matrix of
+            panel_shape(bars) to fill in place (e.g. views of shared memory)
+
+    Returns dict with "tickers", "dates" (last bar date per ticker), "rows"
+    (bar count per ticker) and n_bars x n_tickers float64 arrays "open_gbp",
+    "high_gbp", "low_gbp", "close_gbp" and "volume".
+    """
+    divisors = divisors or {}
+    tickers = list(bars)
+    rows = np.array([len(bars[sym]["day"]) for sym in tickers], dtype=np.int64)
+    n_bars = panel_shape(bars)[0]
+
+    if out is None:
+        panel = {name: np.full((n_bars, len(tickers)), np.nan) for name in PANEL_FIELDS}
+    else:
+        panel = {name: out[name] for name in PANEL_FIELDS}
+        for matrix in panel.values():
+            matrix.fill(np.nan)
+    dates = []
+
+    for j, sym in enumerate(tickers):
+        arrays = bars[sym]
+        divisor = divisors.get(sym, 1.0)
+        start = n_bars - rows[j]
+        for name, field in PANEL_FIELDS.items():
+            values = bar_store.column(arrays, field)
+            panel[name][start:, j] = values if name == "volume" else values / divisor
+        dates.append(date.fromordinal(int(arrays["day"][-1])) if rows[j] else None)
+
+    panel["tickers"] = tickers
+    panel["dates"] = dates
+    panel["rows"] = rows
+    return panel
+
+
+def compute_panel_indicators(panel):
+    """Compute V2 indicators for every ticker in an aligned panel.
+
+    Returns dict of ticker -> indicator dict (same keys and rounding as
+    data_pipeline.compute_indicators), or None where data is insufficient.
+    """
+    tickers = panel["tickers"]
+    if not tickers:
+        return {}
+
+    close = pd.DataFrame(panel["close_gbp"])
+    high = pd.DataFrame(panel["high_gbp"])
+    low = pd.DataFrame(panel["low_gbp"])
+    volume = pd.DataFrame(panel["volume"])
+
+    sma50 = close.rolling(window=50, min_periods=50).mean().to_numpy()
+    sma200 = close.rolling(window=200, min_periods=200).mean().to_numpy()
+
+    # ATR14: true range ignores the missing previous close on the first bar
+    prev_close = close.shift(1).to_numpy()
+    h, l = high.to_numpy(), low.to_numpy()
+    true_range = np.fmax(np.fmax(h - l, np.abs(h - prev_close)), np.abs(l - prev_close))
+    atr14 = pd.DataFrame(true_range).rolling(window=14, min_periods=14).mean().to_numpy()
+
+    high_20d = high.rolling(window=20, min_periods=20).max().to_numpy()[-1]
+    low_20d = low.rolling(window=20, min_periods=20).min().to_numpy()[-1]
+    avg_volume_20d = volume.rolling(window=20, min_periods=20).mean().to_numpy()[-1]
+    avg_gbp_volume_20d = (close * volume).rolling(
+        window=20, min_periods=20
+    ).mean().to_numpy()[-1]
+
+    c = panel["close_gbp"][-1]
+    v = panel["volume"][-1]
+    drawdown = (high_20d - c) / high_20d
+    volume_ratio = v / avg_volume_20d
+    close_vs_sma50 = (c - sma50[-1]) / sma50[-1]
+
+    slopes = _sma_slopes(sma50)
+    below_counts = _trailing_true_run(panel["close_gbp"] < sma50)
+
+    latest = {
+        "close_gbp": c, "high_gbp": panel["high_gbp"][-1],
+        "low_gbp": panel["low_gbp"][-1], "open_gbp": panel["open_gbp"][-1],
+        "sma50_gbp": sma50[-1], "sma200_gbp": sma200[-1], "atr14_gbp": atr14[-1],
+        "high_20d_gbp": high_20d, "low_20d_gbp": low_20d,
+        "avg_volume_20d": avg_volume_20d, "avg_gbp_volume_20d": avg_gbp_volume_20d,
+    }
+
+    results = {}
+    for j, sym in enumerate(tickers):
+        n_rows = int(panel["rows"][j])
+        if n_rows < MIN_ROWS:
+            log.warning("  %s: only %d rows, need 20+ for indicators", sym, n_rows)
+            results[sym] = None
+            continue
+
+        if np.isnan(latest["sma50_gbp"][j]) or np.isnan(latest["atr14_gbp"][j]):
+            if np.isnan(c[j]):
+                log.warning("  %s: missing close_gbp in latest row", sym)
+                results[sym] = None
+                continue
+            if np.isnan(latest["atr14_gbp"][j]) and n_rows >= 14:
+                log.warning("  %s: ATR14 is NaN despite %d rows", sym, n_rows)
+
+        last_date = panel["dates"][j]
+        row = {
+            "date": last_date.strftime("%Y-%m-%d") if hasattr(last_date, "strftime") else str(last_date),
+            "ticker": sym,
+        }
+        for key in ("close_gbp", "high_gbp", "low_gbp", "open_gbp"):
+            row[key] = _round(latest[key][j])
+        row["volume"] = int(v[j])
+        row["sma50_gbp"] = _round(latest["sma50_gbp"][j])
+        row["sma200_gbp"] = _round(latest["sma200_gbp"][j])
+        row["sma50_slope"] = slopes[j]
+        for key in ("atr14_gbp", "high_20d_gbp", "low_20d_gbp",
+                    "avg_volume_20d", "avg_gbp_volume_20d"):
+            row[key] = _round(latest[key][j])
+        row["drawdown_from_20d_high_pct"] = _round(drawdown[j], 6)
+        row["volume_ratio_20d"] = _round(volume_ratio[j], 4)
+        row["close_vs_sma50_pct"] = _round(close_vs_sma50[j], 6)
+        row["consecutive_days_below_sma50"] = int(below_counts[j])
+        results[sym] = row
+
+    return results
+
+
+def _sma_slopes(sma, lookback=SLOPE_LOOKBACK):
+    """Vectorized SMA slope direction over each column's last N valid values.
+
+    Returns a list of 'positive', 'negative' or 'flat' per column.
+    """
+    valid = ~np.isnan(sma)
+    # Number of valid values at or below each row, counted from the bottom
+    from_end = np.cumsum(valid[::-1], axis=0)[::-1]
+    n_valid = valid.sum(axis=0)
+    window = np.minimum(n_valid, lookback)
+
+    # The first value of the window is the valid row whose count equals window
+    is_first = valid & (from_end == window)
+    first_row = np.where(is_first.any(axis=0), is_first.argmax(axis=0), 0)
+    last_row = np.where(valid.any(axis=0), len(sma) - 1 - valid[::-1].argmax(axis=0), 0)
+
+    cols = np.arange(sma.shape[1])
+    first = sma[first_row, cols] if len(sma) else np.full(sma.shape[1], np.nan)
+    last = sma[last_row, cols] if len(sma) else np.full(sma.shape[1], np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = (last - first) / first
+
+    slopes = []
+    for j in cols:
+        if window[j] < 2 or first[j] == 0:
+            slopes.append("flat")
+        elif change_pct[j] > SLOPE_THRESHOLD:
+            slopes.append("positive")
+        elif change_pct[j] < -SLOPE_THRESHOLD:
+            slopes.append("negative")
+        else:
+            slopes.append("flat")
+    return slopes
+
+
+def _trailing_true_run(mask):
+    """Length of the run of True values ending at the last row, per column."""
+    if not len(mask):
+        return np.zeros(mask.shape[1], dtype=np.int64)
+    return np.cumprod(mask[::-1], axis=0).sum(axis=0)
+
+
+def _round(value, decimals=4):
+    """Round a value, returning None for NaN."""
+    if pd.isna(value):
+        return None
+    return round(float(value), decimals)
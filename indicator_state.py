@@ -0,0 +1,357 @@
+"""Incremental indicator state — constant-time daily indicator updates.
+
+Every V2 indicator can be advanced one bar at a time from a small state:
+running sums over fixed windows for the SMAs, ATR and volume averages,
+monotonic deques for the 20-day high/low, the last few SMA50 values for the
+slope and a counter for consecutive days below SMA50. The state is persisted
+per ticker in data/indicator_state.json, so the daily run ingests only the
+bars added since the previous run instead of recomputing a year of history.
+
+The state is rebuilt from the full history when it cannot be trusted: no
+saved state, a changed GBX/GBP divisor, the last ingested bar missing from
+the fetched history (gap) or its values changed (restatement).
+"""
+
+import json
+import logging
+import math
+from collections import deque
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+import bar_store
+
+log = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+MIN_ROWS = 20
+SLOPE_LOOKBACK = 5
+SLOPE_THRESHOLD = 0.001
+
+# Rebuild instead of replaying when more bars than this arrive at once
+MAX_CATCHUP_BARS = 20
+
+BAR_FIELDS = ["open", "high", "low", "close", "volume"]
+
+# Relative tolerance when checking the last ingested bar for restatement
+RESTATEMENT_TOLERANCE = 1e-9
+
+
+class RollingWindow:
+    """Fixed-size rolling mean/max/min with the pandas min_periods=size rule.
+
+    The aggregate is NaN until the window is full and whenever it contains
+    a NaN. Means use a compensated running sum; max/min use a monotonic
+    deque of (bar index, value) pairs.
+    """
+
+    __slots__ = ("size", "kind", "values", "nan_count", "total", "comp", "mono", "count")
+
+    def __init__(self, size, kind="mean"):
+        self.size = size
+        self.kind = kind
+        self.values = deque()
+        self.nan_count = 0
+        self.total = 0.0
+        self.comp = 0.0
+        self.mono = deque()
+        self.count = 0
+
+    def push(self, value):
+        """Add the next bar's value, evicting the oldest once full."""
+        idx = self.count
+        self.count += 1
+
+        self.values.append(value)
+        if math.isnan(value):
+            self.nan_count += 1
+        elif self.kind == "mean":
+            self._add(value)
+        else:
+            better = (lambda a, b: a >= b) if self.kind == "max" else (lambda a, b: a <= b)
+            while self.mono and better(value, self.mono[-1][1]):
+                self.mono.pop()
+            self.mono.append((idx, value))
+
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            if math.isnan(old):
+                self.nan_count -= 1
+            elif self.kind == "mean":
+                self._add(-old)
+        while self.mono and self.mono[0][0] <= idx - self.size:
+            self.mono.popleft()
+
+    def value(self):
+        """Return the current aggregate, or NaN if the window is incomplete."""
+        if len(self.values) < self.size or self.nan_count:
+            return math.nan
+        if self.kind == "mean":
+            return self.total / self.size
+        return self.mono[0][1]
+
+    def _add(self, x):
+        # Kahan summation keeps the running sum from drifting over years of bars
+        y = x - self.comp
+        t = self.total + y
+        self.comp = (t - self.total) - y
+        self.total = t
+
+    def to_dict(self):
+        return {
+            "values": list(self.values), "nan_count": self.nan_count,
+            "total": self.total, "comp": self.comp,
+            "mono": [list(p) for p in self.mono], "count": self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, size, kind, d):
+        w = cls(size, kind)
+        w.values = deque(d["values"])
+        w.nan_count = d["nan_count"]
+        w.total = d["total"]
+        w.comp = d["comp"]
+        w.mono = deque(tuple(p) for p in d["mono"])
+        w.count = d["count"]
+        return w
+
+
+# name -> (window size, aggregate)
+WINDOWS = {
+    "sma50": (50, "mean"),
+    "sma200": (200, "mean"),
+    "atr14": (14, "mean"),
+    "high_20d": (20, "max"),
+    "low_20d": (20, "min"),
+    "avg_volume_20d": (20, "mean"),
+    "avg_gbp_volume_20d": (20, "mean"),
+}
+
+
+class TickerState:
+    """Indicator state for one ticker, advanced one bar at a time."""
+
+    def __init__(self, divisor=1.0):
+        self.divisor = divisor
+        self.windows = {name: RollingWindow(size, kind) for name, (size, kind) in WINDOWS.items()}
+        self.rows = 0
+        self.last_bar = None
+        self.prev_close = math.nan
+        self.sma50_recent = deque(maxlen=SLOPE_LOOKBACK)
+        self.below_sma50 = 0
+
+    def advance(self, bar_date, o, h, l, c, v):
+        """Ingest one raw bar (prices in the quote currency)."""
+        o_gbp, h_gbp, l_gbp, c_gbp = (x / self.divisor for x in (o, h, l, c))
+
+        # True range skips the missing previous close on the first bar
+        ranges = [x for x in (h_gbp - l_gbp, abs(h_gbp - self.prev_close),
+                              abs(l_gbp - self.prev_close)) if not math.isnan(x)]
+        true_range = max(ranges) if ranges else math.nan
+
+        w = self.windows
+        w["sma50"].push(c_gbp)
+        w["sma200"].push(c_gbp)
+        w["atr14"].push(true_range)
+        w["high_20d"].push(h_gbp)
+        w["low_20d"].push(l_gbp)
+        w["avg_volume_20d"].push(v)
+        w["avg_gbp_volume_20d"].push(c_gbp * v)
+
+        sma50 = w["sma50"].value()
+        if not math.isnan(sma50):
+            self.sma50_recent.append(sma50)
+        self.below_sma50 = self.below_sma50 + 1 if c_gbp < sma50 else 0
+
+        self.prev_close = c_gbp
+        self.rows += 1
+        self.last_bar = [bar_date, o, h, l, c, v]
+
+    def indicators(self, ticker_sym):
+        """Return the latest indicator row, matching compute_indicators."""
+        if self.rows < MIN_ROWS:
+            log.warning("  %s: only %d rows, need 20+ for indicators", ticker_sym, self.rows)
+            return None
+
+        bar_date, o, h, l, c, v = self.last_bar
+        close = c / self.divisor
+        values = {name: w.value() for name, w in self.windows.items()}
+
+        if math.isnan(values["sma50"]) or math.isnan(values["atr14"]):
+            if math.isnan(close):
+                log.warning("  %s: missing close_gbp in latest row", ticker_sym)
+                return None
+            if math.isnan(values["atr14"]) and self.rows >= 14:
+                log.warning("  %s: ATR14 is NaN despite %d rows", ticker_sym, self.rows)
+
+        high_20d = values["high_20d"]
+        return {
+            "date": bar_date,
+            "ticker": ticker_sym,
+            "close_gbp": _round(close),
+            "high_gbp": _round(h / self.divisor),
+            "low_gbp": _round(l / self.divisor),
+            "open_gbp": _round(o / self.divisor),
+            "volume": int(v),
+            "sma50_gbp": _round(values["sma50"]),
+            "sma200_gbp": _round(values["sma200"]),
+            "sma50_slope": self._slope(),
+            "atr14_gbp": _round(values["atr14"]),
+            "high_20d_gbp": _round(high_20d),
+            "low_20d_gbp": _round(values["low_20d"]),
+            "avg_volume_20d": _round(values["avg_volume_20d"]),
+            "avg_gbp_volume_20d": _round(values["avg_gbp_volume_20d"]),
+            "drawdown_from_20d_high_pct": _round(_div(high_20d - close, high_20d), 6),
+            "volume_ratio_20d": _round(_div(v, values["avg_volume_20d"]), 4),
+            "close_vs_sma50_pct": _round(_div(close - values["sma50"], values["sma50"]), 6),
+            "consecutive_days_below_sma50": self.below_sma50,
+        }
+
+    def _slope(self):
+        recent = self.sma50_recent
+        if len(recent) < 2 or recent[0] == 0:
+            return "flat"
+        change_pct = (recent[-1] - recent[0]) / recent[0]
+        if change_pct > SLOPE_THRESHOLD:
+            return "positive"
+        elif change_pct < -SLOPE_THRESHOLD:
+            return "negative"
+        return "flat"
+
+    def to_dict(self):
+        return {
+            "divisor": self.divisor,
+            "windows": {name: w.to_dict() for name, w in self.windows.items()},
+            "rows": self.rows,
+            "last_bar": self.last_bar,
+            "prev_close": self.prev_close,
+            "sma50_recent": list(self.sma50_recent),
+            "below_sma50": self.below_sma50,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d["divisor"])
+        s.windows = {
+            name: RollingWindow.from_dict(size, kind, d["windows"][name])
+            for name, (size, kind) in WINDOWS.items()
+        }
+        s.rows = d["rows"]
+        s.last_bar = d["last_bar"]
+        s.prev_close = d["prev_close"]
+        s.sma50_recent = deque(d["sma50_recent"], maxlen=SLOPE_LOOKBACK)
+        s.below_sma50 = d["below_sma50"]
+        return s
+
+
+def load_state(path):
+    """Load persisted indicator state. Returns {} if missing, corrupt or outdated."""
+    try:
+        with open(path) as f:
+            raw = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if raw.get("version") != STATE_VERSION:
+        return {}
+    try:
+        return {sym: TickerState.from_dict(d) for sym, d in raw["tickers"].items()}
+    except (KeyError, TypeError) as e:
+        log.warning("Indicator state unreadable (%s), rebuilding", e)
+        return {}
+
+
+def save_state(states, path):
+    """Write indicator state for all tickers."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # NaN is written as the non-standard NaN literal, which json.load accepts
+    with open(path, "w") as f:
+        json.dump({
+            "version": STATE_VERSION,
+            "tickers": {sym: s.to_dict() for sym, s in states.items()},
+        }, f)
+
+
+def update(states, ticker_sym, df, divisor=1.0):
+    """Advance a ticker's state to the last bar of df and return its indicators.
+
+    df is the fetched OHLCV history (raw Open/High/Low/Close/Volume).
+    See update_arrays.
+    """
+    return update_arrays(
+        states, ticker_sym, bar_store.frame_to_arrays(df, compact=False), divisor
+    )
+
+
+def update_arrays(states, ticker_sym, arrays, divisor=1.0):
+    """Advance a ticker's state to the last bar and return its indicators.
+
+    arrays is the ticker's history in bar_store layout (day/open/high/low/
+    close/volume, e.g. memory-mapped from the store). Only bars after the
+    last ingested one are read; the state is rebuilt from the whole history
+    if a gap, restatement or divisor change is detected.
+    """
+    state = states.get(ticker_sym)
+
+    # Only the tail is inspected on the incremental path
+    tail = {name: a[-(MAX_CATCHUP_BARS + 1):] for name, a in arrays.items()}
+    new_count = _resume_position(state, tail, divisor, ticker_sym)
+    if new_count is None:
+        state = TickerState(divisor)
+        states[ticker_sym] = state
+        new = arrays
+    else:
+        new = {name: a[len(a) - new_count:] for name, a in arrays.items()}
+
+    values = np.column_stack([bar_store.column(new, name) for name in BAR_FIELDS])
+    for day, row in zip(new["day"], values):
+        state.advance(date.fromordinal(int(day)).isoformat(), *(float(x) for x in row))
+
+    return state.indicators(ticker_sym)
+
+
+def _resume_position(state, tail, divisor, ticker_sym):
+    """Return how many bars at the end of tail are new, or None to rebuild."""
+    if state is None or state.last_bar is None:
+        return None
+    if state.divisor != divisor:
+        log.info("  %s: currency divisor changed, rebuilding indicator state", ticker_sym)
+        return None
+
+    last_date = state.last_bar[0]
+    last_day = date.fromisoformat(last_date).toordinal()
+    matches = np.flatnonzero(np.asarray(tail["day"]) == last_day)
+    if not len(matches):
+        log.info("  %s: last ingested bar %s not in recent history (gap), rebuilding",
+                 ticker_sym, last_date)
+        return None
+
+    pos = int(matches[0])
+    fetched = [float(bar_store.column(tail, name)[pos]) for name in BAR_FIELDS]
+    if not all(_same(a, b) for a, b in zip(fetched, state.last_bar[1:])):
+        log.info("  %s: bar %s restated, rebuilding indicator state", ticker_sym, last_date)
+        return None
+
+    return len(tail["day"]) - 1 - pos
+
+
+def _same(a, b, tolerance=RESTATEMENT_TOLERANCE):
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    return abs(a - b) <= tolerance * max(abs(a), abs(b), 1e-12)
+
+
+def _div(a, b):
+    """Divide like pandas: x/0 is +-inf and 0/0 is NaN."""
+    if b == 0:
+        return math.nan if a == 0 or math.isnan(a) else math.copysign(math.inf, a)
+    return a / b
+
+
+def _round(value, decimals=4):
+    """Round a value, returning None for NaN."""
+    if value is None or math.isnan(value):
+        return None
+    return round(float(value), decimals)
@@ -0,0 +1,353 @@
+"""Local stand-in for the Anthropic Messages API, serving recorded responses.
+
+Runs an HTTP server that answers POST /v1/messages with a recorded response
+(a raw_response.txt-style text file, or a .json tool input for tool output
+mode) after a configurable latency, with plausible token usage. Streaming
+requests get server-sent events in the real API's event sequence. Point the
+SDK at it with ANTHROPIC_BASE_URL:
+
+    python mock_anthropic.py --fixtures fixtures/ --port 8765 --latency-ms 2000
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=mock python bot.py
+
+Fixtures are served round-robin. Without --fixtures the bundled
+fixtures/mock_api/ (a representative OK run with one BUY) are served. A mode
+with no fixture in the directory gets one rebuilt from the five files in
+output/ (see fixture_from_outputs and tool_fixture_from_outputs).
+
+Faults can be injected to exercise call_policy: --overload-rate answers a
+fraction of requests with 529 overloaded_error, and --tail-rate adds
+--tail-ms to a fraction of responses.
+
+Usage is reported like the real API: input tokens are estimated at four
+characters per token, and the system prompt plus any cache_control-marked
+prefix is reported as a cache write the first time it is seen and as a
+cache read afterwards.
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import output_schema
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_FIXTURE_DIR = BASE_DIR / "fixtures" / "mock_api"
+CHUNK_CHARS = 40
+OUTPUT_FILES = ["run_status.json", "trade_plan.json", "orders.csv",
+                "daily_report.md", "trade_log_update.json"]
+
+
+def fixture_from_outputs(output_dir):
+    """Rebuild a raw response from a run's output directory.
+
+    Uses raw_response.txt if present, otherwise joins the five output files
+    under === filename === headers.
+    """
+    output_dir = Path(output_dir)
+    raw = output_dir / "raw_response.txt"
+    if raw.exists():
+        return raw.read_text(encoding="utf-8")
+
+    sections = []
+    for name in OUTPUT_FILES:
+        path = output_dir / name
+        if path.exists():
+            sections.append(f"=== {name} ===\n{path.read_text(encoding='utf-8').strip()}")
+    return "\n\n".join(sections)
+
+
+def tool_fixture_from_outputs(output_dir):
+    """Rebuild a submit_daily_outputs tool input from a run's output directory.
+
+    Returns None if none of the five output files exist.
+    """
+    output_dir = Path(output_dir)
+    texts = {}
+    for name in OUTPUT_FILES:
+        path = output_dir / name
+        if path.exists():
+            texts[name] = path.read_text(encoding="utf-8").strip()
+    if not texts:
+        return None
+
+    def parsed(name):
+        try:
+            return json.loads(texts.get(name) or "{}")
+        except json.JSONDecodeError:
+            log.warning("mock: %s is not valid JSON, sent empty", name)
+            return {}
+
+    return output_schema.from_outputs({
+        "run_status": parsed("run_status.json"),
+        "trade_plan": parsed("trade_plan.json"),
+        "orders_csv": texts.get("orders.csv", ""),
+        "daily_report": texts.get("daily_report.md", ""),
+        "trade_log_update": parsed("trade_log_update.json"),
+    })
+
+
+def load_fixtures(fixture_dir=None):
+    """Load recorded responses: {"text": [...], "tool": [...]}.
+
+    .txt files are section-format responses; .json files are
+    submit_daily_outputs tool inputs. fixture_dir defaults to the bundled
+    fixtures/mock_api/; a mode it has no fixture for is rebuilt from output/.
+    """
+    fixtures = {"text": [], "tool": []}
+    for path in sorted(Path(fixture_dir or DEFAULT_FIXTURE_DIR).iterdir()):
+        if path.suffix == ".txt":
+            fixtures["text"].append(path.read_text(encoding="utf-8"))
+        elif path.suffix == ".json":
+            with open(path, encoding="utf-8") as f:
+                fixtures["tool"].append(json.load(f))
+    if not fixtures["text"]:
+        fallback = fixture_from_outputs(BASE_DIR / "output")
+        if fallback:
+            fixtures["text"].append(fallback)
+    if not fixtures["tool"]:
+        fallback = tool_fixture_from_outputs(BASE_DIR / "output")
+        if fallback:
+            fixtures["tool"].append(fallback)
+    return fixtures
+
+
+class MockState:
+    """Fixtures, timing settings and the prompt-cache simulation."""
+
+    def __init__(self, fixtures, latency_ms=0, ttft_ms=0, output_tokens=None,
+                 overload_rate=0.0, tail_rate=0.0, tail_ms=0, seed=None):
+        self.text = itertools.cycle(fixtures["text"]) if fixtures["text"] else None
+        self.tool = itertools.cycle(fixtures["tool"]) if fixtures["tool"] else None
+        self.latency_ms = latency_ms
+        self.ttft_ms = ttft_ms
+        self.output_tokens = output_tokens
+        self.overload_rate = overload_rate
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.random = random.Random(seed)
+        self.cached_prefixes = set()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def fault(self):
+        """Return (overloaded, latency_ms) for the next request."""
+        with self.lock:
+            overloaded = self.random.random() < self.overload_rate
+            tail = self.random.random() < self.tail_rate
+        return overloaded, self.latency_ms + (self.tail_ms if tail else 0)
+
+    def usage(self, request, output_text):
+        """Token usage for a request, simulating the prompt cache."""
+        system = request.get("system", "")
+        blocks = system if isinstance(system, list) else [{"text": system}]
+        content = request["messages"][-1]["content"]
+        content = content if isinstance(content, list) else [{"text": content}]
+
+        # Everything up to the last cache_control marker is the cacheable prefix
+        all_blocks = blocks + content
+        marked = [i for i, b in enumerate(all_blocks) if b.get("cache_control")]
+        cut = marked[-1] + 1 if marked else 0
+        prefix = "".join(b.get("text", "") for b in all_blocks[:cut])
+        rest = "".join(b.get("text", "") for b in all_blocks[cut:])
+
+        prefix_key = hashlib.sha256(
+            (request.get("model", "") + prefix).encode("utf-8")
+        ).hexdigest()
+        with self.lock:
+            self.requests += 1
+            hit = prefix_key in self.cached_prefixes
+            self.cached_prefixes.add(prefix_key)
+
+        prefix_tokens = len(prefix) // 4
+        return {
+            "input_tokens": len(rest) // 4,
+            "output_tokens": self.output_tokens or max(1, len(output_text) // 4),
+            "cache_read_input_tokens": prefix_tokens if hit else 0,
+            "cache_creation_input_tokens": 0 if hit else prefix_tokens,
+        }
+
+
+class MessagesHandler(BaseHTTPRequestHandler):
+    """Handles POST /v1/messages."""
+
+    state = None  # MockState, set by make_server
+
+    def log_message(self, fmt, *args):
+        log.debug("mock: " + fmt, *args)
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/v1/messages":
+            self._json(404, {"type": "error", "error": {"type": "not_found_error",
+                                                        "message": self.path}})
+            return
+
+        length = int(self.headers.get("content-length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        tool_mode = bool(request.get("tools"))
+        source = self.state.tool if tool_mode else self.state.text
+        if source is None:
+            self._json(500, {"type": "error", "error": {
+                "type": "api_error",
+                "message": f"no {'tool' if tool_mode else 'text'} fixtures loaded"}})
+            return
+
+        overloaded, latency_ms = self.state.fault()
+        if overloaded:
+            self._json(529, {"type": "error", "error": {"type": "overloaded_error",
+                                                        "message": "Overloaded"}})
+            return
+
+        payload = next(source)
+        if tool_mode:
+            block = {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}",
+                     "name": request["tools"][0]["name"], "input": payload}
+            output_text = json.dumps(payload)
+            stop_reason = "tool_use"
+        else:
+            block = {"type": "text", "text": payload}
+            output_text = payload
+            stop_reason = "end_turn"
+        usage = self.state.usage(request, output_text)
+
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", "mock"),
+            "content": [block],
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage,
+        }
+        if request.get("stream"):
+            self._stream(message, output_text, tool_mode, latency_ms)
+        else:
+            time.sleep(latency_ms / 1000)
+            self._json(200, message)
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (e.g. a per-attempt timeout)
+            log.debug("mock: client closed the connection")
+
+    def _stream(self, message, output_text, tool_mode, latency_ms):
+        """Send the message as SSE events, spreading latency over the chunks."""
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.end_headers()
+
+        chunks = [output_text[i:i + CHUNK_CHARS]
+                  for i in range(0, len(output_text), CHUNK_CHARS)] or [""]
+        ttft = self.state.ttft_ms / 1000
+        per_chunk = max(latency_ms / 1000 - ttft, 0) / len(chunks)
+        usage = message["usage"]
+
+        start = {**message, "content": [], "stop_reason": None,
+                 "usage": {**usage, "output_tokens": 1}}
+        block = message["content"][0]
+        if tool_mode:
+            block_start = {**block, "input": {}}
+            delta_type, delta_key = "input_json_delta", "partial_json"
+        else:
+            block_start = {"type": "text", "text": ""}
+            delta_type, delta_key = "text_delta", "text"
+
+        try:
+            time.sleep(ttft)
+            self._event("message_start", {"type": "message_start", "message": start})
+            self._event("content_block_start", {"type": "content_block_start",
+                                                "index": 0, "content_block": block_start})
+            for chunk in chunks:
+                self._event("content_block_delta", {
+                    "type": "content_block_delta", "index": 0,
+                    "delta": {"type": delta_type, delta_key: chunk},
+                })
+                time.sleep(per_chunk)
+            self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            self._event("message_delta", {
+                "type": "message_delta",
+                "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                "usage": {"output_tokens": usage["output_tokens"]},
+            })
+            self._event("message_stop", {"type": "message_stop"})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (e.g. early stop on NO_TRADES)
+            log.debug("mock: client closed the stream")
+
+    def _event(self, name, data):
+        self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def make_server(fixtures, host="127.0.0.1", port=0, latency_ms=0, ttft_ms=0,
+                output_tokens=None, overload_rate=0.0, tail_rate=0.0, tail_ms=0,
+                seed=None):
+    """Create the mock server (port 0 picks a free port). Call serve_forever."""
+    state = MockState(fixtures, latency_ms, ttft_ms, output_tokens,
+                      overload_rate, tail_rate, tail_ms, seed)
+    handler = type("Handler", (MessagesHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(fixtures, **options):
+    """Start the mock server on a daemon thread. Returns (server, base_url)."""
+    server = make_server(fixtures, **options)
+    thread = threading.Thread(target=server.serve_forever, name="mock-anthropic",
+                              daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Mock Anthropic Messages API")
+    parser.add_argument("--fixtures", help="Directory of .txt / .json recorded responses "
+                        "(default: fixtures/mock_api)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=int, default=0,
+                        help="Total response time per request")
+    parser.add_argument("--ttft-ms", type=int, default=0,
+                        help="Time to first token for streamed responses")
+    parser.add_argument("--output-tokens", type=int, default=None,
+                        help="Fixed output token count (default: chars/4)")
+    parser.add_argument("--overload-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with 529 overloaded")
+    parser.add_argument("--tail-rate", type=float, default=0.0,
+                        help="Fraction of responses delayed by --tail-ms")
+    parser.add_argument("--tail-ms", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    mock = make_server(load_fixtures(args.fixtures), args.host, args.port,
+                       args.latency_ms, args.ttft_ms, args.output_tokens,
+                       args.overload_rate, args.tail_rate, args.tail_ms, args.seed)
+    log.info("Mock Anthropic API on http://%s:%d", args.host, args.port)
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,269 @@
+"""Structured output schema for the decision engine's five artefacts.
+
+In "tool" output mode Claude returns all five files in a single forced call
+to the submit_daily_outputs tool rather than as === filename === text
+sections. The schema below is sent as the tool's input_schema, and the same
+schema is used to validate the returned input in one pass, with errors
+reported per file. orders.csv arrives as a list of order objects and is
+rendered to CSV here.
+
+Validation covers the subset of JSON Schema used below: type, enum,
+pattern, required, properties, items, minimum and maximum.
+"""
+
+import csv
+import io
+import logging
+import re
+
+log = logging.getLogger(__name__)
+
+TOOL_NAME = "submit_daily_outputs"
+
+ORDERS_HEADER = ["order_id", "ticker", "side", "order_type", "quantity",
+                 "limit_price_gbp", "time_in_force", "stop_price_gbp", "reason"]
+
+_DATE = {"type": "string", "pattern": r"^\d{4}-\d{2}-\d{2}$"}
+_NUMBER = {"type": "number"}
+_NULLABLE_NUMBER = {"type": ["number", "null"]}
+_CONFIDENCE = {"type": "number", "minimum": 0, "maximum": 1}
+_EXECUTION_SEQUENCE = {"type": "string",
+                       "enum": ["SELL_THEN_BUY", "BUY_THEN_SELL", "INDEPENDENT"]}
+_STOP_MODE = {"type": "string", "enum": ["DAILY_CHECK", "BROKER_GTC"]}
+
+RUN_STATUS_SCHEMA = {
+    "type": "object",
+    "required": ["status", "as_of_date", "reason"],
+    "properties": {
+        "status": {"type": "string", "enum": ["OK", "NO_TRADES", "BLOCKED"]},
+        "as_of_date": _DATE,
+        "reason": {"type": "string"},
+        "data_checks": {"type": "object"},
+        "risk_checks": {"type": "object"},
+        "currency": {"type": "string", "enum": ["GBP"]},
+        "execution_sequence": _EXECUTION_SEQUENCE,
+        "stop_execution_mode": _STOP_MODE,
+    },
+}
+
+DECISION_SCHEMA = {
+    "type": "object",
+    "required": ["ticker", "action", "confidence"],
+    "properties": {
+        "ticker": {"type": "string"},
+        "action": {"type": "string", "enum": ["BUY", "SELL", "HOLD", "REDUCE"]},
+        "confidence": _CONFIDENCE,
+        "confidence_components": {"type": "object"},
+        "entry": {"type": "object"},
+        "size": {"type": "object"},
+        "stop": {
+            "type": "object",
+            "properties": {"price_gbp": _NULLABLE_NUMBER},
+        },
+        "take_profit": {"type": "object"},
+        "time_stop_days": {"type": "integer"},
+        "rationale": {"type": "array", "items": {"type": "string"}},
+        "constraints_passed": {"type": "boolean"},
+    },
+}
+
+TRADE_PLAN_SCHEMA = {
+    "type": "object",
+    "required": ["as_of_date", "decisions"],
+    "properties": {
+        "as_of_date": _DATE,
+        "currency": {"type": "string", "enum": ["GBP"]},
+        "strategy_profile": {"type": "string",
+                             "enum": ["conservative", "balanced", "aggressive"]},
+        "candidates_considered": {"type": "array", "items": {"type": "object"}},
+        "decisions": {"type": "array", "items": DECISION_SCHEMA},
+        "portfolio_constraints_summary": {"type": "object"},
+    },
+}
+
+ORDER_SCHEMA = {
+    "type": "object",
+    "required": ["order_id", "ticker", "side", "order_type", "quantity"],
+    "properties": {
+        "order_id": {"type": "string"},
+        "ticker": {"type": "string"},
+        "side": {"type": "string", "enum": ["BUY", "SELL"]},
+        "order_type": {"type": "string", "enum": ["MKT", "LMT", "STOP"]},
+        "quantity": {"type": "number", "minimum": 0},
+        "limit_price_gbp": _NULLABLE_NUMBER,
+        "time_in_force": {"type": "string"},
+        "stop_price_gbp": _NULLABLE_NUMBER,
+        "reason": {"type": "string"},
+    },
+}
+
+TRADE_LOG_SCHEMA = {
+    "type": "object",
+    "required": ["as_of_date", "entries"],
+    "properties": {
+        "as_of_date": _DATE,
+        "entries": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["ticker", "action"],
+                "properties": {
+                    "ticker": {"type": "string"},
+                    "action": {"type": "string", "enum": ["BUY", "SELL"]},
+                    "planned_price_gbp": _NUMBER,
+                    "planned_quantity": _NUMBER,
+                    "stop_price_gbp": _NULLABLE_NUMBER,
+                    "confidence": _CONFIDENCE,
+                    "entry_type": {"type": "string"},
+                    "rationale_summary": {"type": "string"},
+                },
+            },
+        },
+    },
+}
+
+# Tool input property -> (output file, schema)
+FILES = {
+    "run_status": ("run_status.json", RUN_STATUS_SCHEMA),
+    "trade_plan": ("trade_plan.json", TRADE_PLAN_SCHEMA),
+    "orders": ("orders.csv", {"type": "array", "items": ORDER_SCHEMA}),
+    "daily_report": ("daily_report.md", {"type": "string"}),
+    "trade_log_update": ("trade_log_update.json", TRADE_LOG_SCHEMA),
+}
+
+TOOL = {
+    "name": TOOL_NAME,
+    "description": (
+        "Submit today's five output files. orders is the rows of orders.csv "
+        "(empty unless status is OK); daily_report is the markdown report."
+    ),
+    "input_schema": {
+        "type": "object",
+        "required": list(FILES),
+        "properties": {key: schema for key, (_, schema) in FILES.items()},
+    },
+}
+
+_NUMERIC_ORDER_FIELDS = {"quantity", "limit_price_gbp", "stop_price_gbp"}
+
+_TYPES = {
+    "object": dict, "array": list, "string": str, "boolean": bool,
+    "integer": int, "number": (int, float), "null": type(None),
+}
+
+
+def validate(tool_input):
+    """Validate submit_daily_outputs input.
+
+    Returns dict of output filename -> list of error strings (only files
+    with errors are present).
+    """
+    if not isinstance(tool_input, dict):
+        return {name: ["tool input is not an object"] for name, _ in FILES.values()}
+
+    errors = {}
+    for key, (filename, schema) in FILES.items():
+        if key not in tool_input:
+            errors[filename] = ["missing"]
+            continue
+        file_errors = _check(tool_input[key], schema, key)
+        if file_errors:
+            errors[filename] = file_errors
+    return errors
+
+
+def to_outputs(tool_input, errors=None):
+    """Convert validated tool input to the dict parse_outputs returns.
+
+    Files listed in errors are returned empty, as a missing section would be.
+    """
+    errors = errors or {}
+    outputs = {}
+    for key, (filename, _) in FILES.items():
+        value = tool_input.get(key) if filename not in errors else None
+        if key == "orders":
+            outputs["orders_csv"] = render_orders_csv(value) if value else ""
+        elif key == "daily_report":
+            outputs[key] = value or ""
+        else:
+            outputs[key] = value or {}
+    return outputs
+
+
+def from_outputs(outputs):
+    """Convert parse_outputs' dict to tool input shape, for validate().
+
+    orders.csv rows become order objects with numeric fields parsed.
+    """
+    orders = []
+    for row in csv.DictReader(io.StringIO(outputs.get("orders_csv") or "")):
+        orders.append({key: _number(value) if key in _NUMERIC_ORDER_FIELDS else value
+                       for key, value in row.items()})
+    return {
+        "run_status": outputs.get("run_status") or {},
+        "trade_plan": outputs.get("trade_plan") or {},
+        "orders": orders,
+        "daily_report": outputs.get("daily_report") or "",
+        "trade_log_update": outputs.get("trade_log_update") or {},
+    }
+
+
+def _number(text):
+    """Parse a CSV numeric field; empty is None, unparseable is left as text."""
+    if text is None or text.strip() == "":
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def render_orders_csv(orders):
+    """Render order objects as orders.csv text."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(ORDERS_HEADER)
+    for order in orders:
+        writer.writerow(["" if order.get(col) is None else order[col]
+                         for col in ORDERS_HEADER])
+    return out.getvalue()
+
+
+def _check(value, schema, path):
+    """Return a list of errors for value against a schema (subset)."""
+    expected = schema.get("type")
+    if expected is not None:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_is_type(value, t) for t in types):
+            return [f"{path}: expected {' or '.join(types)}, got {type(value).__name__}"]
+
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} not one of {schema['enum']}")
+    if "pattern" in schema and isinstance(value, str) and not re.search(schema["pattern"], value):
+        errors.append(f"{path}: {value!r} does not match {schema['pattern']}")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{path}: {value} below minimum {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{path}: {value} above maximum {schema['maximum']}")
+    if isinstance(value, dict):
+        for field in schema.get("required", []):
+            if field not in value:
+                errors.append(f"{path}.{field}: required field missing")
+        for field, sub in schema.get("properties", {}).items():
+            if field in value:
+                errors += _check(value[field], sub, f"{path}.{field}")
+    if isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors += _check(item, schema["items"], f"{path}[{i}]")
+    return errors
+
+
+def _is_type(value, name):
+    """JSON Schema type check (booleans are not numbers)."""
+    if name in ("integer", "number") and isinstance(value, bool):
+        return False
+    if name == "integer" and isinstance(value, float):
+        return value.is_integer()
+    return isinstance(value, _TYPES[name])
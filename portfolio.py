@@ -2,17 +2,26 @@
 
 Manages positions.json state:
 - Apply buy/sell paper trades
-- Track cash balance with settlement simulation
+- Track cash balance with a settlement queue (trading-day due dates)
 - Compute equity value and drawdown
 - Fractional shares allowed in paper mode
+
+The functions below take and return the positions.json dict. Internally
+they work on a Ledger: Position records with __slots__, indexed by ticker,
+which round-trip to the same dict (unknown keys and key order included).
+Code that applies many fills or marks many accounts can use Ledger
+directly and serialise once at the end.
 """
 
 import csv
+import heapq
 import io
 import json
 import logging
-from datetime import date, timedelta
-from pathlib import Path
+import math
+from datetime import date
+
+import trading_calendar
 
 log = logging.getLogger(__name__)
 
@@ -35,27 +44,64 @@ def save_positions(positions, path):
     )
 
 
-def settle_proceeds(positions, as_of_date):
-    """Move unsettled_sell_proceeds_gbp to cash_balance_gbp if settlement due.
+def settlement_queue(positions):
+    """The pending settlements heap: [due_date, amount_gbp] pairs, earliest first.
 
-    UK T+1 settlement: sells on day T settle on T+1.
+    Stored in positions["settlement_queue"] as a heapq list (ISO dates sort
+    as strings). Files written before the queue existed get one entry from
+    the legacy unsettled_sell_proceeds_gbp / settlement_due_date fields.
     """
-    due_date_str = positions.get("settlement_due_date")
-    unsettled = positions.get("unsettled_sell_proceeds_gbp", 0)
-
-    if not due_date_str or unsettled <= 0:
+    queue = positions.get("settlement_queue")
+    if queue is None:
+        queue = []
+        unsettled = positions.get("unsettled_sell_proceeds_gbp", 0)
+        if unsettled > 0:
+            due = positions.get("settlement_due_date") or positions["as_of_date"]
+            queue.append([due, unsettled])
+    return queue
+
+
+def settle_proceeds(positions, as_of_date, journal=None):
+    """Move sell proceeds that are due into cash_balance_gbp.
+
+    UK T+1 settlement: sells on day T settle on the next trading day. Each
+    day's proceeds settle on their own due date; unsettled_sell_proceeds_gbp
+    and settlement_due_date (earliest pending) summarise what is left. If
+    journal (a portfolio_journal.Journal) is given, the settlement is
+    recorded on it.
+    """
+    queue = settlement_queue(positions)
+    today = as_of_date.isoformat()
+    if not queue or queue[0][0] > today:
         return positions
 
-    due_date = date.fromisoformat(due_date_str)
+    settled = []
+    while queue and queue[0][0] <= today:
+        settled.append(heapq.heappop(queue))
+    amount = sum(a for _, a in settled)
 
-    if as_of_date >= due_date:
-        log.info(
-            "Settling £%.2f (due %s, today %s)",
-            unsettled, due_date_str, as_of_date.isoformat(),
+    if queue:
+        positions["cash_balance_gbp"] += amount
+        positions["unsettled_sell_proceeds_gbp"] = round(
+            positions.get("unsettled_sell_proceeds_gbp", 0) - amount, 4
         )
-        positions["cash_balance_gbp"] += unsettled
+        positions["settlement_due_date"] = queue[0][0]
+    else:
+        # Settle the summary amount so nothing is left over from rounding
+        amount = positions.get("unsettled_sell_proceeds_gbp", 0)
+        positions["cash_balance_gbp"] += amount
         positions["unsettled_sell_proceeds_gbp"] = 0.0
         positions["settlement_due_date"] = None
+    if "settlement_queue" in positions or queue:
+        positions["settlement_queue"] = queue
+
+    log.info(
+        "Settling £%.2f (due %s, today %s), %d still pending",
+        amount, ", ".join(d for d, _ in settled), today, len(queue),
+    )
+    if journal:
+        journal.record(as_of_date, "settlement", positions, amount_gbp=amount,
+                       due_date=settled[-1][0])
 
     return positions
 
@@ -67,29 +113,9 @@ def compute_position_metrics(positions, market_data):
         positions: positions.json dict
         market_data: dict of ticker -> row dict from market_data.csv
     """
-    today = date.fromisoformat(positions["as_of_date"])
-
-    for pos in positions["positions"]:
-        ticker = pos["ticker"]
-        data = market_data.get(ticker)
-
-        if data and data.get("close_gbp") is not None:
-            close = float(data["close_gbp"])
-            pos["market_value_gbp"] = round(close * pos["quantity"], 4)
-            pos["unrealised_pnl_gbp"] = round(
-                pos["market_value_gbp"] - (pos["avg_cost_gbp"] * pos["quantity"]), 4
-            )
-        else:
-            log.warning("No market data for position %s, keeping last values", ticker)
-
-        # Update days_held
-        entry_date = pos.get("entry_date")
-        if entry_date:
-            entry = date.fromisoformat(entry_date)
-            pos["days_held"] = (today - entry).days
-        else:
-            pos["days_held"] = pos.get("days_held", 0)
-
+    ledger = Ledger.from_dict(positions)
+    ledger.mark_to_market(market_data, date.fromisoformat(positions["as_of_date"]))
+    positions["positions"] = ledger.position_dicts()
     return positions
 
 
@@ -110,14 +136,23 @@ def update_equity_and_drawdown(positions, market_data):
     return positions
 
 
-def apply_paper_trades(positions, orders_csv, market_data, config):
+def apply_paper_trades(positions, orders_csv, market_data, config, journal=None):
     """Apply orders from Claude's output to paper portfolio.
 
     For paper mode:
     - BUY: deduct cost from cash, add/increase position (fractional shares OK)
-    - SELL: remove/reduce position, add proceeds to unsettled cash
+    - SELL: remove/reduce position (at most the quantity held), queue
+      proceeds to settle after settlement_days trading days
     - Fill price = close_gbp with slippage applied
+    - STOP SELLs fill at stop_price_gbp, or at open_gbp if the price gapped
+      through the stop, and are skipped if low_gbp never reached the stop
     - Stamp duty on UK equity BUYs
+
+    Malformed orders are logged and skipped one at a time. The fills are
+    worked out on a Ledger and copied into positions only once every order
+    has been processed, so an error part way leaves positions unchanged.
+    If journal is given, each fill and the resulting settlement due are
+    recorded on it after that.
     """
     slippage_bps = config.get("slippage_bps", 10)
     stamp_duty_bps = config.get("stamp_duty_bps", 50)
@@ -132,12 +167,16 @@ def apply_paper_trades(positions, orders_csv, market_data, config):
         log.info("No orders to execute")
         return positions
 
+    ledger = Ledger.from_dict(positions)
+    state = ledger.state  # cash and settlement fields, committed with the ledger
     total_sell_proceeds = 0.0
+    events = []  # (kind, set, positions, details) to journal once committed
 
     for order in orders:
-        ticker = order["ticker"]
-        side = order["side"].upper()
-        quantity = float(order["quantity"])
+        parsed = _validate_order(order)
+        if parsed is None:
+            continue
+        ticker, side, quantity, stop_price = parsed
         data = market_data.get(ticker)
 
         if not data or data.get("close_gbp") is None:
@@ -161,39 +200,55 @@ def apply_paper_trades(positions, orders_csv, market_data, config):
             total_cost = notional + fee + stamp_duty
 
             # Check cash
-            if total_cost > positions["cash_balance_gbp"]:
+            if total_cost > state["cash_balance_gbp"]:
                 log.warning(
                     "Insufficient cash for %s BUY: need £%.2f, have £%.2f",
-                    ticker, total_cost, positions["cash_balance_gbp"],
+                    ticker, total_cost, state["cash_balance_gbp"],
                 )
                 continue
 
             # Deduct cash
-            positions["cash_balance_gbp"] = round(
-                positions["cash_balance_gbp"] - total_cost, 4
-            )
+            state["cash_balance_gbp"] = round(state["cash_balance_gbp"] - total_cost, 4)
 
             # Add/update position
-            _add_position(positions, ticker, quantity, fill_price, data, today)
+            pos = ledger.add(ticker, quantity, fill_price, data.get("sector", ""), today)
 
             log.info(
                 "BUY %s: qty=%.4f @ £%.4f, cost=£%.2f (fee=£%.2f, stamp=£%.2f)",
                 ticker, quantity, fill_price, total_cost, fee, stamp_duty,
             )
+            events.append(("fill", {"cash_balance_gbp": state["cash_balance_gbp"]},
+                           {ticker: pos.to_dict()},
+                           dict(ticker=ticker, side=side, quantity=quantity,
+                                price_gbp=fill_price, fee_gbp=fee, stamp_duty_gbp=stamp_duty)))
 
         elif side == "SELL":
+            if (order.get("order_type") or "").upper() == "STOP" and stop_price is not None:
+                base = _stop_fill_base(stop_price, data)
+                if base is None:
+                    log.info("Stop for %s not reached, skipping order", ticker)
+                    continue
+            else:
+                base = close
+
+            held = ledger.get(ticker)
+            if held is None:
+                log.warning("No position to sell for %s", ticker)
+                continue
+            if quantity > held.quantity:
+                log.warning("SELL %s: qty=%.4f exceeds held %.4f, selling the holding",
+                            ticker, quantity, held.quantity)
+                quantity = held.quantity
+
             # Fill price with slippage (sell slightly lower)
-            fill_price = close * (1 - slippage_bps / 10000)
+            fill_price = base * (1 - slippage_bps / 10000)
 
             notional = fill_price * quantity
             fee = _compute_fee(fee_model, notional)
             proceeds = notional - fee
 
             # Reduce/remove position
-            removed = _remove_position(positions, ticker, quantity)
-            if not removed:
-                log.warning("No position to sell for %s", ticker)
-                continue
+            ledger.remove(ticker, quantity)
 
             # Add to unsettled proceeds
             total_sell_proceeds += proceeds
@@ -202,22 +257,63 @@ def apply_paper_trades(positions, orders_csv, market_data, config):
                 "SELL %s: qty=%.4f @ £%.4f, proceeds=£%.2f (fee=£%.2f)",
                 ticker, quantity, fill_price, proceeds, fee,
             )
+            pos = ledger.get(ticker)
+            events.append(("fill", None, {ticker: pos.to_dict() if pos else None},
+                           dict(ticker=ticker, side=side, quantity=quantity,
+                                price_gbp=fill_price, fee_gbp=fee, proceeds_gbp=proceeds)))
 
     # Settlement: sell proceeds go to unsettled
     if total_sell_proceeds > 0:
-        positions["unsettled_sell_proceeds_gbp"] = round(
-            positions.get("unsettled_sell_proceeds_gbp", 0) + total_sell_proceeds, 4
+        queue = [list(entry) for entry in settlement_queue(state)]
+        settle_date = trading_calendar.add_trading_days(today, settlement_days)
+        heapq.heappush(queue, [settle_date.isoformat(), round(total_sell_proceeds, 4)])
+        state["settlement_queue"] = queue
+        state["unsettled_sell_proceeds_gbp"] = round(
+            state.get("unsettled_sell_proceeds_gbp", 0) + total_sell_proceeds, 4
         )
-        settle_date = today + timedelta(days=settlement_days)
-        positions["settlement_due_date"] = settle_date.isoformat()
+        state["settlement_due_date"] = queue[0][0]
         log.info(
             "Unsettled proceeds: £%.2f, settlement due: %s",
             total_sell_proceeds, settle_date.isoformat(),
         )
+        events.append(("settlement_due",
+                       {k: state[k] for k in ("settlement_queue", "unsettled_sell_proceeds_gbp",
+                                              "settlement_due_date")},
+                       None,
+                       dict(amount_gbp=total_sell_proceeds, due_date=settle_date.isoformat())))
+
+    # Commit cash, settlements and positions together
+    committed = ledger.to_dict()
+    positions.clear()
+    positions.update(committed)
+
+    if journal:
+        for kind, set_, changed, details in events:
+            journal.record_changes(today, kind, set_, changed, **details)
 
     return positions
 
 
+def _validate_order(order):
+    """(ticker, side, quantity, stop_price) for a usable order, else None."""
+    ticker = order.get("ticker")
+    side = (order.get("side") or "").upper()
+    try:
+        quantity = float(order.get("quantity") or "nan")
+        stop = order.get("stop_price_gbp")
+        stop_price = float(stop) if stop else None
+    except (TypeError, ValueError):
+        log.warning("Malformed order for %s, skipping: %s", ticker, order)
+        return None
+    if side not in ("BUY", "SELL"):
+        log.warning("Unknown side %r for %s, skipping order", order.get("side"), ticker)
+        return None
+    if not math.isfinite(quantity) or quantity <= 0:
+        log.warning("Invalid quantity %r for %s, skipping order", order.get("quantity"), ticker)
+        return None
+    return ticker, side, quantity, stop_price
+
+
 def _parse_orders_csv(orders_csv):
     """Parse orders CSV string into list of dicts."""
     if not orders_csv or not orders_csv.strip():
@@ -233,6 +329,16 @@ def _parse_orders_csv(orders_csv):
     return orders
 
 
+def _stop_fill_base(stop, data):
+    """Price a triggered stop fills at before slippage, or None if not triggered."""
+    low, open_ = data.get("low_gbp"), data.get("open_gbp")
+    if low is not None and float(low) > stop:
+        return None
+    if open_ is not None and float(open_) <= stop:
+        return float(open_)  # gapped through the stop
+    return stop
+
+
 def _compute_fee(fee_model, notional):
     """Compute trading fee based on fee model."""
     fee_type = fee_model.get("type", "per_trade")
@@ -245,50 +351,185 @@ def _compute_fee(fee_model, notional):
     return 0
 
 
-def _add_position(positions, ticker, quantity, fill_price, data, today):
-    """Add or increase a position."""
-    # Check if position already exists
-    for pos in positions["positions"]:
-        if pos["ticker"] == ticker:
-            # Average up/down
-            old_cost = pos["avg_cost_gbp"] * pos["quantity"]
-            new_cost = fill_price * quantity
-            new_qty = pos["quantity"] + quantity
-            pos["quantity"] = round(new_qty, 6)
-            pos["avg_cost_gbp"] = round((old_cost + new_cost) / new_qty, 4)
-            pos["market_value_gbp"] = round(fill_price * new_qty, 4)
-            pos["unrealised_pnl_gbp"] = round(
-                pos["market_value_gbp"] - (pos["avg_cost_gbp"] * new_qty), 4
+# positions.json position fields, in schema order
+POSITION_FIELDS = ("ticker", "quantity", "avg_cost_gbp", "market_value_gbp",
+                   "unrealised_pnl_gbp", "sector", "entry_date", "days_held",
+                   "current_stop_gbp", "status")
+
+
+class Position:
+    """One holding. Fields outside POSITION_FIELDS are kept in extra."""
+
+    __slots__ = POSITION_FIELDS + ("extra", "_keys")
+
+    def __init__(self, ticker, quantity, avg_cost_gbp, market_value_gbp=0.0,
+                 unrealised_pnl_gbp=0.0, sector="", entry_date=None, days_held=0,
+                 current_stop_gbp=None, status="ACTIVE", extra=None, keys=POSITION_FIELDS):
+        self.ticker = ticker
+        self.quantity = quantity
+        self.avg_cost_gbp = avg_cost_gbp
+        self.market_value_gbp = market_value_gbp
+        self.unrealised_pnl_gbp = unrealised_pnl_gbp
+        self.sector = sector
+        self.entry_date = entry_date
+        self.days_held = days_held
+        self.current_stop_gbp = current_stop_gbp
+        self.status = status
+        self.extra = extra or {}
+        self._keys = keys  # key order to serialise in
+
+    @classmethod
+    def from_dict(cls, d):
+        # Absent fields load as None so they stay absent on the way out
+        known = {k: d.get(k) for k in POSITION_FIELDS}
+        extra = {k: v for k, v in d.items() if k not in POSITION_FIELDS}
+        return cls(extra=extra, keys=tuple(d), **known)
+
+    def to_dict(self):
+        """The positions.json dict: the keys it was loaded with, in order.
+
+        Fields it was loaded without are added only once they hold a value.
+        """
+        out = {}
+        for key in self._keys:
+            out[key] = getattr(self, key) if key in POSITION_FIELDS else self.extra[key]
+        for key in POSITION_FIELDS:
+            if key not in out and getattr(self, key) is not None:
+                out[key] = getattr(self, key)
+        for key, value in self.extra.items():
+            out.setdefault(key, value)
+        return out
+
+    def merge(self, other):
+        """Fold a duplicate record for the same ticker into this one."""
+        quantity = self.quantity + other.quantity
+        if quantity:
+            self.avg_cost_gbp = round(
+                (self.avg_cost_gbp * self.quantity + other.avg_cost_gbp * other.quantity)
+                / quantity, 4
             )
-            return
-
-    # New position
-    positions["positions"].append({
-        "ticker": ticker,
-        "quantity": round(quantity, 6),
-        "avg_cost_gbp": round(fill_price, 4),
-        "market_value_gbp": round(fill_price * quantity, 4),
-        "unrealised_pnl_gbp": 0.0,
-        "sector": data.get("sector", ""),
-        "entry_date": today.isoformat(),
-        "days_held": 0,
-        "current_stop_gbp": None,
-        "status": "ACTIVE",
-    })
-
-
-def _remove_position(positions, ticker, quantity):
-    """Reduce or remove a position. Returns True if position was found."""
-    for i, pos in enumerate(positions["positions"]):
-        if pos["ticker"] == ticker:
-            if quantity >= pos["quantity"]:
-                # Full sell
-                positions["positions"].pop(i)
+        self.quantity = round(quantity, 6)
+        self.market_value_gbp = round(
+            (self.market_value_gbp or 0) + (other.market_value_gbp or 0), 4
+        )
+        self.unrealised_pnl_gbp = round(
+            (self.unrealised_pnl_gbp or 0) + (other.unrealised_pnl_gbp or 0), 4
+        )
+        dates = [d for d in (self.entry_date, other.entry_date) if d]
+        self.entry_date = min(dates) if dates else None
+        held = [d for d in (self.days_held, other.days_held) if d is not None]
+        self.days_held = max(held) if held else None
+        if self.current_stop_gbp is None:
+            self.current_stop_gbp = other.current_stop_gbp
+        for key, value in other.extra.items():
+            self.extra.setdefault(key, value)
+
+
+class Ledger:
+    """positions.json state with positions indexed by ticker.
+
+    state holds the top-level fields (cash, equity, ...) as loaded;
+    positions maps ticker -> Position in file order.
+    """
+
+    __slots__ = ("state", "positions")
+
+    def __init__(self, state, positions):
+        self.state = state
+        self.positions = positions
+
+    @classmethod
+    def from_dict(cls, d):
+        positions = {}
+        for p in d.get("positions", []):
+            pos = Position.from_dict(p)
+            if pos.ticker in positions:
+                log.warning("positions.json lists %s more than once, merging", pos.ticker)
+                positions[pos.ticker].merge(pos)
             else:
-                # Partial sell
-                pos["quantity"] = round(pos["quantity"] - quantity, 6)
-                pos["market_value_gbp"] = round(
-                    pos["avg_cost_gbp"] * pos["quantity"], 4
+                positions[pos.ticker] = pos
+        return cls(dict(d), positions)
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_dict(load_positions(path))
+
+    def position_dicts(self):
+        return [p.to_dict() for p in self.positions.values()]
+
+    def to_dict(self):
+        """The positions.json dict, with top-level keys in their loaded order."""
+        out = dict(self.state)
+        out["positions"] = self.position_dicts()
+        return out
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, ticker):
+        return ticker in self.positions
+
+    def __iter__(self):
+        return iter(self.positions.values())
+
+    def get(self, ticker):
+        return self.positions.get(ticker)
+
+    def add(self, ticker, quantity, fill_price, sector, today):
+        """Add or increase a position at fill_price. Returns the Position."""
+        pos = self.positions.get(ticker)
+        if pos is not None:
+            # Average up/down
+            old_cost = pos.avg_cost_gbp * pos.quantity
+            new_qty = pos.quantity + quantity
+            pos.quantity = round(new_qty, 6)
+            pos.avg_cost_gbp = round((old_cost + fill_price * quantity) / new_qty, 4)
+            pos.market_value_gbp = round(fill_price * new_qty, 4)
+            pos.unrealised_pnl_gbp = round(
+                pos.market_value_gbp - pos.avg_cost_gbp * new_qty, 4
+            )
+            return pos
+
+        pos = Position(
+            ticker, round(quantity, 6), round(fill_price, 4),
+            market_value_gbp=round(fill_price * quantity, 4), unrealised_pnl_gbp=0.0,
+            sector=sector, entry_date=today.isoformat(), days_held=0,
+        )
+        self.positions[ticker] = pos
+        return pos
+
+    def remove(self, ticker, quantity):
+        """Reduce or remove a position. Returns True if it was held."""
+        pos = self.positions.get(ticker)
+        if pos is None:
+            return False
+        if quantity >= pos.quantity:
+            del self.positions[ticker]
+        else:
+            pos.quantity = round(pos.quantity - quantity, 6)
+            pos.market_value_gbp = round(pos.avg_cost_gbp * pos.quantity, 4)
+        return True
+
+    def mark_to_market(self, market_data, today):
+        """Revalue every position at its close_gbp and update days_held.
+
+        Positions without a close keep their last values.
+        """
+        missing = []
+        for pos in self.positions.values():
+            row = market_data.get(pos.ticker)
+            close = row.get("close_gbp") if row else None
+            if close is not None:
+                pos.market_value_gbp = round(float(close) * pos.quantity, 4)
+                pos.unrealised_pnl_gbp = round(
+                    pos.market_value_gbp - pos.avg_cost_gbp * pos.quantity, 4
                 )
-            return True
-    return False
+            else:
+                missing.append(pos.ticker)
+
+            if pos.entry_date:
+                pos.days_held = (today - date.fromisoformat(pos.entry_date)).days
+            elif "days_held" not in pos._keys and pos.days_held is None:
+                pos.days_held = 0
+        for ticker in missing:
+            log.warning("No market data for position %s, keeping last values", ticker)
@@ -0,0 +1,257 @@
+"""Append-only portfolio journal — fills, settlements, stop updates and marks.
+
+Every change to the positions.json state is appended to
+logs/portfolio_journal.jsonl as one event: what happened (type, date and
+details such as ticker, side and fill price) and the fields it changed.
+
+    {"seq": 12, "date": "2026-08-21", "type": "fill", "ticker": "GLEN.L",
+     "side": "BUY", ..., "set": {"cash_balance_gbp": 2.8218},
+     "positions": {"GLEN.L": {...}}}
+
+"set" holds changed top-level fields, "unset" removed ones, and
+"positions" the new record of each changed position (null if it was
+closed). Full snapshots go to logs/portfolio_snapshots.jsonl with the
+byte offset of the next journal event, one every SNAPSHOT_EVERY events and
+whenever positions.json no longer matches the journal (first run, manual
+edits). replay() rebuilds positions.json as of any date from the latest
+snapshot on or before it plus the events that follow.
+
+Usage:
+    python portfolio_journal.py                    # state after the last event
+    python portfolio_journal.py --date 2026-08-21  # state at the end of that day
+"""
+
+import argparse
+import json
+import logging
+from datetime import date
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+JOURNAL_PATH = BASE_DIR / "logs" / "portfolio_journal.jsonl"
+SNAPSHOT_PATH = BASE_DIR / "logs" / "portfolio_snapshots.jsonl"
+SNAPSHOT_EVERY = 50
+
+EVENT_TYPES = ("fill", "settlement_due", "settlement", "stop", "mark")
+
+
+def _copy(positions):
+    return json.loads(json.dumps(positions))
+
+
+def diff(before, after):
+    """Changes from one positions.json dict to another, as event fields."""
+    changes = {}
+    set_ = {k: v for k, v in after.items()
+            if k != "positions" and (k not in before or before[k] != v)}
+    unset = [k for k in before if k != "positions" and k not in after]
+
+    old = {p["ticker"]: p for p in before.get("positions", [])}
+    new = {p["ticker"]: p for p in after.get("positions", [])}
+    changed = {t: p for t, p in new.items() if old.get(t) != p}
+    changed.update({t: None for t in old if t not in new})
+
+    if set_:
+        changes["set"] = set_
+    if unset:
+        changes["unset"] = unset
+    if changed:
+        changes["positions"] = changed
+    return changes
+
+
+def apply_event(positions, event):
+    """Apply an event's changes to a positions.json dict in place.
+
+    Changed positions keep their place in the list; new ones are appended.
+    """
+    for key, value in event.get("set", {}).items():
+        positions[key] = value
+    for key in event.get("unset", []):
+        positions.pop(key, None)
+
+    changed = event.get("positions")
+    if changed:
+        book = {p["ticker"]: p for p in positions.get("positions", [])}
+        for ticker, p in changed.items():
+            if p is None:
+                book.pop(ticker, None)
+            else:
+                book[ticker] = p
+        positions["positions"] = list(book.values())
+    return positions
+
+
+def load_snapshots(path=SNAPSHOT_PATH):
+    """All snapshot records, oldest first. Unreadable lines are skipped."""
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+
+    snapshots = []
+    for line in lines:
+        try:
+            snapshots.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return snapshots
+
+
+def _replay(as_of=None, path=JOURNAL_PATH, snapshot_path=SNAPSHOT_PATH):
+    """Returns (positions, last_seq, events_since_snapshot).
+
+    positions is None if there is no snapshot on or before as_of.
+    """
+    as_of = as_of.isoformat() if isinstance(as_of, date) else as_of
+    snapshots = load_snapshots(snapshot_path)
+    if as_of:
+        snapshots = [s for s in snapshots if s["date"] <= as_of]
+    if not snapshots:
+        return None, 0, 0
+
+    snap = snapshots[-1]
+    positions, seq, applied = snap["state"], snap["seq"], 0
+    try:
+        with open(path, "rb") as f:
+            f.seek(snap["offset"])
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if as_of and event["date"] > as_of:
+                    break
+                apply_event(positions, event)
+                seq, applied = event["seq"], applied + 1
+    except FileNotFoundError:
+        pass
+    return positions, seq, applied
+
+
+def replay(as_of=None, path=JOURNAL_PATH, snapshot_path=SNAPSHOT_PATH):
+    """positions.json as of the end of a date (default: after the last event).
+
+    as_of is a date or ISO date string. Returns None if the journal does not
+    go back that far.
+    """
+    return _replay(as_of, path, snapshot_path)[0]
+
+
+class Journal:
+    """Appends events for one run, diffing each state against the last."""
+
+    def __init__(self, path=JOURNAL_PATH, snapshot_path=SNAPSHOT_PATH,
+                 snapshot_every=SNAPSHOT_EVERY):
+        self.path = Path(path)
+        self.snapshot_path = Path(snapshot_path)
+        self.snapshot_every = snapshot_every
+        self.last = None  # top-level fields as of the last event
+        self.book = {}  # ticker -> position dict as of the last event
+        self.seq = 0
+        self.since_snapshot = 0
+
+    def open(self, positions):
+        """Start from positions.json, snapshotting it if the journal disagrees."""
+        replayed, self.seq, self.since_snapshot = _replay(
+            None, self.path, self.snapshot_path
+        )
+        if replayed is None or json.dumps(replayed) != json.dumps(positions):
+            if replayed is not None:
+                log.warning("positions.json differs from the journal — snapshotting it")
+            self.snapshot(positions)
+        else:
+            self._remember(positions)
+        return self
+
+    def record(self, as_of, kind, positions, **details):
+        """Append an event if positions changed since the last one.
+
+        Fills are always recorded. Returns the event, or None if nothing
+        was written.
+        """
+        changes = diff({**self.last, "positions": list(self.book.values())}, positions)
+        if not changes and kind != "fill":
+            return None
+        event = self._append(as_of, kind, details, changes)
+        self._remember(positions)
+        return event
+
+    def record_changes(self, as_of, kind, set_=None, positions=None, **details):
+        """Append an event with known changes, without diffing the whole state.
+
+        set_ maps changed top-level fields to their new values and positions
+        maps each changed ticker to its new record (None if closed), so the
+        cost is proportional to what changed. Returns the event.
+        """
+        changes = {}
+        if set_:
+            changes["set"] = _copy(set_)
+        if positions:
+            changes["positions"] = _copy(positions)
+        event = self._append(as_of, kind, details, changes)
+        self.last.update(changes.get("set", {}))
+        for ticker, p in changes.get("positions", {}).items():
+            if p is None:
+                self.book.pop(ticker, None)
+            else:
+                self.book[ticker] = p
+        return event
+
+    def _append(self, as_of, kind, details, changes):
+        if kind not in EVENT_TYPES:
+            raise ValueError(f"Unknown journal event type: {kind}")
+        self.seq += 1
+        as_of = as_of.isoformat() if isinstance(as_of, date) else as_of
+        event = {"seq": self.seq, "date": as_of, "type": kind, **details, **changes}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+        self.since_snapshot += 1
+        return event
+
+    def _remember(self, positions):
+        self.last = _copy(positions)
+        self.book = {p["ticker"]: p for p in self.last.pop("positions", [])}
+
+    def snapshot(self, positions):
+        """Write a full snapshot of positions, replayable from the next event."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch()
+        record = {
+            "seq": self.seq,
+            "date": positions["as_of_date"],
+            "offset": self.path.stat().st_size,
+            "state": positions,
+        }
+        with open(self.snapshot_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self._remember(positions)
+        self.since_snapshot = 0
+        log.info("Journal snapshot at seq %d (%s)", self.seq, record["date"])
+
+    def checkpoint(self, positions):
+        """Snapshot if SNAPSHOT_EVERY events have been written since the last one."""
+        if self.since_snapshot >= self.snapshot_every:
+            self.snapshot(positions)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Rebuild positions.json from the journal")
+    parser.add_argument("--date", type=date.fromisoformat, default=None,
+                        help="State at the end of this date (default: latest)")
+    parser.add_argument("--out", help="Write to this file instead of stdout")
+    args = parser.parse_args()
+
+    state = replay(args.date)
+    if state is None:
+        parser.exit(1, "No journal state on or before that date\n")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(state, f, indent=2)
+    else:
+        print(json.dumps(state, indent=2))
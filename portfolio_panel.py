@@ -0,0 +1,189 @@
+"""Vectorized multi-portfolio mark-to-market and equity engine.
+
+Holds N portfolios x M tickers as quantity / cost / value matrices (a
+"book") and marks them all against a price vector, or an N x M price
+matrix for per-portfolio scenarios, in single vectorized passes. For a
+single portfolio it produces the same values as
+portfolio.compute_position_metrics and portfolio.update_equity_and_drawdown.
+
+Matching the scalar code exactly takes two details:
+
+- rounding: np.round scales, rounds and divides, which can land on the
+  other side of a tie from Python's round(). Values that are close to a
+  tie are re-rounded with round() (see round_like_python).
+- summation: each portfolio's position values are summed left to right
+  (np.cumsum) in its own positions-list order, like sum() does.
+"""
+
+import logging
+from datetime import date
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Fractional part within this of .5 (or a few ulps, for large values)
+# counts as a possible tie
+TIE_TOLERANCE = 1e-6
+
+
+def round_like_python(values, ndigits):
+    """np.round(values, ndigits), giving the same result as round() per element."""
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 10.0 ** ndigits
+    rounded = np.round(scaled) / 10.0 ** ndigits
+    with np.errstate(invalid="ignore"):
+        tolerance = np.maximum(TIE_TOLERANCE, 4 * np.spacing(np.abs(scaled)))
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= tolerance
+    near_tie &= np.isfinite(values)
+    if near_tie.any():
+        rounded[near_tie] = [round(float(v), ndigits) for v in values[near_tie]]
+    return rounded
+
+
+def build_book(portfolios, tickers=None):
+    """Stack positions.json dicts into an N x M book.
+
+    Args:
+        portfolios: list of positions.json dicts
+        tickers: column order, default every held ticker in first-seen order
+
+    Returns dict with "tickers", N x M float64 arrays "quantity",
+    "avg_cost", "market_value", "pnl", N x M bool "held" and "priced"
+    (marked by mark_to_market), N x M int "entry_day" (date ordinal, 0 if
+    unknown) and "days_held", and length-N arrays "cash", "unsettled",
+    "equity", "peak" (NaN if the portfolio has no peak yet) and
+    "new_peak" and "drawdown" (set by update_equity_and_drawdown). "order"
+    is N x M: each row's held columns in positions-list order, then the rest.
+    """
+    if tickers is None:
+        tickers = list(dict.fromkeys(
+            p["ticker"] for pf in portfolios for p in pf["positions"]
+        ))
+    column = {t: j for j, t in enumerate(tickers)}
+    shape = (len(portfolios), len(tickers))
+
+    book = {
+        "tickers": list(tickers),
+        "quantity": np.zeros(shape),
+        "avg_cost": np.zeros(shape),
+        "market_value": np.zeros(shape),
+        "pnl": np.zeros(shape),
+        "held": np.zeros(shape, dtype=bool),
+        "priced": np.zeros(shape, dtype=bool),
+        "entry_day": np.zeros(shape, dtype=np.int64),
+        "days_held": np.zeros(shape, dtype=np.int64),
+        "cash": np.array([pf["cash_balance_gbp"] for pf in portfolios], dtype=np.float64),
+        "unsettled": np.array([pf.get("unsettled_sell_proceeds_gbp", 0)
+                               for pf in portfolios], dtype=np.float64),
+        "equity": np.array([pf.get("equity_value_gbp", np.nan) for pf in portfolios],
+                           dtype=np.float64),
+        "peak": np.array([pf.get("portfolio_peak_equity_gbp", np.nan)
+                          for pf in portfolios], dtype=np.float64),
+        "new_peak": np.zeros(len(portfolios), dtype=bool),
+        "order": np.zeros(shape, dtype=np.int64),
+    }
+    for i, pf in enumerate(portfolios):
+        held = [column[p["ticker"]] for p in pf["positions"]]
+        book["order"][i] = held + sorted(set(range(len(tickers))) - set(held))
+        for p, j in zip(pf["positions"], held):
+            book["held"][i, j] = True
+            book["quantity"][i, j] = p["quantity"]
+            book["avg_cost"][i, j] = p["avg_cost_gbp"]
+            book["market_value"][i, j] = p.get("market_value_gbp", 0)
+            book["pnl"][i, j] = p.get("unrealised_pnl_gbp") or 0
+            book["days_held"][i, j] = p.get("days_held") or 0
+            if p.get("entry_date"):
+                book["entry_day"][i, j] = date.fromisoformat(p["entry_date"]).toordinal()
+    return book
+
+
+def price_vector(book, market_data):
+    """close_gbp per book ticker from market_data rows (NaN where missing)."""
+    prices = np.full(len(book["tickers"]), np.nan)
+    for j, ticker in enumerate(book["tickers"]):
+        row = market_data.get(ticker)
+        if row and row.get("close_gbp") is not None:
+            prices[j] = float(row["close_gbp"])
+    return prices
+
+
+def mark_to_market(book, prices, today):
+    """Revalue every held position at prices and update days_held.
+
+    prices is a length-M vector or an N x M matrix; positions with a NaN
+    price keep their last values.
+    """
+    prices = np.broadcast_to(np.asarray(prices, dtype=np.float64), book["quantity"].shape)
+    priced = book["held"] & np.isfinite(prices)
+    with np.errstate(invalid="ignore"):
+        value = round_like_python(prices * book["quantity"], 4)
+        pnl = round_like_python(value - book["avg_cost"] * book["quantity"], 4)
+    book["priced"] = priced
+    book["market_value"] = np.where(priced, value, book["market_value"])
+    book["pnl"] = np.where(priced, pnl, book["pnl"])
+
+    dated = book["held"] & (book["entry_day"] > 0)
+    book["days_held"] = np.where(dated, today.toordinal() - book["entry_day"],
+                                 book["days_held"])
+
+    missing = book["held"] & ~priced
+    if missing.any():
+        log.warning("No market data for %d position(s), keeping last values",
+                    int(missing.sum()))
+    return book
+
+
+def update_equity_and_drawdown(book):
+    """Recompute equity, peak equity and drawdown (as a fraction) per portfolio."""
+    values = np.where(book["held"], book["market_value"], 0.0)
+    values = np.take_along_axis(values, book["order"], axis=1)
+    position_value = (np.cumsum(values, axis=1)[:, -1] if values.shape[1]
+                      else np.zeros(len(values)))
+    book["equity"] = round_like_python(book["cash"] + book["unsettled"] + position_value, 2)
+    book["new_peak"] = book["equity"] > book["peak"]
+    # A portfolio without a peak yet starts from its equity, as in portfolio.py
+    book["peak"] = np.fmax(book["peak"], book["equity"])
+    peak = book["peak"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        book["drawdown"] = np.where(peak > 0, (peak - book["equity"]) / peak, 0.0)
+    return book
+
+
+def write_back(book, portfolios):
+    """Copy marked values from the book into the positions.json dicts.
+
+    Only fields the scalar functions would have written are touched.
+    """
+    column = {t: j for j, t in enumerate(book["tickers"])}
+    value = book["market_value"].tolist()
+    pnl = book["pnl"].tolist()
+    days = book["days_held"].tolist()
+    priced = book["priced"].tolist()
+    dated = (book["entry_day"] > 0).tolist()
+    for i, pf in enumerate(portfolios):
+        for p in pf["positions"]:
+            j = column[p["ticker"]]
+            if priced[i][j]:
+                p["market_value_gbp"] = value[i][j]
+                p["unrealised_pnl_gbp"] = pnl[i][j]
+            if dated[i][j]:
+                p["days_held"] = days[i][j]
+            else:
+                p.setdefault("days_held", 0)
+        pf["equity_value_gbp"] = float(book["equity"][i])
+        if book["new_peak"][i]:
+            pf["portfolio_peak_equity_gbp"] = float(book["peak"][i])
+    return portfolios
+
+
+def mark_portfolios(portfolios, market_data, today):
+    """Mark a list of positions.json dicts to market and update their equity.
+
+    Equivalent to running portfolio.compute_position_metrics and
+    portfolio.update_equity_and_drawdown on each one.
+    """
+    book = build_book(portfolios)
+    mark_to_market(book, price_vector(book, market_data), today)
+    update_equity_and_drawdown(book)
+    return write_back(book, portfolios)
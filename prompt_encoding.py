@@ -0,0 +1,135 @@
+"""Compact encoding of the decision engine's input files.
+
+The default prompt pastes market_data.csv, positions.json, universe.csv and
+config verbatim. Input size drives call latency and grows linearly with the
+universe, so the compact encoding:
+
+- keeps only the market data columns the system prompt uses, with per-field
+  precision (prices to 0.1p, ratios to 4 dp, volumes as integers)
+- leaves sector / instrument_type / uk_equity_flag to universe.csv instead
+  of repeating them on every market data row, and drops universe columns
+  the prompt never reads
+- pre-filters tickers that cannot pass the deterministic eligibility rules
+  (min_avg_gbp_volume, min_price_gbp, allowed_instruments). Held tickers
+  are always kept so exits and stops can still be managed.
+- serialises JSON without indentation
+"""
+
+import csv
+import io
+import json
+import logging
+import math
+
+log = logging.getLogger(__name__)
+
+# Market data columns sent in compact mode -> decimals (0 = integer)
+MARKET_DATA_PRECISION = {
+    "date": None,
+    "ticker": None,
+    "close_gbp": 3,
+    "high_gbp": 3,
+    "low_gbp": 3,
+    "open_gbp": 3,
+    "volume": 0,
+    "sma50_gbp": 3,
+    "sma200_gbp": 3,
+    "sma50_slope": None,
+    "atr14_gbp": 3,
+    "high_20d_gbp": 3,
+    "low_20d_gbp": 3,
+    "avg_volume_20d": 0,
+    "avg_gbp_volume_20d": 0,
+    "drawdown_from_20d_high_pct": 4,
+    "volume_ratio_20d": 2,
+    "close_vs_sma50_pct": 4,
+    "consecutive_days_below_sma50": 0,
+}
+
+UNIVERSE_COLUMNS = ["ticker", "sector", "instrument_type", "exchange",
+                    "uk_equity_flag", "status"]
+
+
+def estimate_tokens(text):
+    """Rough token count for English/CSV text (about 4 characters per token)."""
+    return len(text) // 4
+
+
+def compact_json(obj):
+    """Serialise JSON without whitespace."""
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def prefilter(market_data, universe, config, held=()):
+    """Drop tickers that fail the deterministic eligibility rules.
+
+    Args:
+        market_data: dict of ticker -> row (see data_pipeline.load_market_data)
+        universe: list of universe.csv row dicts
+        config: config dict (min_avg_gbp_volume, min_price_gbp,
+            allowed_instruments)
+        held: tickers currently held; always kept
+
+    Returns (kept, excluded): kept is a dict like market_data and excluded
+    is a dict of ticker -> reason.
+    """
+    instrument_types = {u["ticker"]: u.get("instrument_type", "EQUITY") for u in universe}
+    min_volume = config.get("min_avg_gbp_volume")
+    min_price = config.get("min_price_gbp")
+    allowed = config.get("allowed_instruments")
+
+    kept, excluded = {}, {}
+    for sym, row in market_data.items():
+        reason = None
+        instrument = instrument_types.get(sym, row.get("instrument_type"))
+        if allowed and instrument not in allowed:
+            reason = f"instrument_type {instrument} not allowed"
+        elif min_price is not None and _below(row.get("close_gbp"), min_price):
+            reason = f"close_gbp below min_price_gbp {min_price}"
+        elif min_volume is not None and _below(row.get("avg_gbp_volume_20d"), min_volume):
+            reason = f"avg_gbp_volume_20d below min_avg_gbp_volume {min_volume}"
+
+        if reason and sym not in held:
+            excluded[sym] = reason
+        else:
+            kept[sym] = row
+    return kept, excluded
+
+
+def encode_market_data(market_data):
+    """Render market data rows as compact CSV."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(MARKET_DATA_PRECISION)
+    for row in market_data.values():
+        writer.writerow([_format(row.get(key), decimals)
+                         for key, decimals in MARKET_DATA_PRECISION.items()])
+    return out.getvalue()
+
+
+def encode_universe(universe_csv):
+    """Re-render universe.csv keeping only the columns the prompt reads."""
+    rows = list(csv.DictReader(io.StringIO(universe_csv)))
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(UNIVERSE_COLUMNS)
+    for row in rows:
+        writer.writerow([row.get(col, "") for col in UNIVERSE_COLUMNS])
+    return out.getvalue()
+
+
+def _below(value, threshold):
+    """True if value is missing or below threshold."""
+    return value is None or (isinstance(value, float) and math.isnan(value)) or value < threshold
+
+
+def _format(value, decimals):
+    """Format a field at its precision, with trailing zeros stripped."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if decimals is None:
+        return value
+    if decimals == 0:
+        return str(int(round(value)))
+    text = f"{value:.{decimals}f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
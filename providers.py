@@ -0,0 +1,218 @@
+"""Market data providers — where the pipeline gets bars and quote currencies.
+
+data_pipeline talks to a provider rather than to yfinance directly:
+
+- YahooProvider: live Yahoo Finance data via yfinance (the default)
+- ReplayProvider: serves bars from on-disk fixtures (one CSV or Parquet file
+  per ticker), with optional injected latency and failures, so the whole
+  pipeline can be run and benchmarked with no network
+
+Providers take a yfinance-style window: period="1y" or start="YYYY-MM-DD".
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+import bar_store
+
+log = logging.getLogger(__name__)
+
+
+class ProviderError(Exception):
+    """Raised when a provider cannot serve a request."""
+
+
+class MarketDataProvider(ABC):
+    """Interface implemented by every market data provider."""
+
+    name = "base"
+
+    @abstractmethod
+    def download(self, symbols, **window):
+        """Fetch bars for many symbols in one batch.
+
+        Returns dict of ticker -> DataFrame (Open/High/Low/Close/Volume).
+        Symbols the batch could not serve are simply absent.
+        """
+
+    @abstractmethod
+    def history(self, symbol, **window):
+        """Fetch bars for a single symbol. Returns a DataFrame, possibly empty."""
+
+    @abstractmethod
+    def currency(self, symbol):
+        """Return the symbol's quote currency (e.g. "GBp"), or None if unknown."""
+
+
+class YahooProvider(MarketDataProvider):
+    """Yahoo Finance via yfinance, with auto-adjusted prices."""
+
+    name = "yahoo"
+
+    def __init__(self):
+        import yfinance as yf
+
+        self.yf = yf
+
+    def download(self, symbols, **window):
+        data = self.yf.download(
+            symbols,
+            group_by="ticker",
+            auto_adjust=True,
+            progress=False,
+            threads=True,
+            **window,
+        )
+
+        results = {}
+        if data.empty:
+            return results
+
+        for sym in symbols:
+            try:
+                if len(symbols) == 1:
+                    df = data.copy()
+                    if isinstance(df.columns, pd.MultiIndex):
+                        df = df[sym]
+                else:
+                    df = data[sym].copy()
+                results[sym] = df
+            except (KeyError, TypeError):
+                log.warning("  %s: not in batch result", sym)
+        return results
+
+    def history(self, symbol, **window):
+        return self.yf.Ticker(symbol).history(auto_adjust=True, **window)
+
+    def currency(self, symbol):
+        try:
+            return self.yf.Ticker(symbol).fast_info["currency"]
+        except Exception as e:
+            log.debug("  %s: fast_info currency failed — %s", symbol, e)
+            return None
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serve bars from fixture files in a directory.
+
+    Fixtures are <fixture_dir>/<ticker>.csv (Date,Open,High,Low,Close,Volume)
+    or <ticker>.parquet. Quote currencies come from an optional
+    <fixture_dir>/currencies.json mapping ticker -> currency.
+
+    Args:
+        fixture_dir: directory holding the fixture files
+        as_of: last date to serve (date or ISO string); bars after it are
+            hidden and periods are measured back from it. Defaults to the
+            last date in each fixture.
+        latency_sec: delay added to every request
+        failure_rate: probability (0-1) that a request raises ProviderError
+        seed: seed for the failure injection, for repeatable runs
+    """
+
+    name = "replay"
+
+    def __init__(self, fixture_dir, as_of=None, latency_sec=0.0,
+                 failure_rate=0.0, seed=0):
+        self.fixture_dir = Path(fixture_dir)
+        self.as_of = date.fromisoformat(as_of) if isinstance(as_of, str) else as_of
+        self.latency_sec = latency_sec
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.frames = {}
+
+        currencies_path = self.fixture_dir / "currencies.json"
+        self.currencies = {}
+        if currencies_path.exists():
+            with open(currencies_path) as f:
+                self.currencies = json.load(f)
+
+    def download(self, symbols, **window):
+        self._simulate()
+        results = {}
+        for sym in symbols:
+            df = self._window(sym, **window)
+            if df is not None and not df.empty:
+                results[sym] = df
+        return results
+
+    def history(self, symbol, **window):
+        self._simulate()
+        df = self._window(symbol, **window)
+        if df is None:
+            return pd.DataFrame(columns=bar_store.COLUMNS)
+        return df
+
+    def currency(self, symbol):
+        self._simulate()
+        return self.currencies.get(symbol)
+
+    def _simulate(self):
+        """Apply injected latency and failures."""
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+        with self.lock:
+            failed = self.failure_rate and self.rng.random() < self.failure_rate
+        if failed:
+            raise ProviderError("injected replay failure")
+
+    def _load(self, symbol):
+        with self.lock:
+            if symbol in self.frames:
+                return self.frames[symbol]
+
+        csv_path = self.fixture_dir / f"{symbol}.csv"
+        parquet_path = self.fixture_dir / f"{symbol}.parquet"
+        if csv_path.exists():
+            df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+        elif parquet_path.exists():
+            df = pd.read_parquet(parquet_path)
+        else:
+            df = None
+        if df is not None:
+            df = bar_store.normalize_bars(df)
+
+        with self.lock:
+            self.frames[symbol] = df
+        return df
+
+    def _window(self, symbol, period=None, start=None):
+        df = self._load(symbol)
+        if df is None or df.empty:
+            return None
+
+        as_of = self.as_of or df.index[-1].date()
+        df = df[df.index <= pd.Timestamp(as_of)]
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start)]
+        elif period is not None:
+            df = bar_store.trim_to_period(df, period, today=as_of)
+        return df.copy()
+
+
+def write_fixtures(frames, fixture_dir, currencies=None):
+    """Write per-ticker bars (e.g. from fetch_ohlcv) as replay fixtures."""
+    fixture_dir = Path(fixture_dir)
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    for sym, df in frames.items():
+        bar_store.normalize_bars(df).to_csv(fixture_dir / f"{sym}.csv")
+    if currencies:
+        with open(fixture_dir / "currencies.json", "w") as f:
+            json.dump(currencies, f, indent=2, sort_keys=True)
+
+
+def get_provider(name="yahoo", **options):
+    """Create a provider by name ("yahoo" or "replay")."""
+    if name == "yahoo":
+        return YahooProvider()
+    if name == "replay":
+        return ReplayProvider(**options)
+    raise ValueError(f"Unknown market data provider: {name}")
@@ -0,0 +1,62 @@
+"""Content-addressed cache of Claude responses.
+
+A re-dispatched workflow or a --dry-run after a real run sends the API
+byte-identical inputs. Responses are stored in data/response_cache/ under a
+sha256 of (system prompt, user message, model, max_tokens), so such re-runs
+replay the earlier response instead of calling the API again.
+
+Modes:
+- replay: use a cached response if there is one, otherwise call and store
+- refresh: always call the API and overwrite the cached response
+- bypass: always call the API and leave the cache untouched
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+MODES = ("replay", "refresh", "bypass")
+DEFAULT_MODE = "replay"
+
+
+def cache_key(system_prompt, user_text, model, max_tokens):
+    """Return the hex sha256 identifying a request."""
+    payload = json.dumps(
+        {"system": system_prompt, "user": user_text,
+         "model": model, "max_tokens": max_tokens},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load(cache_dir, key):
+    """Return the cached response text for key, or None."""
+    path = Path(cache_dir) / f"{key}.json"
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["response_text"]
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, KeyError) as e:
+        log.warning("Ignoring unreadable response cache entry %s: %s", path.name, e)
+        return None
+
+
+def store(cache_dir, key, response_text, model):
+    """Write a response to the cache."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    entry = {
+        "key": key,
+        "model": model,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "response_text": response_text,
+    }
+    tmp = cache_dir / f"{key}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, indent=2)
+    tmp.replace(cache_dir / f"{key}.json")
@@ -0,0 +1,655 @@
+"""Deterministic rule engine — a fast path ahead of the Claude call.
+
+Most of the system prompt is mechanical: the trend filter, the per-profile
+pullback / breakout triggers, stop breaches, the position and sector caps,
+the cash buffer and the drawdown limit. This module evaluates those rules
+on the market data and positions in Python and decides the day outright
+when the answer is unambiguous:
+
+- portfolio drawdown above the limit: sell everything (DRAWDOWN_EXIT)
+- no new entry possible (no triggered candidate, or no capacity: position
+  cap, cash after buffer, max new positions, SELL-only day) and every
+  holding either holds or has breached its stop: stop exits only, or
+  NO_TRADES
+
+Anything needing judgement goes to Claude: triggered candidates with room
+to buy, positions due a trend-break or time-stop review, DELISTING
+holdings, held tickers without usable market data, and invalid config.
+Positions younger than min_position_age_days are never exited here except
+by their stop; under a drawdown breach they also go to Claude.
+
+Decided runs produce the same five outputs as a Claude run, with
+"decided_by": "rule_engine" in run_status.json and a minimal daily report.
+"""
+
+import csv
+import io
+import json
+import logging
+from datetime import date
+
+import output_schema
+import prompt_encoding
+import stop_engine
+
+log = logging.getLogger(__name__)
+
+# Strategy parameter table (SYSTEM_v2, section B)
+PROFILES = {
+    "conservative": {
+        "pullback_range": (0.05, 0.08), "breakout_within": 0.01,
+        "breakout_volume_ratio": 1.5, "atr_multiplier": 2.0, "fallback_stop_pct": 0.05,
+        "time_stop_days": 20, "max_new_positions": 1, "trend_break_days": 3,
+    },
+    "balanced": {
+        "pullback_range": (0.03, 0.06), "breakout_within": 0.02,
+        "breakout_volume_ratio": 1.2, "atr_multiplier": 1.5, "fallback_stop_pct": 0.04,
+        "time_stop_days": 15, "max_new_positions": 2, "trend_break_days": 2,
+    },
+    "aggressive": {
+        "pullback_range": (0.02, 0.05), "breakout_within": 0.03,
+        "breakout_volume_ratio": 1.0, "atr_multiplier": 1.0, "fallback_stop_pct": 0.03,
+        "time_stop_days": 10, "max_new_positions": 3, "trend_break_days": 2,
+    },
+}
+
+# Fields the entry rules read; tickers missing any are not candidates
+ENTRY_FIELDS = ["close_gbp", "sma50_gbp", "sma50_slope", "atr14_gbp", "high_20d_gbp",
+                "avg_gbp_volume_20d", "drawdown_from_20d_high_pct", "volume_ratio_20d"]
+
+DISCLAIMER = (
+    "This is an automated, rules-based trading plan generated from provided "
+    "historical market data. It is not financial advice. Execution risk, gaps, "
+    "slippage, FX effects, settlement timing, and taxes/fees apply. Stop-losses in "
+    "DAILY_CHECK mode are monitored once daily and cannot protect against intraday "
+    "or overnight gaps. Use at your own risk."
+)
+
+# Relative slack on amount checks in check_constraints (rounding, fill price)
+CONSTRAINT_TOLERANCE = 0.01
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def trend_status(row):
+    """FULL, PARTIAL or NONE per the trend filter."""
+    close, sma50, sma200 = row.get("close_gbp"), row.get("sma50_gbp"), row.get("sma200_gbp")
+    if close is None or sma50 is None:
+        return "NONE"
+    if sma200 is not None:
+        return "FULL" if close > sma50 > sma200 else "NONE"
+    if row.get("sma50_slope") == "positive" and close > sma50:
+        return "PARTIAL"
+    return "NONE"
+
+
+def entry_trigger(row, params):
+    """PULLBACK, BREAKOUT or None for a trend-passing row."""
+    close, sma50 = row["close_gbp"], row["sma50_gbp"]
+    low, high = params["pullback_range"]
+    if low <= row["drawdown_from_20d_high_pct"] <= high and close > sma50:
+        return "PULLBACK"
+    if (close >= row["high_20d_gbp"] * (1 - params["breakout_within"])
+            and row["volume_ratio_20d"] >= params["breakout_volume_ratio"]):
+        return "BREAKOUT"
+    return None
+
+
+def drawdown_pct(positions):
+    """Current drawdown from peak equity as a fraction."""
+    peak = positions.get("portfolio_peak_equity_gbp") or 0
+    equity = positions.get("equity_value_gbp", 0)
+    return (peak - equity) / peak if peak > 0 else 0.0
+
+
+def assess(config, market_data, positions, universe):
+    """Evaluate the deterministic rules.
+
+    Args:
+        config: config dict
+        market_data: dict of ticker -> row (see data_pipeline.load_market_data)
+        positions: positions.json dict, marked to market for today
+        universe: all universe.csv rows, including non-ACTIVE ones
+
+    Holdings younger than min_position_age_days are only exited
+    outright by their stop (anti-churn); a drawdown exit of one goes to
+    Claude, and trend-break reviews are held instead.
+
+    Returns dict with exits, holds, reviews (holdings needing judgement),
+    candidates (triggered entries with rejected_reason None if still
+    open), buy_blocked (reason or None), available_for_buys_gbp, drawdown
+    and needs_claude (list of reasons the day needs Claude; empty if the
+    rules decide it).
+    """
+    params = PROFILES.get(config.get("strategy_profile"), PROFILES["balanced"])
+    statuses = {u["ticker"]: u.get("status") or "ACTIVE" for u in universe}
+    equity = positions.get("equity_value_gbp", 0)
+    dd = drawdown_pct(positions)
+    limit = config.get("portfolio_drawdown_limit_pct", 1.0)
+    liquidate = dd > limit
+    min_age = config.get("min_position_age_days", 0)
+
+    needs_claude = []
+    if (config.get("base_currency") != "GBP" or config.get("account_type") != "cash"
+            or config.get("allow_shorting")):
+        needs_claude.append("config validation")
+
+    stops_hit = {e["ticker"]: e for e in
+                 stop_engine.triggered_stops(positions, market_data, config)}
+    exits, holds, reviews = [], [], []
+    for pos in positions.get("positions", []):
+        sym = pos["ticker"]
+        row = market_data.get(sym) or {}
+        if row.get("close_gbp") is None or row.get("low_gbp") is None:
+            needs_claude.append(f"{sym}: no market data for holding")
+            reviews.append({"ticker": sym, "stop_gbp": pos.get("current_stop_gbp"),
+                            "note": "no market data for holding"})
+            continue
+        exit_row = {"ticker": sym, "quantity": pos["quantity"], "close_gbp": row["close_gbp"],
+                    "fill_ref_gbp": row["close_gbp"], "stop_gbp": pos.get("current_stop_gbp")}
+        young = pos.get("days_held") is not None and pos["days_held"] < min_age
+        if liquidate and young:
+            note = (f"drawdown exit of a position held {pos['days_held']} day(s) "
+                    f"< min_position_age_days {min_age}")
+            needs_claude.append(f"{sym}: {note}")
+            reviews.append({**exit_row, "note": note})
+            continue
+        if liquidate:
+            exits.append({**exit_row, "entry_type": "DRAWDOWN_EXIT",
+                          "reason": f"Portfolio drawdown {dd:.1%} > limit {limit:.1%}"})
+            continue
+        if "DELISTING" in (pos.get("status"), statuses.get(sym)):
+            needs_claude.append(f"{sym}: DELISTING")
+            reviews.append({**exit_row, "note": "DELISTING"})
+            continue
+        if sym in stops_hit:
+            # Filled like stop_engine's STOP orders: at the stop, or the open on a gap
+            hit = stops_hit[sym]
+            exits.append({**exit_row, "entry_type": "STOP_EXIT",
+                          "fill_ref_gbp": hit["fill_ref_gbp"], "reason": hit["reason"]})
+            continue
+        review = _exit_review(pos, row, params)
+        if review and young:
+            holds.append({**exit_row, "note": f"{review} — held {pos['days_held']} day(s) "
+                                              f"< min_position_age_days, hold"})
+            continue
+        if review:
+            needs_claude.append(f"{sym}: {review}")
+            reviews.append({**exit_row, "note": review})
+            continue
+        holds.append({**exit_row, "note": "SUSPENDED — hold and flag"
+                      if "SUSPENDED" in (pos.get("status"), statuses.get(sym)) else ""})
+
+    held = {p["ticker"] for p in positions.get("positions", [])}
+    exited = {e["ticker"] for e in exits}
+    sector_value = {}
+    for pos in positions.get("positions", []):
+        if pos["ticker"] not in exited:
+            sector = pos.get("sector") or "Unknown"
+            sector_value[sector] = sector_value.get(sector, 0) + pos.get("market_value_gbp", 0)
+
+    available = (positions.get("cash_balance_gbp", 0)
+                 - config.get("cash_buffer_pct", 0.03) * equity)
+    if config.get("assume_intraday_netting"):
+        available += sum(e["quantity"] * e["fill_ref_gbp"] for e in exits)
+
+    buy_blocked = _buy_blocked(config, params, positions, len(held - exited),
+                               available, liquidate)
+    candidates = _candidates(config, params, market_data, universe, held, statuses,
+                             sector_value, equity)
+    if not buy_blocked and any(c["rejected_reason"] is None for c in candidates):
+        needs_claude.append("entry candidates to judge")
+
+    return {
+        "params": params,
+        "drawdown_pct": dd,
+        "drawdown_breached": liquidate,
+        "available_for_buys_gbp": max(available, 0.0),
+        "exits": exits,
+        "holds": holds,
+        "reviews": reviews,
+        "candidates": candidates,
+        "buy_blocked": buy_blocked,
+        "sector_value_gbp": sector_value,
+        "needs_claude": needs_claude,
+    }
+
+
+def _exit_review(pos, row, params):
+    """Reason a holding needs a trend-break or time-stop review, or None."""
+    below = row.get("consecutive_days_below_sma50")
+    if below is None:
+        if row.get("sma50_gbp") is not None and row["close_gbp"] < row["sma50_gbp"]:
+            return "close below sma50 (trend break review)"
+    elif below >= params["trend_break_days"]:
+        return f"close below sma50 for {int(below)} days (trend break)"
+    # days_held is calendar days, so this errs towards reviewing early
+    if (pos.get("days_held", 0) > params["time_stop_days"]
+            and pos.get("unrealised_pnl_gbp", 0) <= 0):
+        return "time stop review"
+    return None
+
+
+def _buy_blocked(config, params, positions, holdings_after, available, liquidate):
+    """Reason no new position can be opened today, or None."""
+    if liquidate:
+        return "drawdown limit breached"
+    if config.get("kill_switch"):
+        return "kill switch"
+    rebalance_day = config.get("rebalance_day_of_week")
+    if rebalance_day is not None:
+        today = date.fromisoformat(positions["as_of_date"]).weekday()
+        if str(rebalance_day).lower() not in (WEEKDAYS[today], str(today)):
+            return "not rebalance day (SELL-only)"
+    if holdings_after >= config.get("max_positions", 0):
+        return f"max_positions {config.get('max_positions')} reached"
+    if min(config.get("max_new_positions_per_day", 0), params["max_new_positions"]) <= 0:
+        return "max_new_positions_per_day is 0"
+    if available <= 0:
+        return f"no cash available after buffer (£{available:.2f})"
+    return None
+
+
+def _candidates(config, params, market_data, universe, held, statuses,
+                sector_value, equity):
+    """Triggered entry setups, with rejected_reason set if they cannot be bought."""
+    active = [u for u in universe if statuses[u["ticker"]] == "ACTIVE"
+              and u["ticker"] not in held]
+    rows = {u["ticker"]: market_data[u["ticker"]] for u in active
+            if u["ticker"] in market_data}
+    liquid, _ = prompt_encoding.prefilter(rows, universe, config)
+    sectors = {u["ticker"]: u.get("sector") for u in universe}
+    sector_cap = config.get("max_sector_exposure_pct", 1.0) * equity
+
+    candidates = []
+    for sym, row in liquid.items():
+        if any(row.get(f) is None for f in ENTRY_FIELDS):
+            continue
+        trend = trend_status(row)
+        if trend == "NONE":
+            continue
+        trigger = entry_trigger(row, params)
+        if not trigger:
+            continue
+        sector = sectors.get(sym) or row.get("sector") or "Unknown"
+        rejected = None
+        if sector_value.get(sector, 0) >= sector_cap:
+            rejected = f"{sector} sector at max_sector_exposure_pct"
+        candidates.append({"ticker": sym, "entry_type": trigger, "trend_status": trend,
+                           "close_gbp": row["close_gbp"], "rejected_reason": rejected})
+    return candidates
+
+
+def check_constraints(outputs, config, market_data, positions, universe):
+    """Hard-constraint violations in a proposed day's outputs.
+
+    Checks orders against the risk policy: order sequence, sells of held
+    quantity only, and for BUYs eligibility (universe, liquidity, trend),
+    the drawdown limit, position and new-position caps, cash after buffer,
+    single-name and sector caps, and a stop below the price. Amounts get
+    CONSTRAINT_TOLERANCE slack for rounding. Returns a list of strings.
+    """
+    orders = list(csv.DictReader(io.StringIO(outputs.get("orders_csv") or "")))
+    orders = [o for o in orders if o.get("ticker") and o.get("side")]
+    status = (outputs.get("run_status") or {}).get("status")
+    if not orders:
+        return []
+    if status != "OK":
+        return [f"orders present with status {status}"]
+
+    violations = []
+    held = {p["ticker"]: p for p in positions.get("positions", [])}
+    equity = positions.get("equity_value_gbp", 0)
+    slack = 1 + CONSTRAINT_TOLERANCE
+    decisions = {d.get("ticker"): d for d in
+                 (outputs.get("trade_plan") or {}).get("decisions", []) if d.get("action") == "BUY"}
+    statuses = {u["ticker"]: u.get("status") or "ACTIVE" for u in universe}
+    sectors = {u["ticker"]: u.get("sector") for u in universe}
+    liquid, _ = prompt_encoding.prefilter(market_data, universe, config)
+
+    sides = [o["side"].upper() for o in orders]
+    if (config.get("execution_sequence", "SELL_THEN_BUY") == "SELL_THEN_BUY"
+            and "BUY" in sides and "SELL" in sides[sides.index("BUY"):]):
+        violations.append("SELL after BUY with execution_sequence SELL_THEN_BUY")
+
+    sold, buys = {}, []
+    for o in orders:
+        sym, side = o["ticker"], o["side"].upper()
+        try:
+            quantity = float(o["quantity"])
+        except (TypeError, ValueError):
+            violations.append(f"{sym}: quantity {o['quantity']!r} is not a number")
+            continue
+        if side == "SELL":
+            sold[sym] = sold.get(sym, 0) + quantity
+        elif side == "BUY":
+            buys.append((sym, quantity))
+        else:
+            violations.append(f"{sym}: unknown side {o['side']}")
+    for sym, quantity in sold.items():
+        if sym not in held:
+            violations.append(f"{sym}: SELL of a ticker not held")
+        elif quantity > held[sym]["quantity"] * slack:
+            violations.append(f"{sym}: SELL {quantity} exceeds held {held[sym]['quantity']}")
+    if not buys:
+        return violations
+
+    if drawdown_pct(positions) > config.get("portfolio_drawdown_limit_pct", 1.0):
+        violations.append("BUY while portfolio drawdown limit is breached")
+    if config.get("kill_switch"):
+        violations.append("BUY with kill switch on")
+
+    closed = {sym for sym, q in sold.items() if sym in held and q >= held[sym]["quantity"]}
+    new = {sym for sym, _ in buys if sym not in held}
+    if len(new) > config.get("max_new_positions_per_day", 0):
+        violations.append(f"{len(new)} new positions > max_new_positions_per_day "
+                          f"{config.get('max_new_positions_per_day')}")
+    if len(set(held) - closed) + len(new) > config.get("max_positions", 0):
+        violations.append(f"positions after trades exceed max_positions "
+                          f"{config.get('max_positions')}")
+
+    slippage = config.get("slippage_bps", 10) / 10000
+    stamp = config.get("stamp_duty_bps", 0) / 10000
+    sector_value = {}
+    for sym, p in held.items():
+        if sym not in closed:
+            sector = p.get("sector") or "Unknown"
+            sector_value[sector] = sector_value.get(sector, 0) + p.get("market_value_gbp", 0)
+
+    spend = 0.0
+    for sym, quantity in buys:
+        row = market_data.get(sym)
+        if statuses.get(sym) != "ACTIVE":
+            violations.append(f"{sym}: BUY of a ticker not ACTIVE in the universe")
+            continue
+        if not row or row.get("close_gbp") is None:
+            violations.append(f"{sym}: BUY without market data")
+            continue
+        if sym not in liquid:
+            violations.append(f"{sym}: BUY fails the liquidity/instrument filters")
+        if trend_status(row) == "NONE":
+            violations.append(f"{sym}: BUY fails the trend filter")
+        notional = quantity * row["close_gbp"] * (1 + slippage)
+        if str(row.get("uk_equity_flag", "")).lower() == "true":
+            notional *= 1 + stamp
+        spend += notional
+
+        value = notional + held.get(sym, {}).get("market_value_gbp", 0)
+        if value > config.get("max_single_name_exposure_pct", 1.0) * equity * slack:
+            violations.append(f"{sym}: £{value:.2f} exceeds max_single_name_exposure_pct")
+        sector = sectors.get(sym) or row.get("sector") or "Unknown"
+        sector_value[sector] = sector_value.get(sector, 0) + notional
+        if sector_value[sector] > config.get("max_sector_exposure_pct", 1.0) * equity * slack:
+            violations.append(f"{sym}: {sector} exposure exceeds max_sector_exposure_pct")
+
+        stop = ((decisions.get(sym) or {}).get("stop") or {}).get("price_gbp")
+        if stop is None or stop >= row["close_gbp"]:
+            violations.append(f"{sym}: BUY without a stop below the price")
+
+    available = (positions.get("cash_balance_gbp", 0)
+                 - config.get("cash_buffer_pct", 0.03) * equity)
+    if config.get("assume_intraday_netting"):
+        available += sum(q * market_data[s]["close_gbp"] for s, q in sold.items()
+                         if market_data.get(s, {}).get("close_gbp") is not None)
+    if spend > available * slack + 0.01:
+        violations.append(f"BUY cost £{spend:.2f} exceeds cash available after buffer "
+                          f"£{max(available, 0):.2f}")
+    return violations
+
+
+def decide(config, market_data, positions, universe, calendar):
+    """Return the day's outputs if the rules decide it, else None.
+
+    The outputs dict has the same keys as decision_engine.parse_outputs.
+    """
+    assessment = assess(config, market_data, positions, universe)
+    if assessment["needs_claude"]:
+        log.info("Rule engine defers to Claude: %s", "; ".join(assessment["needs_claude"]))
+        return None
+    outputs = build_outputs(assessment, config, positions, calendar)
+    log.info("Rule engine decided the day: %s — %s",
+             outputs["run_status"]["status"], outputs["run_status"]["reason"])
+    return outputs
+
+
+def manage_stops_only(config, market_data, positions, universe, calendar, reason):
+    """Fallback decision when Claude is unavailable.
+
+    Applies stop exits and a drawdown liquidation only; everything else is
+    held and no new positions are opened. Stop exits are STOP orders,
+    filled at the stop or the gap open as stop_engine fills them. reason
+    says why Claude was not used and is recorded in run_status.json.
+    """
+    assessment = assess(config, market_data, positions, universe)
+    assessment["buy_blocked"] = "Claude unavailable, managing stops only"
+    assessment["holds"] = assessment["holds"] + [
+        {**r, "note": f"{r['note']} — review deferred, Claude unavailable"}
+        for r in assessment["reviews"]
+    ]
+    outputs = build_outputs(assessment, config, positions, calendar)
+    outputs["run_status"]["reason"] = (f"Claude unavailable ({reason}). "
+                                       f"{outputs['run_status']['reason']}")
+    outputs["run_status"]["decided_by"] = "rule_engine_fallback"
+    log.warning("Fallback decision: %s — %s",
+                outputs["run_status"]["status"], outputs["run_status"]["reason"])
+    return outputs
+
+
+def build_outputs(assessment, config, positions, calendar):
+    """Build the five outputs for a decided day."""
+    as_of = positions["as_of_date"]
+    exits, holds = assessment["exits"], assessment["holds"]
+    equity = positions.get("equity_value_gbp", 0)
+    dd = assessment["drawdown_pct"]
+
+    if assessment["drawdown_breached"]:
+        reason = (f"Portfolio drawdown {dd:.1%} exceeds limit "
+                  f"{config['portfolio_drawdown_limit_pct']:.1%}; closing all positions")
+    elif exits:
+        reason = (f"Stop exits only ({', '.join(e['ticker'] for e in exits)}); "
+                  f"no new entries: {assessment['buy_blocked'] or 'no triggered setups'}")
+    else:
+        reason = ("No stop breaches; no new entries: "
+                  f"{assessment['buy_blocked'] or 'no triggered setups'}")
+    status = "OK" if exits else "NO_TRADES"
+    sequence = config.get("execution_sequence", "SELL_THEN_BUY")
+    stop_mode = config.get("stop_execution_mode", "DAILY_CHECK")
+
+    exit_value = sum(e["quantity"] * e["fill_ref_gbp"] for e in exits)
+    remaining = [p for p in positions.get("positions", [])
+                 if p["ticker"] not in {e["ticker"] for e in exits}]
+    largest = max((p.get("market_value_gbp", 0) for p in remaining), default=0)
+    summary = {
+        "positions_count_after": len(remaining),
+        "turnover_pct": round(100 * exit_value / equity, 2) if equity else 0.0,
+        "largest_position_pct": round(100 * largest / equity, 2) if equity else 0.0,
+        "cash_buffer_pct": config.get("cash_buffer_pct", 0.03),
+        "sector_exposures_pct": {
+            s: round(100 * v / equity, 2) if equity else 0.0
+            for s, v in assessment["sector_value_gbp"].items()
+        },
+        "portfolio_beta": None,
+        "max_pairwise_correlation": None,
+        "portfolio_drawdown_pct": round(100 * dd, 2),
+    }
+
+    run_status = {
+        "status": status,
+        "as_of_date": as_of,
+        "reason": reason,
+        "data_checks": {
+            "trading_day": calendar.get("is_trading_day", True),
+            "is_half_day": calendar.get("is_half_day", False),
+            "portfolio_drawdown_pct": round(100 * dd, 2),
+            "drawdown_limit_breached": assessment["drawdown_breached"],
+        },
+        "risk_checks": {
+            "new_entries_blocked": assessment["buy_blocked"],
+            "available_for_buys_gbp": round(assessment["available_for_buys_gbp"], 4),
+        },
+        "currency": "GBP",
+        "execution_sequence": sequence,
+        "stop_execution_mode": stop_mode,
+        "decided_by": "rule_engine",
+    }
+
+    decisions = []
+    for e in exits:
+        stop_exit = e["entry_type"] == "STOP_EXIT"
+        decisions.append({
+            "ticker": e["ticker"], "action": "SELL", "confidence": 1.0,
+            "entry": {"type": _order_type(e), "price_gbp": e["stop_gbp"] if stop_exit else None},
+            "size": {"quantity": e["quantity"],
+                     "notional_gbp": round(e["quantity"] * e["fill_ref_gbp"], 4)},
+            "rationale": [f"{e['entry_type']}: {e['reason']}"],
+            "constraints_passed": True,
+        })
+    for h in holds:
+        decisions.append({
+            "ticker": h["ticker"], "action": "HOLD", "confidence": 1.0,
+            "stop": {"type": "HARD", "price_gbp": h["stop_gbp"], "execution_mode": stop_mode},
+            "rationale": [h["note"] or "Within stop; no exit rule triggered"],
+            "constraints_passed": True,
+        })
+
+    trade_plan = {
+        "as_of_date": as_of,
+        "currency": "GBP",
+        "execution_sequence": sequence,
+        "stop_execution_mode": stop_mode,
+        "portfolio_equity_gbp": equity,
+        "cash_balance_gbp": positions.get("cash_balance_gbp", 0),
+        "available_for_buys_gbp": round(assessment["available_for_buys_gbp"], 4),
+        "unsettled_proceeds_gbp": positions.get("unsettled_sell_proceeds_gbp", 0),
+        "portfolio_drawdown_pct": round(100 * dd, 2),
+        "strategy_profile": config.get("strategy_profile"),
+        "candidates_considered": [
+            {"ticker": c["ticker"], "entry_type": c["entry_type"],
+             "trend_status": c["trend_status"], "confidence": None,
+             "rejected_reason": c["rejected_reason"] or assessment["buy_blocked"]}
+            for c in assessment["candidates"]
+        ],
+        "decisions": decisions,
+        "portfolio_constraints_summary": summary,
+    }
+
+    orders = [
+        {"order_id": f"{as_of.replace('-', '')}-{i:02d}", "ticker": e["ticker"],
+         "side": "SELL", "order_type": _order_type(e), "quantity": e["quantity"],
+         "limit_price_gbp": None, "time_in_force": "DAY", "stop_price_gbp": e["stop_gbp"],
+         "reason": e["entry_type"]}
+        for i, e in enumerate(exits, start=1)
+    ]
+
+    trade_log_update = {
+        "as_of_date": as_of,
+        "entries": [
+            {"ticker": e["ticker"], "action": "SELL", "planned_price_gbp": e["fill_ref_gbp"],
+             "planned_quantity": e["quantity"], "stop_price_gbp": e["stop_gbp"],
+             "confidence": 1.0, "entry_type": e["entry_type"],
+             "rationale_summary": e["reason"]}
+            for e in exits
+        ],
+    }
+
+    return {
+        "run_status": run_status,
+        "trade_plan": trade_plan,
+        "orders_csv": output_schema.render_orders_csv(orders) if orders else "",
+        "daily_report": _daily_report(run_status, trade_plan, orders, positions,
+                                      calendar, assessment),
+        "trade_log_update": trade_log_update,
+    }
+
+
+def _order_type(exit_):
+    """STOP for stop exits (filled like stop_engine's), MKT otherwise."""
+    return stop_engine.STOP_ORDER_TYPE if exit_["entry_type"] == "STOP_EXIT" else "MKT"
+
+
+def _daily_report(run_status, trade_plan, orders, positions, calendar, assessment):
+    """Minimal daily_report.md for a rule-engine decision."""
+    lines = [
+        f"# Daily Report — {run_status['as_of_date']}",
+        "",
+        f"**Status:** {run_status['status']} | **Currency:** GBP | "
+        f"**Execution:** {run_status['execution_sequence']} | "
+        f"**Stops:** {run_status['stop_execution_mode']}",
+        "",
+        "Decided by the local rule engine; Claude was not called.",
+        "",
+        "## Trading calendar",
+        f"Trading day{' (half day — reduced liquidity)' if calendar.get('is_half_day') else ''}; "
+        f"next trading day {calendar.get('next_trading_day', 'n/a')}.",
+        "",
+        "## Summary",
+        run_status["reason"] + ".",
+        "",
+        "## Setups considered",
+    ]
+    if trade_plan["candidates_considered"]:
+        for c in trade_plan["candidates_considered"][:3]:
+            lines.append(f"- {c['ticker']}: {c['entry_type']} ({c['trend_status']} trend) "
+                         f"— not taken: {c['rejected_reason']}")
+    else:
+        lines.append("- No ticker met the trend filter and an entry trigger.")
+
+    limit = assessment["drawdown_breached"]
+    lines += [
+        "",
+        "## Risk checks",
+        f"- Portfolio drawdown: {trade_plan['portfolio_drawdown_pct']:.2f}% "
+        f"({'BREACHED' if limit else 'within limit'})",
+        f"- New entries: {assessment['buy_blocked'] or 'none triggered'}",
+        f"- Available for buys: £{trade_plan['available_for_buys_gbp']:.2f}",
+        "",
+        "## Costs and gap risk",
+        "Costs per config fee_model, stamp_duty_bps and slippage_bps. Stops are checked "
+        "once daily (DAILY_CHECK) and cannot protect against overnight gaps.",
+        "",
+        "## Portfolio",
+        "| Ticker | Qty | Mkt Val (£) | P&L (£) | Stop (£) |",
+        "|---|---|---|---|---|",
+    ]
+    for p in positions.get("positions", []):
+        lines.append(f"| {p['ticker']} | {p['quantity']} | {p.get('market_value_gbp', 0):.2f} "
+                     f"| {p.get('unrealised_pnl_gbp', 0):+.2f} | {_fmt(p.get('current_stop_gbp'))} |")
+    lines += ["", "## Orders"]
+    if orders:
+        lines += ["| Ticker | Side | Type | Qty | Reason |", "|---|---|---|---|---|"]
+        lines += [f"| {o['ticker']} | {o['side']} | {o['order_type']} | {o['quantity']} "
+                  f"| {o['reason']} |" for o in orders]
+    else:
+        lines.append("None.")
+    lines += [
+        "",
+        "## What could invalidate this plan",
+        "Gaps at the open, stale or revised market data, and corporate actions.",
+        "",
+        "## Disclaimer",
+        DISCLAIMER,
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.4f}"
+
+
+def render_response(outputs):
+    """Render outputs as === filename === sections, like a Claude response."""
+    parts = [
+        ("run_status.json", json.dumps(outputs["run_status"], indent=2)),
+        ("trade_plan.json", json.dumps(outputs["trade_plan"], indent=2)),
+        ("orders.csv", outputs["orders_csv"] or ",".join(output_schema.ORDERS_HEADER)),
+        ("daily_report.md", outputs["daily_report"]),
+        ("trade_log_update.json", json.dumps(outputs["trade_log_update"], indent=2)),
+    ]
+    return "\n\n".join(f"=== {name} ===\n{text.strip()}" for name, text in parts)
+
+
+def load_universe_rows(path):
+    """All universe.csv rows, including non-ACTIVE ones."""
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
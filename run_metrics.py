@@ -0,0 +1,185 @@
+"""Run instrumentation — per-stage timings and resource use for each daily run.
+
+bot.run opens a run, and code along the way wraps each step in a span:
+
+    with run_metrics.span("fetch", tickers=len(universe)) as s:
+        ...
+        s["fetched"] = len(bars)
+
+Each span records wall time, CPU time and peak RSS, plus any counts the
+caller attaches (tickers, tokens). Nested spans are named after their
+parent, so a "fetch" span inside bot.run's "market_data" span is recorded
+as "market_data.fetch". When the run finishes it is appended
+as one JSON line to logs/run_metrics.jsonl, which bot.py --status
+summarises as latest and p50/p95 stage timings.
+
+Spans are opened from the main thread only. Outside a run, span() still
+times its block but records nothing.
+"""
+
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+log = logging.getLogger(__name__)
+
+HISTORY_RUNS = 30
+
+_current = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unknown)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / scale, 1)
+
+
+def start_run(**fields):
+    """Begin recording a run. Extra fields are stored on the run record."""
+    global _current
+    _current = {
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "spans": [],
+        "_stack": [],
+        "_wall": time.perf_counter(),
+        "_cpu": time.process_time(),
+        **fields,
+    }
+    return _current
+
+
+def annotate(**fields):
+    """Attach fields (e.g. status) to the current run, if one is open."""
+    if _current is not None:
+        _current.update(fields)
+
+
+@contextmanager
+def span(name, **counts):
+    """Time a block as a named stage. Yields a dict for extra counts."""
+    run = _current
+    if run is not None:
+        run["_stack"].append(name)
+        name = ".".join(run["_stack"])
+    record = {"name": name, **counts}
+    if run is not None:
+        run["spans"].append(record)  # in start order; timings filled on close
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_sec"] = round(time.perf_counter() - wall, 4)
+        record["cpu_sec"] = round(time.process_time() - cpu, 4)
+        record["peak_rss_mb"] = peak_rss_mb()
+        if run is not None:
+            run["_stack"].pop()
+
+
+def finish_run(path):
+    """Close the current run and append it to the metrics history file."""
+    global _current
+    run, _current = _current, None
+    if run is None:
+        return None
+
+    record = {k: v for k, v in run.items() if not k.startswith("_")}
+    record["wall_sec"] = round(time.perf_counter() - run["_wall"], 4)
+    record["cpu_sec"] = round(time.process_time() - run["_cpu"], 4)
+    record["peak_rss_mb"] = peak_rss_mb()
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+    log.info("Run metrics: %.2fs wall, %.2fs CPU, peak RSS %s MB, %d spans",
+             record["wall_sec"], record["cpu_sec"], record["peak_rss_mb"],
+             len(record["spans"]))
+    return record
+
+
+def load_history(path, limit=HISTORY_RUNS):
+    """Load the most recent run records. Unreadable lines are skipped."""
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+
+    runs = []
+    for line in lines:
+        try:
+            runs.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return runs[-limit:]
+
+
+def stage_summary(runs):
+    """Summarise stage wall times across runs.
+
+    Returns list of (stage, latest_sec, p50_sec, p95_sec) in the order the
+    stages appear in the latest run, with "total" first. latest_sec is None
+    for stages the latest run did not reach.
+    """
+    if not runs:
+        return []
+
+    by_stage = {"total": [r["wall_sec"] for r in runs]}
+    for r in runs:
+        for s in r.get("spans", []):
+            by_stage.setdefault(s["name"], []).append(s["wall_sec"])
+
+    latest = {"total": runs[-1]["wall_sec"]}
+    latest.update({s["name"]: s["wall_sec"] for s in runs[-1].get("spans", [])})
+
+    # Stages in the latest run first, then any it did not reach
+    order = list(latest) + [name for name in by_stage if name not in latest]
+    return [
+        (name, latest.get(name), percentile(by_stage[name], 50),
+         percentile(by_stage[name], 95))
+        for name in order
+    ]
+
+
+def summary_lines(runs):
+    """Render the latest run and stage_summary as indented text lines."""
+    if not runs:
+        return []
+    latest = runs[-1]
+    lines = [
+        f"  Last run:       {latest['started']} ({latest.get('status', '?')}), "
+        f"peak RSS {latest.get('peak_rss_mb')} MB",
+        f"  Stage timings over last {len(runs)} runs (seconds):",
+        f"  {'Stage':<34} {'Latest':>8} {'p50':>8} {'p95':>8}",
+        f"  {'-'*60}",
+    ]
+    for stage, last, p50, p95 in stage_summary(runs):
+        last = f"{last:>8.2f}" if last is not None else f"{'-':>8}"
+        lines.append(f"  {stage:<34} {last} {p50:>8.2f} {p95:>8.2f}")
+    return lines
+
+
+def percentile(values, pct):
+    """Linearly interpolated percentile of a list of numbers."""
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
@@ -0,0 +1,212 @@
+"""Shadow evaluation — run several strategy profiles or models side by side.
+
+The live run makes one decision with config.json's strategy_profile and
+claude_model. Shadow evaluation sends the same assembled inputs under other
+profiles and/or models concurrently with the async client, under a
+concurrency limit, so comparing conservative / balanced / aggressive costs
+about one call's wall-clock time rather than three.
+
+Each variant's outputs go to output/shadow/<profile>_<model>/ and a
+comparison is written to output/shadow/summary.json and summary.md. Shadow
+results are never applied to the portfolio.
+
+Calls use the per-attempt timeout and attempt count of the live call's
+policy (config "claude_call_policy", see call_policy.py), so a hung or
+overloaded shadow call ends when the live one would. Shadow failures do not
+count towards the live circuit breaker.
+
+Usage:
+    python shadow_eval.py                                # all three profiles
+    python shadow_eval.py --profiles balanced aggressive --models MODEL_A MODEL_B
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import time
+from pathlib import Path
+
+import call_policy
+import decision_engine
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+PROFILES = ["conservative", "balanced", "aggressive"]
+DEFAULT_CONCURRENCY = 3
+
+
+def variant_name(config):
+    """Directory name for a variant: <profile>_<model>."""
+    return f"{config['strategy_profile']}_{config.get('claude_model', 'default')}"
+
+
+def build_variants(config, profiles=None, models=None):
+    """Return one config per (profile, model) combination."""
+    profiles = profiles or [config["strategy_profile"]]
+    models = models or [config.get("claude_model")]
+    return [
+        {**config, "strategy_profile": profile, "claude_model": model}
+        for profile in profiles for model in models
+    ]
+
+
+def run_shadow(config, base_dir=BASE_DIR, profiles=None, models=None,
+               max_concurrency=DEFAULT_CONCURRENCY, encoding="full",
+               output_mode="sections", positions_json=None):
+    """Evaluate every variant concurrently and write outputs plus a summary.
+
+    positions_json overrides positions.json on disk (see
+    decision_engine.read_inputs). Returns the list of per-variant summary rows.
+    """
+    base_dir = Path(base_dir)
+    variants = build_variants(config, profiles or PROFILES, models)
+    system_prompt = decision_engine.load_system_prompt()
+    inputs = decision_engine.read_inputs(base_dir, positions_json)
+
+    log.info("Shadow evaluation: %d variants, concurrency %d",
+             len(variants), max_concurrency)
+    started = time.perf_counter()
+    results = asyncio.run(_evaluate_all(
+        variants, system_prompt, inputs, base_dir, max_concurrency,
+        encoding, output_mode, call_policy.policy_from_config(config),
+    ))
+    wall = time.perf_counter() - started
+
+    shadow_dir = base_dir / "output" / "shadow"
+    write_summary(results, shadow_dir, wall)
+    log.info("Shadow evaluation done in %.1fs (sum of call latencies %.1fs)",
+             wall, sum(r["latency_sec"] or 0 for r in results))
+    return results
+
+
+async def _evaluate_all(variants, system_prompt, inputs, base_dir,
+                        max_concurrency, encoding, output_mode, policy):
+    from anthropic import AsyncAnthropic
+
+    client = AsyncAnthropic(timeout=policy["attempt_timeout_sec"],
+                            max_retries=policy["max_attempts"] - 1)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = [
+        _evaluate(client, semaphore, variant, system_prompt, inputs, base_dir,
+                  encoding, output_mode)
+        for variant in variants
+    ]
+    return await asyncio.gather(*tasks)
+
+
+async def _evaluate(client, semaphore, config, system_prompt, inputs, base_dir,
+                    encoding, output_mode):
+    """Call, parse and write one variant. Errors are recorded, not raised."""
+    name = variant_name(config)
+    row = {"variant": name, "strategy_profile": config["strategy_profile"],
+           "model": config.get("claude_model"), "latency_sec": None}
+
+    user_message = decision_engine.prepare_user_message(
+        config, base_dir, inputs, encoding, output_mode,
+    )
+    request = decision_engine.build_request(system_prompt, user_message, config,
+                                            output_mode)
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            response = await client.messages.create(**request)
+        except Exception as e:
+            log.error("  %s: call failed — %s", name, e)
+            row.update(status="ERROR", reason=str(e))
+            return row
+        row["latency_sec"] = round(time.perf_counter() - started, 2)
+
+    response_text = decision_engine.response_text_of(response, output_mode)
+    outputs = decision_engine.parse_response(response_text, output_mode)
+    decision_engine.write_outputs(outputs, response_text,
+                                  base_dir / "output" / "shadow" / name)
+
+    row.update(_summarise(outputs))
+    row.update(input_tokens=response.usage.input_tokens,
+               output_tokens=response.usage.output_tokens)
+    log.info("  %s: %s in %.1fs (%d orders)", name, row["status"],
+             row["latency_sec"], len(row["orders"]))
+    return row
+
+
+def _summarise(outputs):
+    """Extract the comparable parts of one variant's outputs."""
+    run_status = outputs.get("run_status") or {}
+    decisions = (outputs.get("trade_plan") or {}).get("decisions", [])
+    orders = list(csv.DictReader(io.StringIO(outputs.get("orders_csv") or "")))
+
+    actions = {}
+    for d in decisions:
+        action = d.get("action", "?")
+        actions[action] = actions.get(action, 0) + 1
+
+    return {
+        "status": run_status.get("status", "BLOCKED"),
+        "reason": run_status.get("reason", ""),
+        "actions": actions,
+        "orders": [f"{o.get('side')} {o.get('ticker')} x{o.get('quantity')}" for o in orders],
+        "buy_confidence": {
+            d["ticker"]: d.get("confidence")
+            for d in decisions if d.get("action") == "BUY" and d.get("ticker")
+        },
+        "invalid_files": sorted(outputs.get("validation_errors", {})),
+    }
+
+
+def write_summary(results, shadow_dir, wall_sec):
+    """Write summary.json and a markdown comparison table."""
+    shadow_dir = Path(shadow_dir)
+    shadow_dir.mkdir(parents=True, exist_ok=True)
+    with open(shadow_dir / "summary.json", "w") as f:
+        json.dump({"wall_sec": round(wall_sec, 2), "variants": results}, f, indent=2)
+
+    lines = [
+        "# Shadow evaluation",
+        "",
+        f"{len(results)} variants in {wall_sec:.1f}s wall-clock.",
+        "",
+        "| Variant | Status | Orders | Decisions | Latency (s) | Tokens in/out |",
+        "|---|---|---|---|---|---|",
+    ]
+    for r in results:
+        actions = ", ".join(f"{k} {v}" for k, v in sorted(r.get("actions", {}).items()))
+        tokens = (f"{r['input_tokens']}/{r['output_tokens']}"
+                  if "input_tokens" in r else "-")
+        lines.append(
+            f"| {r['variant']} | {r['status']} | {'; '.join(r.get('orders', [])) or '-'} "
+            f"| {actions or '-'} | {r['latency_sec'] if r['latency_sec'] is not None else '-'} "
+            f"| {tokens} |"
+        )
+    with open(shadow_dir / "summary.md", "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    parser = argparse.ArgumentParser(description="Shadow-evaluate profiles/models")
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=PROFILES)
+    parser.add_argument("--models", nargs="+", default=None,
+                        help="Models to compare (default: config claude_model)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--compact-prompt", action="store_true")
+    parser.add_argument("--output-mode", choices=["sections", "tool"], default="sections")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    with open(BASE_DIR / "config.json") as f:
+        base_config = json.load(f)
+    run_shadow(
+        base_config, BASE_DIR, profiles=args.profiles, models=args.models,
+        max_concurrency=args.concurrency,
+        encoding="compact" if args.compact_prompt else "full",
+        output_mode=args.output_mode,
+    )
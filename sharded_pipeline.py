@@ -0,0 +1,197 @@
+"""Sharded, process-parallel market data build for large universes.
+
+Scaling mode for FTSE 350 / All-Share sized universes:
+
+1. The universe is split into download shards sized for the provider, and
+   each shard is synced into the bar store with one batch request.
+2. The memory-mapped bar history is aligned straight into a single GBP
+   panel in shared memory.
+3. Indicator computation fans out over a process pool; each worker attaches
+   to the shared panel and computes its block of tickers.
+4. Results are merged into the usual market_data.csv + snapshot outputs.
+
+Throughput (tickers/sec) is logged per stage so runners can be sized.
+
+Usage:
+    python sharded_pipeline.py --fixtures DIR --workers 4   # offline sizing run
+"""
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+import bar_store
+import currency_cache
+import data_pipeline
+import indicator_panel
+import providers
+import run_metrics
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SHARD_SIZE = 50
+PANEL_FIELDS = list(indicator_panel.PANEL_FIELDS)
+
+
+def build_market_data_sharded(universe_path, output_path, store_dir,
+                              currency_cache_path=None, provider=None,
+                              shard_size=DEFAULT_SHARD_SIZE, workers=None,
+                              period="1y", as_of=None):
+    """Sharded equivalent of data_pipeline.build_market_data (panel mode).
+
+    as_of (replays) ends the history at that date.
+
+    Returns (market_data, stats). market_data is the same table
+    build_market_data returns with store_dir set; stats holds per-stage
+    seconds and tickers/sec throughput. Prices come from the bar store's
+    float32 columns, so values agree with a build from in-memory (float64)
+    frames only to float32 precision, e.g. in avg_gbp_volume_20d.
+    """
+    workers = workers or os.cpu_count() or 1
+    provider = provider or providers.YahooProvider()
+    universe = data_pipeline.load_universe(universe_path)
+    stats = {"tickers": len(universe), "shards": 0, "workers": workers}
+    started = time.perf_counter()
+
+    # Stage 1: download shards into the bar store
+    t0 = time.perf_counter()
+    available = []
+    limits = data_pipeline.fallback_limits()
+    with run_metrics.span("fetch", tickers=len(universe)) as span:
+        for i in range(0, len(universe), shard_size):
+            shard = universe[i:i + shard_size]
+            log.info("Shard %d: syncing %d tickers", stats["shards"] + 1, len(shard))
+            available += data_pipeline.sync_bar_store(shard, store_dir, period=period,
+                                                      provider=provider, as_of=as_of,
+                                                      limits=limits)
+            stats["shards"] += 1
+        span.update(fetched=len(available), shards=stats["shards"])
+    stats["fetch_sec"] = time.perf_counter() - t0
+
+    bars = {sym: bar_store.load_window(store_dir, sym, period, as_of) for sym in available}
+    bars = {sym: arrays for sym, arrays in bars.items()
+            if arrays is not None and len(arrays["day"])}
+    if not bars:
+        log.error("No data fetched for any ticker")
+        return {}, stats
+
+    with run_metrics.span("currency", tickers=len(bars)):
+        if currency_cache_path:
+            divisors = currency_cache.get_divisors(
+                [t for t in universe if t["ticker"] in bars], currency_cache_path,
+                provider=provider,
+            )
+        else:
+            divisors = {sym: data_pipeline.lookup_divisor(sym, provider) for sym in bars}
+
+    # Stage 2: indicators over a process pool reading a shared panel
+    t0 = time.perf_counter()
+    with run_metrics.span("indicators", tickers=len(bars), mode="sharded",
+                          workers=workers):
+        all_indicators = compute_parallel(bars, divisors, workers)
+    stats["indicator_sec"] = time.perf_counter() - t0
+
+    with run_metrics.span("write") as span:
+        market_data = data_pipeline.write_market_data(universe, all_indicators,
+                                                      output_path)
+        span["tickers"] = len(market_data)
+    stats["total_sec"] = time.perf_counter() - started
+    stats["ok_tickers"] = len(market_data)
+
+    for stage in ("fetch", "indicator", "total"):
+        secs = stats[f"{stage}_sec"]
+        stats[f"{stage}_tickers_per_sec"] = round(len(bars) / secs, 1) if secs else None
+    log.info(
+        "Sharded build: %d tickers, %d shards, %d workers | fetch %.2fs (%s/s), "
+        "indicators %.2fs (%s/s), total %.2fs (%s/s)",
+        len(bars), stats["shards"], workers,
+        stats["fetch_sec"], stats["fetch_tickers_per_sec"],
+        stats["indicator_sec"], stats["indicator_tickers_per_sec"],
+        stats["total_sec"], stats["total_tickers_per_sec"],
+    )
+    return market_data, stats
+
+
+def compute_parallel(bars, divisors, workers):
+    """Align bars and compute panel indicators across worker processes.
+
+    The shared memory block is allocated first and the bars are aligned
+    straight into it, so the parent never holds a second copy of the panel.
+    Every worker maps the block; only ticker names and column ranges are
+    pickled.
+    """
+    if workers <= 1 or len(bars) < 2 * workers:
+        return indicator_panel.compute_panel_indicators(
+            indicator_panel.align_arrays(bars, divisors))
+
+    stacked_shape = (len(PANEL_FIELDS),) + indicator_panel.panel_shape(bars)
+    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(stacked_shape)) * 8, 1))
+    try:
+        shared = np.ndarray(stacked_shape, dtype=np.float64, buffer=shm.buf)
+        panel = indicator_panel.align_arrays(bars, divisors, out=dict(zip(PANEL_FIELDS, shared)))
+        tickers = panel["tickers"]
+
+        bounds = np.linspace(0, len(tickers), workers + 1).astype(int)
+        jobs = [
+            (shm.name, stacked_shape, lo, hi, tickers[lo:hi],
+             panel["dates"][lo:hi], panel["rows"][lo:hi])
+            for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo
+        ]
+
+        results = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for block in pool.map(_compute_block, jobs):
+                results.update(block)
+        del shared, panel
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _compute_block(job):
+    """Worker: compute indicators for one column block of the shared panel."""
+    shm_name, shape, lo, hi, tickers, dates, rows = job
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        shared = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        sub_panel = {name: shared[i][:, lo:hi] for i, name in enumerate(PANEL_FIELDS)}
+        sub_panel.update(tickers=tickers, dates=dates, rows=rows)
+        result = indicator_panel.compute_panel_indicators(sub_panel)
+        del shared, sub_panel
+        return result
+    finally:
+        shm.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    base_dir = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Sharded market data build")
+    parser.add_argument("--universe", default=str(base_dir / "universe.csv"))
+    parser.add_argument("--output", default=str(base_dir / "data" / "market_data.csv"))
+    parser.add_argument("--store", default=str(base_dir / "data" / "bars"))
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--fixtures", help="Use the replay provider with this fixture directory")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        source = providers.get_provider("replay", fixture_dir=args.fixtures)
+    else:
+        source = providers.get_provider("yahoo")
+    _, run_stats = build_market_data_sharded(
+        args.universe, args.output, args.store,
+        currency_cache_path=str(Path(args.store).parent / "currency_cache.json"),
+        provider=source, shard_size=args.shard_size, workers=args.workers,
+    )
+    print(run_stats)
@@ -0,0 +1,115 @@
+"""Deterministic stop-loss enforcement, run before the decision call.
+
+In stop_execution_mode DAILY_CHECK the bot, not the model, enforces stops.
+Every holding's current_stop_gbp is compared with today's low_gbp and
+open_gbp in one vectorized pass:
+
+- low_gbp <= stop: the stop triggered and the position is sold at the stop
+- open_gbp <= stop as well: the price gapped through the stop, so the
+  fill is at the open instead. Gaps deeper than gap_risk_buffer_pct below
+  the stop are flagged in the exit reason and logged.
+
+Exits are rendered as STOP orders, which portfolio.apply_paper_trades
+fills by the same rule. bot.run applies them before the rule engine and
+Claude see the portfolio, so the prompt only carries the positions that
+survived.
+"""
+
+import logging
+
+import numpy as np
+
+import output_schema
+
+log = logging.getLogger(__name__)
+
+STOP_ORDER_TYPE = "STOP"
+
+
+def check_stops(positions, market_data, config):
+    """Holdings whose stop triggered today.
+
+    Returns a list of exit dicts (see triggered_stops). Empty unless
+    stop_execution_mode is DAILY_CHECK.
+    """
+    if config.get("stop_execution_mode", "DAILY_CHECK") != "DAILY_CHECK":
+        return []
+    return triggered_stops(positions, market_data, config)
+
+
+def triggered_stops(positions, market_data, config):
+    """Holdings whose stop today's bar reached, whatever the stop mode.
+
+    Returns a list of exit dicts (ticker, quantity, stop_gbp, low_gbp,
+    open_gbp, fill_ref_gbp, gapped, beyond_buffer, reason) in positions
+    order.
+    """
+    held = positions.get("positions", [])
+    if not held:
+        return []
+
+    def column(values):
+        return np.array([np.nan if v is None else float(v) for v in values])
+
+    rows = [market_data.get(p["ticker"]) or {} for p in held]
+    stop = column(p.get("current_stop_gbp") for p in held)
+    low = column(r.get("low_gbp") for r in rows)
+    open_ = column(r.get("open_gbp") for r in rows)
+
+    # NaN compares False, so missing stops or bars never trigger
+    triggered = low <= stop
+    gapped = triggered & (open_ <= stop)
+    fill_ref = np.where(gapped, open_, stop)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gap_pct = np.where(gapped, (stop - open_) / stop, 0.0)
+    beyond_buffer = gap_pct > config.get("gap_risk_buffer_pct", 0.10)
+
+    exits = []
+    for i in np.flatnonzero(triggered):
+        pos = held[i]
+        if gapped[i]:
+            reason = (f"Gapped through stop {stop[i]:g}: open_gbp {open_[i]:g} "
+                      f"({gap_pct[i]:.1%} below)")
+            if beyond_buffer[i]:
+                reason += ", beyond gap risk buffer"
+                log.warning("%s gapped %.1f%% through its stop, beyond the %.0f%% buffer",
+                            pos["ticker"], 100 * gap_pct[i],
+                            100 * config.get("gap_risk_buffer_pct", 0.10))
+        else:
+            reason = f"low_gbp {low[i]:g} <= stop {stop[i]:g}"
+        exits.append({
+            "ticker": pos["ticker"],
+            "quantity": pos["quantity"],
+            "stop_gbp": float(stop[i]),
+            "low_gbp": float(low[i]),
+            "open_gbp": None if np.isnan(open_[i]) else float(open_[i]),
+            "fill_ref_gbp": float(fill_ref[i]),
+            "gapped": bool(gapped[i]),
+            "beyond_buffer": bool(beyond_buffer[i]),
+            "reason": reason,
+        })
+    return exits
+
+
+def stop_orders_csv(exits, as_of_date):
+    """orders.csv text selling each exit with a STOP order at its stop."""
+    day = as_of_date.isoformat().replace("-", "")
+    return output_schema.render_orders_csv([
+        {"order_id": f"{day}-S{i:02d}", "ticker": e["ticker"], "side": "SELL",
+         "order_type": STOP_ORDER_TYPE, "quantity": e["quantity"], "limit_price_gbp": None,
+         "time_in_force": "DAY", "stop_price_gbp": e["stop_gbp"], "reason": "STOP_EXIT"}
+        for i, e in enumerate(exits, start=1)
+    ])
+
+
+def trade_log_entry(exits, as_of_date):
+    """trade_log.json entry recording the stop exits."""
+    return {
+        "as_of_date": as_of_date.isoformat(),
+        "entries": [
+            {"ticker": e["ticker"], "action": "SELL", "planned_price_gbp": e["fill_ref_gbp"],
+             "planned_quantity": e["quantity"], "stop_price_gbp": e["stop_gbp"],
+             "confidence": 1.0, "entry_type": "STOP_EXIT", "rationale_summary": e["reason"]}
+            for e in exits
+        ],
+    }
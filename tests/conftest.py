@@ -0,0 +1,68 @@
+"""Shared fixtures. The bot's modules are flat files at the repository root."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def make_bars():
+    """Factory for random-walk OHLCV DataFrames, shaped like a provider's."""
+
+    def make(n=260, seed=0, end=None):
+        rng = np.random.default_rng(seed)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, n)))
+        open_ = close * (1 + rng.normal(0, 0.005, n))
+        high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, n))
+        low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, n))
+        volume = rng.integers(10_000, 1_000_000, n).astype(float)
+        index = pd.bdate_range(end=end or pd.Timestamp.today().normalize(),
+                               periods=n, name="Date")
+        return pd.DataFrame({"Open": open_, "High": high, "Low": low,
+                             "Close": close, "Volume": volume}, index=index)
+
+    return make
+
+
+@pytest.fixture
+def config():
+    return {
+        "slippage_bps": 10,
+        "stamp_duty_bps": 50,
+        "fee_model": {"type": "per_trade", "value": 0},
+        "settlement_days": 1,
+        "stop_execution_mode": "DAILY_CHECK",
+        "gap_risk_buffer_pct": 0.10,
+    }
+
+
+@pytest.fixture
+def positions():
+    """positions.json as of Friday 2026-08-21 with two holdings."""
+    return {
+        "as_of_date": "2026-08-21",
+        "cash_balance_gbp": 1000.0,
+        "unsettled_sell_proceeds_gbp": 0.0,
+        "settlement_due_date": None,
+        "equity_value_gbp": 1150.0,
+        "portfolio_peak_equity_gbp": 1200.0,
+        "positions": [
+            {
+                "ticker": "GLEN.L", "quantity": 10.0, "avg_cost_gbp": 5.0,
+                "market_value_gbp": 50.0, "unrealised_pnl_gbp": 0.0,
+                "sector": "Materials", "entry_date": "2026-08-01", "days_held": 20,
+                "current_stop_gbp": 4.5, "status": "ACTIVE",
+            },
+            {
+                "ticker": "RIO.L", "quantity": 2.0, "avg_cost_gbp": 50.0,
+                "market_value_gbp": 100.0, "unrealised_pnl_gbp": 0.0,
+                "sector": "Materials", "entry_date": "2026-08-10", "days_held": 11,
+                "current_stop_gbp": 45.0, "status": "ACTIVE", "note": "kept as is",
+            },
+        ],
+    }
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import bar_store
+import data_pipeline
+
+
+def test_round_trip(tmp_path, make_bars):
+    df = make_bars(30)
+    bar_store.save_bars(tmp_path, "AAA.L", df)
+
+    arrays = bar_store.load_arrays(tmp_path, "AAA.L")
+    assert [int(d) for d in arrays["day"]] == [d.toordinal() for d in df.index.date]
+    np.testing.assert_array_equal(arrays["close"], df["Close"].to_numpy(np.float32))
+    np.testing.assert_array_equal(arrays["volume"], df["Volume"].to_numpy(np.int64))
+
+
+def test_append_bars_new_values_win(tmp_path, make_bars):
+    df = make_bars(30)
+    bar_store.save_bars(tmp_path, "AAA.L", df.iloc[:25])
+    restated = df.iloc[20:].copy()
+    restated["Close"] *= 2
+    bar_store.append_bars(tmp_path, "AAA.L", restated)
+
+    arrays = bar_store.load_arrays(tmp_path, "AAA.L")
+    assert len(arrays["day"]) == 30
+    np.testing.assert_array_equal(arrays["close"][:20], df["Close"].iloc[:20].to_numpy(np.float32))
+    np.testing.assert_array_equal(arrays["close"][20:], restated["Close"].to_numpy(np.float32))
+
+
+def test_load_window_matches_window(tmp_path, make_bars):
+    bar_store.save_bars(tmp_path, "AAA.L", make_bars(400))
+    expected = bar_store.window(bar_store.load_arrays(tmp_path, "AAA.L"), "1y")
+    got = bar_store.load_window(tmp_path, "AAA.L", "1y")
+    assert 240 < len(got["day"]) < 400
+    for name in bar_store.FIELDS:
+        np.testing.assert_array_equal(got[name], expected[name])
+
+
+@pytest.mark.parametrize("damage", ["missing", "mismatched", "unreadable"])
+def test_load_window_none_for_bad_files(tmp_path, make_bars, damage):
+    if damage != "missing":
+        bar_store.save_bars(tmp_path, "AAA.L", make_bars(30))
+        path = bar_store.ticker_dir(tmp_path, "AAA.L")
+        if damage == "mismatched":
+            np.save(path / "close.npy", np.zeros(10, dtype=np.float32))
+        else:
+            (path / "day.npy").write_bytes(b"not a numpy file")
+
+    assert bar_store.load_window(tmp_path, "AAA.L", "1y") is None
+
+
+def test_fetch_ohlcv_skips_unreadable_tickers(tmp_path, make_bars, monkeypatch):
+    bar_store.save_bars(tmp_path, "AAA.L", make_bars(30))
+    bar_store.save_bars(tmp_path, "BBB.L", make_bars(30, seed=1))
+    (bar_store.ticker_dir(tmp_path, "BBB.L") / "day.npy").write_bytes(b"corrupt")
+    monkeypatch.setattr(data_pipeline, "sync_bar_store",
+                        lambda tickers, store_dir, **kw: ["AAA.L", "BBB.L"])
+
+    frames = data_pipeline.fetch_ohlcv([{"ticker": "AAA.L"}, {"ticker": "BBB.L"}],
+                                       store_dir=tmp_path, provider=object())
+    assert list(frames) == ["AAA.L"]
+    assert len(frames["AAA.L"]) == 30
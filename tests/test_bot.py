@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import json
+import shutil
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+import bot
+import call_policy
+import decision_engine
+import portfolio_journal
+import providers
+import shadow_eval
+
+REPO = Path(__file__).resolve().parent.parent
+AS_OF = date(2026, 8, 21)
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch, make_bars):
+    """bot.BASE_DIR in tmp_path, with replay fixtures for two tickers."""
+    shutil.copy(REPO / "config.json", tmp_path)
+    (tmp_path / "universe.csv").write_text(
+        "ticker,name,sector,instrument_type,currency,exchange,uk_equity_flag,status\n"
+        "AAA.L,Aaa,Energy,EQUITY,GBP,LSE,true,ACTIVE\n"
+        "BBB.L,Bbb,Materials,EQUITY,GBP,LSE,true,ACTIVE\n"
+    )
+    (tmp_path / "positions.json").write_text(json.dumps({
+        "as_of_date": "2026-08-20", "cash_balance_gbp": 1000.0,
+        "unsettled_sell_proceeds_gbp": 0.0, "settlement_due_date": None,
+        "equity_value_gbp": 1000.0, "portfolio_peak_equity_gbp": 1000.0, "positions": [],
+    }))
+    providers.write_fixtures({"AAA.L": make_bars(300, seed=1, end=AS_OF),
+                              "BBB.L": make_bars(300, seed=2, end=AS_OF)},
+                             tmp_path / "fixtures", currencies={"AAA.L": "GBp", "BBB.L": "GBp"})
+
+    monkeypatch.setattr(bot, "BASE_DIR", tmp_path)
+    monkeypatch.setattr(portfolio_journal, "Journal", functools.partial(
+        portfolio_journal.Journal, tmp_path / "journal.jsonl", tmp_path / "snapshots.jsonl"))
+    monkeypatch.setattr(decision_engine, "run_decision_engine", lambda *a, **k: {
+        "run_status": {"status": "NO_TRADES", "reason": "nothing to do"}})
+    return tmp_path
+
+
+def run(sandbox, shadow=True):
+    bot._run(dry_run=False, provider=providers.ReplayProvider(sandbox / "fixtures", as_of=AS_OF),
+             workers=None, response_cache_mode="bypass", prompt_encoding="full",
+             stream=False, stop_early=False, output_mode="sections", shadow=shadow,
+             as_of=AS_OF, fast_path=False, cascade=False)
+
+
+def test_slow_shadow_does_not_hold_up_the_run(sandbox, monkeypatch, caplog):
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_shadow(*args, **kwargs):
+        started.set()
+        release.wait(10)
+
+    monkeypatch.setattr(shadow_eval, "run_shadow", slow_shadow)
+    monkeypatch.setattr(bot, "SHADOW_WAIT_SEC", 0.2)
+    try:
+        begun = time.perf_counter()
+        run(sandbox)
+        elapsed = time.perf_counter() - begun
+    finally:
+        release.set()
+
+    assert started.is_set()
+    assert elapsed < 5
+    assert "Shadow evaluation still running" in caplog.text
+    assert json.loads((sandbox / "positions.json").read_text())["as_of_date"] == "2026-08-21"
+    shadow_threads = [t for t in threading.enumerate() if t.name == "shadow-eval"]
+    assert all(t.daemon for t in shadow_threads)
+
+
+def test_shadow_client_follows_the_call_policy(monkeypatch):
+    import anthropic
+
+    seen = {}
+
+    class FakeClient:
+        def __init__(self, **kwargs):
+            seen.update(kwargs)
+
+    monkeypatch.setattr(anthropic, "AsyncAnthropic", FakeClient)
+    policy = {"attempt_timeout_sec": 12.0, "max_attempts": 2}
+    asyncio.run(shadow_eval._evaluate_all([], "", {}, REPO, 1, "full", "sections", policy))
+    assert seen == {"timeout": 12.0, "max_retries": 1}
+
+
+def test_claude_unavailable_falls_back_to_managing_stops(sandbox, monkeypatch):
+    def unavailable(*args, **kwargs):
+        raise call_policy.ClaudeUnavailable("circuit breaker open")
+
+    monkeypatch.setattr(decision_engine, "run_decision_engine", unavailable)
+    run(sandbox, shadow=False)
+
+    run_status = json.loads((sandbox / "output" / "run_status.json").read_text())
+    assert run_status["decided_by"] == "rule_engine_fallback"
+    assert run_status["reason"].startswith("Claude unavailable (circuit breaker open).")
+    assert run_status["risk_checks"]["new_entries_blocked"] == (
+        "Claude unavailable, managing stops only")
@@ -0,0 +1,111 @@
+import threading
+
+import anthropic
+import pytest
+
+import call_policy
+
+
+class StatusError(anthropic.APIStatusError):
+    """An APIStatusError without an HTTP response behind it."""
+
+    def __init__(self, status_code):
+        Exception.__init__(self, f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    """send(timeout) that plays back a script of results and errors."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, timeout):
+        with self.lock:
+            self.calls += 1
+            step = self.script.pop(0)
+        if callable(step):
+            return step()
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+@pytest.fixture
+def policy():
+    return {**call_policy.DEFAULT_POLICY, "attempt_timeout_sec": 5.0, "backoff_base_sec": 0.0,
+            "hedge_percentile": None}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {"history_path": tmp_path / "run_metrics.jsonl",
+            "breaker_path": tmp_path / "circuit_breaker.json"}
+
+
+def test_overloaded_is_retried_then_succeeds(policy, paths):
+    send = FakeClient(StatusError(529), StatusError(529), "answer")
+    span = {}
+    assert call_policy.call(send, policy, span, **paths) == "answer"
+    assert send.calls == 3
+    assert span["attempts"] == 3
+
+
+def test_bad_request_is_reraised_without_retrying(policy, paths):
+    send = FakeClient(StatusError(400), "never reached")
+    with pytest.raises(StatusError) as raised:
+        call_policy.call(send, policy, **paths)
+    assert raised.value.status_code == 400
+    assert send.calls == 1
+    assert not paths["breaker_path"].exists()
+
+
+def test_exhausted_retries_raise_claude_unavailable(policy, paths):
+    send = FakeClient(*(StatusError(503) for _ in range(policy["max_attempts"])))
+    with pytest.raises(call_policy.ClaudeUnavailable, match="3 attempt"):
+        call_policy.call(send, policy, **paths)
+
+
+def test_hedge_returns_the_faster_attempt(policy, paths):
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return "slow"
+
+    policy.update(hedge_percentile=90, hedge_min_sec=0.05, hedge_default_sec=0.05)
+    send = FakeClient(slow, "fast")
+    span = {}
+    try:
+        assert call_policy.call(send, policy, span, **paths) == "fast"
+    finally:
+        release.set()
+    assert span["hedged"] == 1
+    assert span["winner"] == "hedge"
+
+
+def test_breaker_opens_after_threshold_failing_days(policy, paths, monkeypatch):
+    policy.update(max_attempts=1, breaker_threshold=2, breaker_cooldown_days=1)
+
+    def fail_on(day):
+        monkeypatch.setattr(call_policy, "_today", lambda: day)
+        with pytest.raises(call_policy.ClaudeUnavailable):
+            call_policy.call(FakeClient(StatusError(529)), policy, **paths)
+
+    fail_on("2026-08-20")
+    fail_on("2026-08-20")  # same day: counted once
+    assert call_policy.CircuitBreaker(paths["breaker_path"], 2, 1).state["failures"] == 1
+    fail_on("2026-08-21")
+
+    send = FakeClient("answer")
+    monkeypatch.setattr(call_policy, "_today", lambda: "2026-08-24")
+    with pytest.raises(call_policy.ClaudeUnavailable, match="circuit breaker open"):
+        call_policy.call(send, policy, **paths)
+    assert send.calls == 0
+
+    # Cooldown over: half-open, and a success closes it
+    monkeypatch.setattr(call_policy, "_today", lambda: "2026-08-25")
+    assert call_policy.call(send, policy, **paths) == "answer"
+    assert call_policy.CircuitBreaker(paths["breaker_path"], 2, 1).state["failures"] == 0
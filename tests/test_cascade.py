@@ -0,0 +1,108 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import data_pipeline
+import decision_engine
+import output_schema
+
+REPO = Path(__file__).resolve().parent.parent
+UNIVERSE = [{"ticker": "AAA.L", "sector": "Energy", "instrument_type": "EQUITY",
+             "status": "ACTIVE"}]
+MARKET_DATA = {"AAA.L": {"close_gbp": 20.0, "sma50_gbp": 19.0, "sma200_gbp": 18.0,
+                         "avg_gbp_volume_20d": 1e6, "uk_equity_flag": "true"}}
+
+
+@pytest.fixture
+def strategy():
+    with open(REPO / "config.json") as f:
+        return json.load(f)
+
+
+def outputs(confidence=0.8, quantity=5, stop=18.5):
+    """A parsed sections-mode answer buying AAA.L."""
+    return {
+        "run_status": {"status": "OK", "as_of_date": "2026-08-21", "reason": "pullback"},
+        "trade_plan": {"as_of_date": "2026-08-21", "decisions": [
+            {"ticker": "AAA.L", "action": "BUY", "confidence": confidence,
+             "stop": {"price_gbp": stop}}]},
+        "orders_csv": output_schema.render_orders_csv([
+            {"order_id": "20260821-01", "ticker": "AAA.L", "side": "BUY", "order_type": "MKT",
+             "quantity": quantity, "stop_price_gbp": stop}]),
+        "daily_report": "# Daily Report\n",
+        "trade_log_update": {"as_of_date": "2026-08-21", "entries": []},
+    }
+
+
+def reasons(answer, strategy, positions):
+    return decision_engine.escalation_reasons(answer, strategy, MARKET_DATA, positions,
+                                              UNIVERSE, 0.7)
+
+
+def test_clean_answer_is_not_escalated(strategy, positions):
+    assert reasons(outputs(), strategy, positions) == []
+
+
+def test_schema_failure_escalates(strategy, positions):
+    answer = outputs()
+    del answer["trade_plan"]["decisions"][0]["confidence"]
+    assert reasons(answer, strategy, positions)[0] == (
+        "schema trade_plan.json: trade_plan.decisions[0].confidence: required field missing")
+
+    tool_answer = {**outputs(), "validation_errors": {"orders.csv": ["missing"]}}
+    assert reasons(tool_answer, strategy, positions) == ["schema orders.csv: missing"]
+
+
+def test_constraint_violation_escalates(strategy, positions):
+    got = reasons(outputs(quantity=100), strategy, positions)
+    assert any(r.startswith("constraint: BUY cost") for r in got), got
+    assert reasons(outputs(stop=21.0), strategy, positions) == [
+        "constraint: AAA.L: BUY without a stop below the price"]
+
+
+def test_low_confidence_escalates(strategy, positions):
+    assert reasons(outputs(confidence=0.55), strategy, positions) == [
+        "low_confidence: BUY AAA.L at 0.55 < 0.7"]
+
+
+def test_no_trades_answer_only_needs_a_valid_run_status(strategy, positions):
+    answer = {"run_status": {"status": "NO_TRADES", "as_of_date": "2026-08-21",
+                             "reason": "nothing"}, "orders_csv": ""}
+    assert reasons(answer, strategy, positions) == []
+
+
+def test_tiers_come_from_config(strategy):
+    models, min_confidence = decision_engine.cascade_settings(strategy)
+    assert models == strategy["claude_cascade"]["models"]
+    assert min_confidence == strategy["claude_cascade"]["min_buy_confidence"]
+
+    del strategy["claude_cascade"]
+    assert decision_engine.cascade_settings(strategy) == (
+        [strategy["claude_model"]], decision_engine.DEFAULT_MIN_BUY_CONFIDENCE)
+
+
+def test_cascade_escalates_on_the_given_market_data(strategy, positions, tmp_path,
+                                                    monkeypatch):
+    (tmp_path / "universe.csv").write_text(
+        "ticker,sector,instrument_type,status\nAAA.L,Energy,EQUITY,ACTIVE\n")
+    answers = {"small": outputs(confidence=0.5), "large": outputs(confidence=0.9)}
+    calls = []
+
+    def decide(config, base_dir, cache_mode, encoding, *args):
+        calls.append((config["claude_model"], encoding))
+        return "text", answers[config["claude_model"]]
+
+    def no_disk_reads(path):
+        raise AssertionError("market data re-read from disk")
+
+    monkeypatch.setattr(decision_engine, "_decide", decide)
+    monkeypatch.setattr(data_pipeline, "load_market_data", no_disk_reads)
+    strategy["claude_cascade"]["models"] = ["small", "large"]
+
+    _, final = decision_engine.run_cascade(
+        strategy, tmp_path, encoding="full", positions_json=json.dumps(positions),
+        market_data=MARKET_DATA,
+    )
+    assert calls == [("small", "compact"), ("large", "full")]
+    assert final is answers["large"]
@@ -0,0 +1,87 @@
+import json
+import threading
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+import currency_cache
+import data_pipeline
+
+REPO = Path(__file__).resolve().parent.parent
+TODAY = date(2026, 8, 21)
+
+
+class CountingProvider:
+    """Answers currency() from a dict and records which symbols were asked."""
+
+    name = "fake"
+
+    def __init__(self, currencies):
+        self.currencies = currencies
+        self.asked = []
+        self.lock = threading.Lock()
+
+    def currency(self, symbol):
+        with self.lock:
+            self.asked.append(symbol)
+        if symbol not in self.currencies:
+            raise ConnectionError("no quote")
+        return self.currencies[symbol]
+
+
+def universe(*rows):
+    return [{"ticker": sym, "currency": currency, "exchange": "LSE",
+             "instrument_type": instrument} for sym, currency, instrument in rows]
+
+
+@pytest.mark.parametrize("currency, divisor", [
+    ("GBp", 100.0), ("GBX", 100.0), ("GBx", 100.0), ("GBP", 1.0), ("USD", 1.0), (None, 1.0),
+])
+def test_pence_codes_divide_by_100(currency, divisor):
+    assert currency_cache.divisor_for(currency) == divisor
+
+
+@pytest.mark.parametrize("checked, stale", [
+    ("2026-07-22", False),  # exactly CACHE_TTL_DAYS old
+    ("2026-07-21", True),
+    ("static", False),
+    (None, True),
+])
+def test_entries_go_stale_after_the_ttl(checked, stale):
+    assert currency_cache.is_stale({"currency": "GBp", "checked": checked}, TODAY) is stale
+
+
+def test_first_run_looks_up_only_ambiguous_lines():
+    tickers = data_pipeline.load_universe(REPO / "universe.csv")
+    cache = currency_cache.seed_from_universe({"tickers": {}}, tickers, TODAY)
+    ambiguous = [sym for sym, entry in cache["tickers"].items()
+                 if currency_cache.is_stale(entry, TODAY)]
+    assert ambiguous == [t["ticker"] for t in tickers if t["instrument_type"] != "EQUITY"]
+    assert cache["tickers"]["SHEL.L"] == {"currency": "GBp", "source": "lse_equity",
+                                          "checked": TODAY.isoformat()}
+
+
+def test_refresh_looks_up_stale_and_missing_entries_only(tmp_path):
+    path = tmp_path / "currency_cache.json"
+    currency_cache.save_cache({"tickers": {
+        "FRESH.L": {"currency": "GBp", "source": "fake", "checked": "2026-08-01"},
+        "STALE.L": {"currency": "GBp", "source": "fake", "checked": "2026-01-02"},
+    }}, path)
+    tickers = universe(("FRESH.L", "", "EQUITY"), ("STALE.L", "", "EQUITY"),
+                       ("NEW.L", "", "EQUITY"), ("ETF.L", "GBP", "ETF"),
+                       ("DOWN.L", "GBP", "ETF"))
+    provider = CountingProvider({"STALE.L": "GBP", "NEW.L": "GBp", "ETF.L": "GBP"})
+
+    divisors = currency_cache.get_divisors(tickers, path, today=TODAY, provider=provider)
+
+    assert sorted(provider.asked) == ["DOWN.L", "ETF.L", "NEW.L", "STALE.L"]
+    assert divisors == {"FRESH.L": 100.0, "STALE.L": 1.0, "NEW.L": 100.0, "ETF.L": 1.0,
+                        "DOWN.L": 1.0}
+    entries = json.loads(path.read_text())["tickers"]
+    assert entries["STALE.L"]["checked"] == TODAY.isoformat()
+    assert entries["DOWN.L"]["checked"] is None  # failed lookup: kept, retried next run
+
+    provider.asked.clear()
+    currency_cache.get_divisors(tickers, path, today=TODAY, provider=provider)
+    assert provider.asked == ["DOWN.L"]
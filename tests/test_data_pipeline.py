@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+import data_pipeline
+
+UNIVERSE = [{"ticker": "AAA.L", "sector": "Energy", "instrument_type": "EQUITY",
+             "uk_equity_flag": "true"}]
+
+
+def write(tmp_path, close):
+    row = {"date": "2026-08-21", "ticker": "AAA.L", "close_gbp": close, "sma200_gbp": None,
+           "consecutive_days_below_sma50": 0}
+    return data_pipeline.write_market_data(UNIVERSE, {"AAA.L": row},
+                                           tmp_path / "market_data.csv")
+
+
+def test_snapshot_round_trips_the_in_memory_table(tmp_path):
+    market_data = write(tmp_path, 12.5)
+    loaded = data_pipeline.load_market_data(tmp_path / "market_data.csv")
+    assert loaded["AAA.L"]["close_gbp"] == 12.5
+    assert loaded["AAA.L"]["sma200_gbp"] is None
+    assert loaded["AAA.L"]["sector"] == market_data["AAA.L"]["sector"] == "Energy"
+
+
+def test_snapshot_alone_is_enough(tmp_path):
+    write(tmp_path, 12.5)
+    (tmp_path / "market_data.csv").unlink()
+    loaded = data_pipeline.load_market_data(tmp_path / "market_data.csv")
+    assert loaded["AAA.L"]["close_gbp"] == 12.5
+
+
+def test_newer_csv_wins_over_a_stale_snapshot(tmp_path):
+    write(tmp_path, 12.5)
+    csv_path = tmp_path / "market_data.csv"
+    csv_path.write_text(csv_path.read_text().replace("12.5", "13.0"))
+    snapshot = data_pipeline.snapshot_path(csv_path)
+    stat = snapshot.stat()
+    os.utime(snapshot, (stat.st_atime, stat.st_mtime - 60))
+    assert data_pipeline.load_market_data(csv_path)["AAA.L"]["close_gbp"] == 13.0
+
+
+class FlakyProvider:
+    """Batch downloads return nothing; history() fails `failures` times per symbol."""
+
+    def __init__(self, make_bars, failures=0):
+        self.make_bars = make_bars
+        self.failures = failures
+        self.calls = {}
+
+    def download(self, symbols, **window):
+        return {}
+
+    def history(self, symbol, **window):
+        self.calls[symbol] = self.calls.get(symbol, 0) + 1
+        if self.calls[symbol] <= self.failures:
+            raise ConnectionError("reset by peer")
+        return self.make_bars(30)
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(data_pipeline, "FALLBACK_BACKOFF_SEC", 0.0)
+
+
+def fetch(provider, symbols, limits=None):
+    return data_pipeline.fetch_ohlcv([{"ticker": s} for s in symbols], provider=provider,
+                                     limits=limits)
+
+
+def test_failed_fetches_are_retried_with_backoff(make_bars, fast_retries):
+    provider = FlakyProvider(make_bars, failures=data_pipeline.FALLBACK_RETRIES)
+    assert list(fetch(provider, ["AAA.L"])) == ["AAA.L"]
+    assert provider.calls["AAA.L"] == data_pipeline.FALLBACK_RETRIES + 1
+
+
+def test_retries_are_bounded(make_bars, fast_retries):
+    provider = FlakyProvider(make_bars, failures=data_pipeline.FALLBACK_RETRIES + 1)
+    assert fetch(provider, ["AAA.L"]) == {}
+    assert provider.calls["AAA.L"] == data_pipeline.FALLBACK_RETRIES + 1
+
+
+def test_time_budget_is_shared_across_a_run(make_bars, monkeypatch):
+    monkeypatch.setattr(data_pipeline, "FALLBACK_RATE_PER_SEC", 1.0)
+    monkeypatch.setattr(data_pipeline, "FALLBACK_BURST", 1)
+    monkeypatch.setattr(data_pipeline, "FALLBACK_BUDGET_SEC", 0.5)
+    provider = FlakyProvider(make_bars)
+    limits = data_pipeline.fallback_limits()
+
+    assert list(fetch(provider, ["AAA.L"], limits)) == ["AAA.L"]
+    # A later fetch in the same run gets no token before the budget runs out
+    assert fetch(provider, ["BBB.L"], limits) == {}
+    assert "BBB.L" not in provider.calls
+    # A new run starts with a fresh bucket and budget
+    assert list(fetch(provider, ["BBB.L"])) == ["BBB.L"]
@@ -0,0 +1,170 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import call_policy
+import decision_engine
+import response_cache
+
+RUN_STATUS = {"status": "NO_TRADES", "as_of_date": "2026-08-21",
+              "reason": "No triggered setups"}
+TRADE_PLAN = {"as_of_date": "2026-08-21",
+              "decisions": [{"ticker": "AAA.L", "action": "HOLD", "confidence": 0.9}]}
+
+
+def response(status="NO_TRADES"):
+    return (f"=== run_status.json ===\n{json.dumps({**RUN_STATUS, 'status': status})}\n\n"
+            f"=== trade_plan.json ===\n{json.dumps(TRADE_PLAN, indent=2)}\n\n"
+            "=== orders.csv ===\nticker,side,quantity\n\n"
+            "=== daily_report.md ===\n# Daily Report\n\n"
+            '=== trade_log_update.json ===\n{"as_of_date": "2026-08-21", "entries": []}\n')
+
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeStream:
+    def __init__(self, parts):
+        self.parts = parts
+        self.sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        for part in self.parts:
+            self.sent += 1
+            yield part
+
+    @property
+    def current_message_snapshot(self):
+        return message(self.sent, "max_tokens")
+
+    def get_final_message(self):
+        return message(self.sent, "end_turn")
+
+
+def message(output_tokens, stop_reason):
+    return SimpleNamespace(usage=SimpleNamespace(input_tokens=100, output_tokens=output_tokens),
+                           stop_reason=stop_reason)
+
+
+class FakeClient:
+    """Stands in for anthropic.Anthropic; streams a scripted response."""
+
+    streams = []
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __call__(self, **options):
+        return self
+
+    @property
+    def messages(self):
+        return self
+
+    def stream(self, **request):
+        stream = FakeStream(self.parts)
+        FakeClient.streams.append(stream)
+        return stream
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 16, 50])
+def test_section_parser_waits_for_a_complete_run_status(size):
+    text = response()
+    parser = decision_engine.SectionParser()
+    seen = []
+    for part in chunks(text, size):
+        parser.feed(part)
+        seen.append(parser.run_status())
+
+    first = next(i for i, s in enumerate(seen) if s is not None)
+    assert seen[first] == RUN_STATUS
+    # Complete at the closing brace, before the trade_plan header has arrived
+    assert "=== trade_plan.json ===" not in "".join(chunks(text, size)[:first])
+    assert parser.section("trade_plan.json") == json.dumps(TRADE_PLAN, indent=2)
+
+
+def test_status_split_across_chunks_is_not_read_early():
+    parser = decision_engine.SectionParser()
+    parser.feed('=== run_status.json ===\n{"status": "NO_')
+    assert parser.run_status() is None
+    parser.feed('TRADES", "as_of_date": "2026-08-21", "reason": "x"')
+    assert parser.run_status() is None
+    parser.feed("}")
+    assert parser.run_status()["status"] == "NO_TRADES"
+
+
+def stream(parts, stop_early=True):
+    span = {}
+    client = FakeClient(parts)
+    text, msg = decision_engine._stream_response(client, {}, stop_early, span)
+    return text, msg, span, FakeClient.streams[-1]
+
+
+@pytest.mark.parametrize("status", ["NO_TRADES", "BLOCKED"])
+def test_stream_stops_once_run_status_is_final(status):
+    parts = chunks(response(status), 9)
+    text, msg, span, fake = stream(parts)
+
+    assert span["stop_reason"] == "early_stop"
+    assert fake.sent < len(parts) // 3
+    assert msg.usage.output_tokens == fake.sent  # the snapshot at the stop
+    assert decision_engine.parse_outputs(text)["run_status"]["status"] == status
+
+
+def test_ok_status_streams_to_the_end():
+    parts = chunks(response("OK"), 9)
+    text, _, span, fake = stream(parts)
+    assert "stop_reason" not in span
+    assert fake.sent == len(parts)
+    assert text == response("OK")
+
+
+def test_early_stop_mid_trade_plan_is_not_a_partial_plan():
+    text = response()
+    cut = text.index('"decisions"') + 40  # inside the first decision
+    end = text.index("}") + 1
+    # run_status completes in the chunk that also opens trade_plan
+    parts = [text[:20], text[20:cut], text[cut:]]
+    assert 20 < end < cut
+
+    got, _, span, fake = stream(parts)
+    assert span["stop_reason"] == "early_stop"
+    assert fake.sent == 2
+    outputs = decision_engine.parse_outputs(got)
+    assert outputs["run_status"] == RUN_STATUS
+    assert outputs["trade_plan"] == {}
+    assert outputs["orders_csv"] == ""
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(call_policy, "BREAKER_PATH", tmp_path / "circuit_breaker.json")
+    monkeypatch.setattr(call_policy, "HISTORY_PATH", tmp_path / "run_metrics.jsonl")
+    return tmp_path / "response_cache"
+
+
+@pytest.mark.parametrize("status, cached", [("NO_TRADES", False), ("OK", True)])
+def test_early_stopped_responses_are_not_cached(cache_dir, monkeypatch, status, cached):
+    monkeypatch.setattr(decision_engine, "Anthropic", FakeClient(chunks(response(status), 9)))
+    config = {"claude_model": "m", "claude_max_tokens": 100}
+
+    def get():
+        return decision_engine.get_response("system", "user", config, cache_dir,
+                                            cache_mode="replay", stream=True, stop_early=True)
+
+    calls = len(FakeClient.streams)
+    get()
+    key = response_cache.cache_key("system", "user", "m", 100)
+    assert (response_cache.load(cache_dir, key) is not None) is cached
+
+    get()
+    assert len(FakeClient.streams) - calls == (1 if cached else 2)
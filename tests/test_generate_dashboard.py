@@ -0,0 +1,20 @@
+import json
+
+import data_pipeline
+import generate_dashboard
+
+
+def test_positions_table_shows_closes_from_the_snapshot(tmp_path, monkeypatch, positions):
+    (tmp_path / "positions.json").write_text(json.dumps(positions))
+    universe = [{"ticker": "GLEN.L", "sector": "Materials"}]
+    data_pipeline.write_market_data(
+        universe, {"GLEN.L": {"date": "2026-08-21", "ticker": "GLEN.L", "close_gbp": 5.0}},
+        tmp_path / "data" / "market_data.csv")
+    monkeypatch.setattr(generate_dashboard, "BASE_DIR", tmp_path)
+
+    generate_dashboard.generate()
+
+    page = (tmp_path / "docs" / "index.html").read_text()
+    assert "<td>£5.00</td>" in page
+    assert "£4.50 (-10.0%)" in page  # GLEN.L stop vs its close
+    assert "£45.00</td>" in page  # RIO.L: no close, stop alone
@@ -0,0 +1,48 @@
+import pytest
+
+import data_pipeline
+import indicator_panel
+
+LENGTHS = [15, 25, 60, 210, 260, 300]
+DIVISORS = {"T3": 100.0}
+
+
+@pytest.fixture
+def frames(make_bars):
+    return {f"T{i}": make_bars(n, seed=i, end="2026-08-21") for i, n in enumerate(LENGTHS)}
+
+
+def reference(frames):
+    return {
+        sym: data_pipeline.compute_indicators(
+            data_pipeline.normalize_to_gbp(df, {"ticker": sym}, divisor=DIVISORS.get(sym, 1.0)),
+            sym,
+        )
+        for sym, df in frames.items()
+    }
+
+
+def test_panel_matches_compute_indicators(frames):
+    panel = indicator_panel.compute_panel_indicators(
+        indicator_panel.align_panel(frames, DIVISORS)
+    )
+    expected = reference(frames)
+    assert panel["T0"] is None and expected["T0"] is None
+    for sym in frames:
+        assert panel[sym] == expected[sym], sym
+
+
+def test_panel_from_store_arrays_matches(frames, tmp_path):
+    import bar_store
+
+    for sym, df in frames.items():
+        bar_store.save_bars(tmp_path, sym, df)
+    bars = {sym: bar_store.load_arrays(tmp_path, sym) for sym in frames}
+    from_store = indicator_panel.compute_panel_indicators(
+        indicator_panel.align_arrays(bars, DIVISORS)
+    )
+    from_frames = indicator_panel.compute_panel_indicators(
+        indicator_panel.align_panel({sym: bar_store.load_bars(tmp_path, sym) for sym in frames},
+                                    DIVISORS)
+    )
+    assert from_store == from_frames
@@ -0,0 +1,48 @@
+import pytest
+
+import data_pipeline
+import indicator_state
+
+
+@pytest.fixture
+def bars(make_bars):
+    return make_bars(260, seed=7, end="2026-08-21")
+
+
+def reference(df, divisor=1.0):
+    return data_pipeline.compute_indicators(
+        data_pipeline.normalize_to_gbp(df, {"ticker": "AAA.L"}, divisor=divisor), "AAA.L"
+    )
+
+
+@pytest.mark.parametrize("divisor", [1.0, 100.0])
+def test_daily_updates_match_compute_indicators(bars, divisor):
+    states = {}
+    for end in range(200, len(bars) + 1):
+        got = indicator_state.update(states, "AAA.L", bars.iloc[:end], divisor)
+        assert got == reference(bars.iloc[:end], divisor), bars.index[end - 1]
+
+
+def test_state_survives_save_and_load(bars, tmp_path):
+    path = tmp_path / "indicator_state.json"
+    states = {}
+    indicator_state.update(states, "AAA.L", bars.iloc[:-3])
+    indicator_state.save_state(states, path)
+
+    states = indicator_state.load_state(path)
+    assert indicator_state.update(states, "AAA.L", bars) == reference(bars)
+
+
+def test_restated_history_rebuilds(bars):
+    states = {}
+    indicator_state.update(states, "AAA.L", bars.iloc[:-1])
+    restated = bars.copy()
+    restated[["Open", "High", "Low", "Close"]] *= 0.98  # e.g. a dividend adjustment
+    assert indicator_state.update(states, "AAA.L", restated) == reference(restated)
+
+
+def test_gap_and_divisor_change_rebuild(bars):
+    states = {}
+    indicator_state.update(states, "AAA.L", bars.iloc[:100])
+    assert indicator_state.update(states, "AAA.L", bars) == reference(bars)
+    assert indicator_state.update(states, "AAA.L", bars, 100.0) == reference(bars, 100.0)
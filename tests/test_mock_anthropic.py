@@ -0,0 +1,64 @@
+import json
+import urllib.request
+
+import pytest
+
+import decision_engine
+import mock_anthropic
+import output_schema
+
+
+@pytest.fixture
+def text_only(tmp_path, monkeypatch):
+    """A fixture dir with only a text response, and a run's output/ to fall back on."""
+    fixtures = mock_anthropic.load_fixtures()
+    (tmp_path / "fixtures").mkdir()
+    (tmp_path / "fixtures" / "run.txt").write_text(fixtures["text"][0])
+
+    outputs = decision_engine.parse_outputs(fixtures["text"][0])
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    for key in ("run_status", "trade_plan", "trade_log_update"):
+        (output_dir / f"{key}.json").write_text(json.dumps(outputs[key], indent=2))
+    (output_dir / "orders.csv").write_text(outputs["orders_csv"])
+    (output_dir / "daily_report.md").write_text(outputs["daily_report"])
+    monkeypatch.setattr(mock_anthropic, "BASE_DIR", tmp_path)
+    return tmp_path / "fixtures"
+
+
+def post(url, request):
+    body = json.dumps(request).encode("utf-8")
+    req = urllib.request.Request(f"{url}/v1/messages", data=body,
+                                 headers={"content-type": "application/json"})
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return json.load(resp)
+
+
+def test_bundled_fixtures_are_a_valid_ok_run():
+    fixtures = mock_anthropic.load_fixtures()
+    assert fixtures["text"] and fixtures["tool"]
+    for tool_input in fixtures["tool"]:
+        assert output_schema.validate(tool_input) == {}
+    text_outputs = decision_engine.parse_outputs(fixtures["text"][0])
+    assert text_outputs["run_status"]["status"] == "OK"
+    assert output_schema.from_outputs(text_outputs) == fixtures["tool"][0]
+
+
+def test_tool_fixture_is_rebuilt_from_outputs(text_only):
+    fixtures = mock_anthropic.load_fixtures(text_only)
+    assert len(fixtures["tool"]) == 1
+    assert output_schema.validate(fixtures["tool"][0]) == {}
+    assert fixtures["tool"][0]["orders"][0]["ticker"] == "BARC.L"
+
+
+def test_tool_mode_is_served_without_tool_fixtures(text_only):
+    server, url = mock_anthropic.start_in_thread(mock_anthropic.load_fixtures(text_only))
+    try:
+        message = post(url, {"model": "m", "max_tokens": 100, "tools": [output_schema.TOOL],
+                             "messages": [{"role": "user", "content": "go"}]})
+    finally:
+        server.shutdown()
+    block = message["content"][0]
+    assert message["stop_reason"] == "tool_use"
+    assert block["name"] == output_schema.TOOL_NAME
+    assert block["input"]["run_status"]["status"] == "OK"
@@ -0,0 +1,123 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import decision_engine
+import output_schema
+
+
+def payload():
+    """A valid submit_daily_outputs input with one BUY."""
+    return {
+        "run_status": {"status": "OK", "as_of_date": "2026-08-21", "reason": "One pullback",
+                       "currency": "GBP", "execution_sequence": "SELL_THEN_BUY"},
+        "trade_plan": {
+            "as_of_date": "2026-08-21", "currency": "GBP", "strategy_profile": "balanced",
+            "decisions": [{"ticker": "AAA.L", "action": "BUY", "confidence": 0.72,
+                           "stop": {"price_gbp": 18.5}, "rationale": ["pullback to sma50"]}],
+        },
+        "orders": [{"order_id": "20260821-01", "ticker": "AAA.L", "side": "BUY",
+                    "order_type": "MKT", "quantity": 5, "limit_price_gbp": None,
+                    "time_in_force": "DAY", "stop_price_gbp": 18.5, "reason": "PULLBACK"}],
+        "daily_report": "# Daily Report — 2026-08-21\n",
+        "trade_log_update": {"as_of_date": "2026-08-21", "entries": [
+            {"ticker": "AAA.L", "action": "BUY", "planned_price_gbp": 20.0,
+             "planned_quantity": 5, "confidence": 0.72}]},
+    }
+
+
+def test_valid_payload_has_no_errors():
+    assert output_schema.validate(payload()) == {}
+
+
+def test_missing_key_is_reported_per_file():
+    tool_input = payload()
+    del tool_input["orders"]
+    del tool_input["run_status"]["reason"]
+
+    assert output_schema.validate(tool_input) == {
+        "run_status.json": ["run_status.reason: required field missing"],
+        "orders.csv": ["missing"],
+    }
+
+
+@pytest.mark.parametrize("edit, filename, error", [
+    (lambda p: p["orders"][0].update(quantity="5"), "orders.csv",
+     "orders[0].quantity: expected number, got str"),
+    (lambda p: p["trade_plan"]["decisions"][0].update(confidence=1.5), "trade_plan.json",
+     "trade_plan.decisions[0].confidence: 1.5 above maximum 1"),
+    (lambda p: p["run_status"].update(status="MAYBE"), "run_status.json",
+     "run_status.status: 'MAYBE' not one of ['OK', 'NO_TRADES', 'BLOCKED']"),
+    (lambda p: p["trade_log_update"].update(as_of_date="21/08/2026"), "trade_log_update.json",
+     "trade_log_update.as_of_date: '21/08/2026' does not match ^\\d{4}-\\d{2}-\\d{2}$"),
+    (lambda p: p.update(daily_report=None), "daily_report.md",
+     "daily_report: expected string, got NoneType"),
+])
+def test_wrong_type_or_value_is_reported(edit, filename, error):
+    tool_input = payload()
+    edit(tool_input)
+    assert output_schema.validate(tool_input) == {filename: [error]}
+
+
+def test_not_an_object_fails_every_file():
+    errors = output_schema.validate(["not", "a", "dict"])
+    assert set(errors) == {filename for filename, _ in output_schema.FILES.values()}
+
+
+def tool_message(tool_input):
+    return SimpleNamespace(content=[
+        SimpleNamespace(type="text", text="Submitting."),
+        SimpleNamespace(type="tool_use", name=output_schema.TOOL_NAME, input=tool_input),
+    ])
+
+
+def test_tool_use_block_is_parsed_into_outputs():
+    text = decision_engine.response_text_of(tool_message(payload()), "tool")
+    outputs = decision_engine.parse_response(text, "tool")
+
+    assert outputs["validation_errors"] == {}
+    assert outputs["run_status"]["status"] == "OK"
+    assert outputs["orders_csv"] == (
+        "order_id,ticker,side,order_type,quantity,limit_price_gbp,time_in_force,"
+        "stop_price_gbp,reason\n20260821-01,AAA.L,BUY,MKT,5,,DAY,18.5,PULLBACK\n"
+    )
+    assert outputs["trade_plan"]["decisions"][0]["ticker"] == "AAA.L"
+
+
+def test_invalid_tool_orders_block_the_run():
+    tool_input = payload()
+    tool_input["orders"][0]["side"] = "SHORT"
+    text = decision_engine.response_text_of(tool_message(tool_input), "tool")
+    outputs = decision_engine.parse_response(text, "tool")
+
+    assert outputs["run_status"]["status"] == "BLOCKED"
+    assert outputs["run_status"]["reason"] == "Invalid structured output: orders.csv"
+    assert outputs["orders_csv"] == ""
+
+
+def test_message_without_the_tool_call_is_blocked():
+    message = SimpleNamespace(content=[SimpleNamespace(type="text", text="{}")])
+    outputs = decision_engine.parse_response(decision_engine.response_text_of(message, "tool"),
+                                             "tool")
+    assert outputs["run_status"]["status"] == "BLOCKED"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"status": "OK"}\n```', {"status": "OK"}),
+    ('Here it is: {"status": "OK"} and {"ignored": true}.', {"status": "OK"}),
+    ('{"status": "OK", "reason": "a } in prose"} trailing }', {"status": "OK",
+                                                              "reason": "a } in prose"}),
+    ("no json here", {}),
+    ('{"status": ', {}),
+])
+def test_json_section_recovery_takes_the_first_object(text, expected):
+    assert decision_engine._parse_json_section(text, "run_status.json") == expected
+
+
+def test_sections_round_trip_through_the_schema():
+    tool_input = payload()
+    outputs = output_schema.to_outputs(tool_input)
+    back = output_schema.from_outputs(outputs)
+    assert output_schema.validate(back) == {}
+    assert json.loads(json.dumps(back["orders"]))[0]["quantity"] == 5.0
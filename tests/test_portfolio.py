@@ -0,0 +1,114 @@
+import json
+import logging
+
+import pytest
+
+import portfolio
+
+HEADER = "ticker,side,order_type,quantity,limit_price_gbp,stop_price_gbp"
+
+
+def orders(*rows):
+    return "\n".join([HEADER, *rows]) + "\n"
+
+
+@pytest.fixture
+def market_data():
+    return {
+        "GLEN.L": {"close_gbp": 6.0, "low_gbp": 5.8, "open_gbp": 5.9,
+                   "uk_equity_flag": "true", "sector": "Materials"},
+        "RIO.L": {"close_gbp": 55.0, "low_gbp": 54.0, "open_gbp": 54.5,
+                  "uk_equity_flag": "true", "sector": "Materials"},
+        "VUAG.L": {"close_gbp": 80.0, "low_gbp": 79.0, "open_gbp": 79.5,
+                   "uk_equity_flag": "false", "sector": "ETF"},
+    }
+
+
+def test_ledger_round_trip_is_lossless(positions):
+    positions["positions"].append({"quantity": 1.0, "ticker": "OLD.L", "avg_cost_gbp": 2.0})
+    ledger = portfolio.Ledger.from_dict(positions)
+    assert json.dumps(ledger.to_dict()) == json.dumps(positions)
+    assert list(ledger.positions) == ["GLEN.L", "RIO.L", "OLD.L"]
+
+
+def test_ledger_merges_duplicate_tickers(positions, caplog):
+    positions["positions"].append({
+        "ticker": "GLEN.L", "quantity": 30.0, "avg_cost_gbp": 7.0, "market_value_gbp": 180.0,
+        "unrealised_pnl_gbp": 0.0, "sector": "Materials", "entry_date": "2026-07-01",
+        "days_held": 51, "current_stop_gbp": 6.0, "status": "ACTIVE",
+    })
+    with caplog.at_level(logging.WARNING):
+        ledger = portfolio.Ledger.from_dict(positions)
+
+    assert "GLEN.L more than once" in caplog.text
+    assert len(ledger) == 2
+    glen = ledger.get("GLEN.L")
+    assert glen.quantity == 40.0
+    assert glen.avg_cost_gbp == 6.5
+    assert glen.market_value_gbp == 230.0
+    assert glen.entry_date == "2026-07-01"
+    assert glen.current_stop_gbp == 4.5
+
+
+def test_mark_to_market_and_equity(positions, market_data):
+    del market_data["RIO.L"]
+    portfolio.compute_position_metrics(positions, market_data)
+    glen, rio = positions["positions"]
+    assert glen["market_value_gbp"] == 60.0
+    assert glen["unrealised_pnl_gbp"] == 10.0
+    assert glen["days_held"] == 20
+    assert rio["market_value_gbp"] == 100.0  # no market data: last value kept
+
+    portfolio.update_equity_and_drawdown(positions, market_data)
+    assert positions["equity_value_gbp"] == 1160.0
+    assert positions["portfolio_peak_equity_gbp"] == 1200.0
+
+
+def test_buy_deducts_cost_with_stamp_duty(positions, market_data, config):
+    portfolio.apply_paper_trades(positions, orders("VUAG.L,BUY,MKT,2,,", "GLEN.L,BUY,MKT,10,,"),
+                                 market_data, config)
+
+    etf_cost = 80.0 * 1.001 * 2
+    glen_fill = 6.0 * 1.001
+    glen_cost = glen_fill * 10 * 1.005
+    assert positions["cash_balance_gbp"] == round(round(1000.0 - etf_cost, 4) - glen_cost, 4)
+
+    glen, _, etf = positions["positions"]
+    assert etf == {
+        "ticker": "VUAG.L", "quantity": 2.0, "avg_cost_gbp": round(80.0 * 1.001, 4),
+        "market_value_gbp": round(etf_cost, 4), "unrealised_pnl_gbp": 0.0, "sector": "ETF",
+        "entry_date": "2026-08-21", "days_held": 0, "current_stop_gbp": None,
+        "status": "ACTIVE",
+    }
+    assert glen["quantity"] == 20.0
+    assert glen["avg_cost_gbp"] == round((5.0 * 10 + glen_fill * 10) / 20, 4)
+    assert glen["entry_date"] == "2026-08-01"
+
+
+def test_buy_without_enough_cash_is_skipped(positions, market_data, config):
+    before = json.dumps(positions)
+    portfolio.apply_paper_trades(positions, orders("RIO.L,BUY,MKT,100,,"), market_data, config)
+    assert json.dumps(positions) == before
+
+
+def test_sell_queues_proceeds(positions, market_data, config):
+    config["fee_model"] = {"type": "bps", "value": 10}
+    portfolio.apply_paper_trades(positions, orders("GLEN.L,SELL,MKT,4,,", "RIO.L,SELL,MKT,5,,"),
+                                 market_data, config)
+
+    glen_notional = 6.0 * 0.999 * 4
+    rio_notional = 55.0 * 0.999 * 2  # capped at the 2 held
+    proceeds = glen_notional * 0.999 + rio_notional * 0.999
+    assert positions["cash_balance_gbp"] == 1000.0
+    assert positions["unsettled_sell_proceeds_gbp"] == round(proceeds, 4)
+    assert positions["settlement_due_date"] == "2026-08-24"
+    assert positions["settlement_queue"] == [["2026-08-24", round(proceeds, 4)]]
+    assert [p["ticker"] for p in positions["positions"]] == ["GLEN.L"]
+    assert positions["positions"][0]["quantity"] == 6.0
+    assert positions["positions"][0]["market_value_gbp"] == 30.0
+
+
+def test_sell_of_unheld_ticker_is_skipped(positions, market_data, config):
+    before = json.dumps(positions)
+    portfolio.apply_paper_trades(positions, orders("VUAG.L,SELL,MKT,1,,"), market_data, config)
+    assert json.dumps(positions) == before
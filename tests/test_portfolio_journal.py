@@ -0,0 +1,128 @@
+import copy
+import json
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import portfolio
+import portfolio_journal
+
+TICKERS = ["GLEN.L", "RIO.L", "VUAG.L", "BARC.L"]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return tmp_path / "journal.jsonl", tmp_path / "snapshots.jsonl"
+
+
+def open_journal(paths, positions, snapshot_every=portfolio_journal.SNAPSHOT_EVERY):
+    return portfolio_journal.Journal(*paths, snapshot_every=snapshot_every).open(positions)
+
+
+def simulate_day(day, pos, journal, rng, config):
+    """One run of bot.run's portfolio steps, journaled."""
+    market_data = {t: {"close_gbp": round(rng.uniform(1, 60), 3), "sector": "S",
+                       "uk_equity_flag": "true"} for t in TICKERS}
+    portfolio.settle_proceeds(pos, day, journal)
+    portfolio.compute_position_metrics(pos, market_data)
+    portfolio.update_equity_and_drawdown(pos, market_data)
+    pos["as_of_date"] = day.isoformat()
+    journal.record(day, "mark", pos)
+
+    rows = ["ticker,side,order_type,quantity,limit_price_gbp,stop_price_gbp"] + [
+        f"{rng.choice(TICKERS)},{rng.choice(['BUY', 'SELL'])},MKT,{round(rng.uniform(0.1, 3), 3)},,"
+        for _ in range(rng.randint(0, 4))
+    ]
+    portfolio.apply_paper_trades(pos, "\n".join(rows) + "\n", market_data, config, journal)
+    portfolio.update_equity_and_drawdown(pos, market_data)
+    journal.record(day, "mark", pos)
+
+    if pos["positions"]:
+        pos["positions"][0]["current_stop_gbp"] = round(rng.uniform(1, 5), 2)
+        journal.record(day, "stop", pos, stops={})
+    journal.checkpoint(pos)
+
+
+def test_replay_matches_saved_state_every_day(paths, positions, config):
+    rng = random.Random(3)
+    saved = {}
+    day = date(2026, 8, 21)
+    for i in range(30):
+        day += timedelta(days=1)
+        journal = open_journal(paths, positions, snapshot_every=7)
+        simulate_day(day, positions, journal, rng, config)
+        if i == 15:
+            positions["manual"] = "edit"  # out-of-band edit: next open snapshots it
+        saved[day.isoformat()] = json.dumps(positions)
+
+    for as_of, state in saved.items():
+        assert json.dumps(portfolio_journal.replay(as_of, *paths)) == state, as_of
+    assert json.dumps(portfolio_journal.replay(None, *paths)) == state
+    assert portfolio_journal.replay("2026-08-01", *paths) is None
+
+
+def test_fills_are_journaled_with_their_changes(paths, positions, config):
+    journal = open_journal(paths, positions)
+    market_data = {"GLEN.L": {"close_gbp": 6.0, "uk_equity_flag": "true"},
+                   "RIO.L": {"close_gbp": 55.0}}
+    portfolio.apply_paper_trades(
+        positions,
+        "ticker,side,quantity\nGLEN.L,BUY,1\nRIO.L,SELL,2\n",
+        market_data, config, journal,
+    )
+
+    events = [json.loads(line) for line in paths[0].read_text().splitlines()]
+    assert [e["type"] for e in events] == ["fill", "fill", "settlement_due"]
+    buy, sell, due = events
+    assert buy["set"] == {"cash_balance_gbp": positions["cash_balance_gbp"]}
+    assert buy["positions"]["GLEN.L"] == positions["positions"][0]
+    assert sell["positions"] == {"RIO.L": None}
+    assert due["set"]["settlement_queue"] == positions["settlement_queue"]
+    assert json.dumps(portfolio_journal.replay(None, *paths)) == json.dumps(positions)
+
+
+def test_failed_apply_leaves_positions_and_journal_untouched(paths, positions, config):
+    journal = open_journal(paths, positions)
+    before = copy.deepcopy(positions)
+
+    class Flaky(dict):
+        def get(self, key, default=None):
+            if key == "RIO.L":
+                raise KeyError(key)
+            return super().get(key, default)
+
+    market_data = Flaky({"GLEN.L": {"close_gbp": 6.0}, "RIO.L": {"close_gbp": 55.0}})
+    with pytest.raises(KeyError):
+        portfolio.apply_paper_trades(positions, "ticker,side,quantity\nGLEN.L,BUY,1\nRIO.L,SELL,1\n",
+                                     market_data, config, journal)
+
+    assert positions == before
+    assert paths[0].read_text() == ""
+
+
+def test_malformed_orders_are_skipped_one_at_a_time(positions, config):
+    market_data = {"GLEN.L": {"close_gbp": 6.0}, "RIO.L": {"close_gbp": 55.0}}
+    portfolio.apply_paper_trades(
+        positions,
+        "ticker,side,order_type,quantity,stop_price_gbp\n"
+        "GLEN.L,BUY,MKT,abc,\n"
+        "GLEN.L,HOLD,MKT,1,\n"
+        "GLEN.L,BUY,MKT,-1,\n"
+        "RIO.L,SELL,STOP,1,not-a-price\n"
+        "GLEN.L,BUY,MKT,nan,\n"
+        "RIO.L,SELL,MKT,1,\n",
+        market_data, config,
+    )
+    assert [p["quantity"] for p in positions["positions"]] == [10.0, 1.0]
+    assert positions["unsettled_sell_proceeds_gbp"] == round(55.0 * 0.999, 4)
+
+
+def test_open_snapshots_a_state_the_journal_does_not_know(paths, positions):
+    open_journal(paths, positions)
+    positions["cash_balance_gbp"] = 5.0
+    open_journal(paths, positions)
+
+    snapshots = portfolio_journal.load_snapshots(paths[1])
+    assert len(snapshots) == 2
+    assert portfolio_journal.replay(None, *paths)["cash_balance_gbp"] == 5.0
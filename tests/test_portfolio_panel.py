@@ -0,0 +1,93 @@
+import copy
+import json
+import random
+from datetime import date
+
+import numpy as np
+import pytest
+
+import portfolio
+import portfolio_panel
+
+TICKERS = [f"T{i}.L" for i in range(12)]
+
+
+def random_portfolio(rng):
+    held = rng.sample(TICKERS, rng.randint(0, 8))
+    positions = []
+    for sym in held:
+        p = {"ticker": sym, "quantity": round(rng.uniform(0.001, 50), rng.choice([0, 3, 6])),
+             "avg_cost_gbp": round(rng.uniform(0.5, 200), 4),
+             "market_value_gbp": round(rng.uniform(0, 500), 4),
+             "unrealised_pnl_gbp": round(rng.uniform(-50, 50), 4)}
+        if rng.random() < 0.8:
+            p["entry_date"] = f"2026-0{rng.randint(1, 8)}-1{rng.randint(0, 9)}"
+        if rng.random() < 0.5:
+            p["days_held"] = rng.randint(0, 200)
+        positions.append(p)
+    pf = {"as_of_date": "2026-08-21", "cash_balance_gbp": round(rng.uniform(0, 1000), 4),
+          "unsettled_sell_proceeds_gbp": round(rng.choice([0, rng.uniform(0, 100)]), 4),
+          "positions": positions}
+    if rng.random() < 0.8:
+        pf["portfolio_peak_equity_gbp"] = round(rng.uniform(0, 3000), 2)
+    return pf
+
+
+def random_market_data(rng):
+    return {sym: {"close_gbp": round(rng.uniform(0.5, 200), rng.choice([2, 3, 4]))}
+            for sym in TICKERS if rng.random() < 0.85}
+
+
+def scalar(pf, market_data):
+    pf = copy.deepcopy(pf)
+    portfolio.compute_position_metrics(pf, market_data)
+    return portfolio.update_equity_and_drawdown(pf, market_data)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_single_portfolio_matches_scalar_functions(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        pf, market_data = random_portfolio(rng), random_market_data(rng)
+        expected = scalar(pf, market_data)
+        got = portfolio_panel.mark_portfolios([pf], market_data, date(2026, 8, 21))[0]
+        assert json.dumps(got) == json.dumps(expected)
+
+
+def test_many_portfolios_match_scalar_functions():
+    rng = random.Random(42)
+    for _ in range(50):
+        pfs = [random_portfolio(rng) for _ in range(rng.randint(2, 10))]
+        market_data = random_market_data(rng)
+        expected = [scalar(pf, market_data) for pf in pfs]
+        got = portfolio_panel.mark_portfolios(pfs, market_data, date(2026, 8, 21))
+        assert [json.dumps(pf) for pf in got] == [json.dumps(pf) for pf in expected]
+
+
+def test_scenario_matrix_marks_each_row_at_its_prices():
+    rng = random.Random(7)
+    pf = random_portfolio(rng)
+    while not pf["positions"]:
+        pf = random_portfolio(rng)
+    scenarios = [random_market_data(rng) | {p["ticker"]: {"close_gbp": rng.uniform(1, 9)}
+                                            for p in pf["positions"]} for _ in range(4)]
+
+    book = portfolio_panel.build_book([copy.deepcopy(pf) for _ in scenarios])
+    prices = np.array([portfolio_panel.price_vector(book, md) for md in scenarios])
+    portfolio_panel.mark_to_market(book, prices, date(2026, 8, 21))
+    portfolio_panel.update_equity_and_drawdown(book)
+
+    for i, md in enumerate(scenarios):
+        assert book["equity"][i] == scalar(pf, md)["equity_value_gbp"]
+
+
+def test_round_like_python_matches_round_at_ties():
+    values = np.array([0.125, 2.675, 1.0005, 1234.56785, -0.125, 0.5, 1e-9, np.nan])
+    got = portfolio_panel.round_like_python(values, 2)
+    expected = [round(float(v), 2) for v in values]
+    np.testing.assert_array_equal(got, expected)
+
+    rng = np.random.default_rng(0)
+    values = np.round(rng.uniform(-1000, 1000, 10000), 5)
+    expected = [round(float(v), 4) for v in values]
+    assert portfolio_panel.round_like_python(values, 4).tolist() == expected
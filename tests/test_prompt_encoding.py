@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+import data_pipeline
+import decision_engine
+import prompt_encoding
+import providers
+
+REPO = Path(__file__).resolve().parent.parent
+UNIVERSE = (
+    "ticker,name,sector,instrument_type,currency,exchange,uk_equity_flag,status\n"
+    "AAA.L,Aaa,Energy,EQUITY,GBP,LSE,true,ACTIVE\n"
+    "BBB.L,Bbb,Materials,EQUITY,GBP,LSE,true,ACTIVE\n"
+    "CCC.L,Ccc,Financials,EQUITY,GBP,LSE,true,ACTIVE\n"
+    "DDD.L,Ddd,Tech,ETF,GBP,LSE,false,ACTIVE\n"
+    "EEE.L,Eee,Energy,FUND,GBP,LSE,false,ACTIVE\n"
+    "FFF.L,Fff,Materials,EQUITY,GBP,LSE,true,ACTIVE\n"
+    "GLEN.L,Glencore,Materials,EQUITY,GBP,LSE,true,ACTIVE\n"
+)
+# Fields the full encoding carries per row that compact mode moves to universe.csv
+UNIVERSE_FIELDS = {"sector", "instrument_type", "uk_equity_flag"}
+
+
+@pytest.fixture
+def strategy():
+    with open(REPO / "config.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def base_dir(tmp_path, make_bars, positions):
+    frames = {sym: make_bars(260, seed=i, end="2026-08-21")
+              for i, sym in enumerate(["AAA.L", "BBB.L", "CCC.L", "DDD.L", "EEE.L", "FFF.L",
+                                       "GLEN.L"])}
+    frames["BBB.L"]["Volume"] = 10.0  # illiquid
+    frames["CCC.L"][["Open", "High", "Low", "Close"]] /= 200  # below min_price_gbp
+    frames["GLEN.L"]["Volume"] = 10.0  # illiquid, but held
+    providers.write_fixtures(frames, tmp_path / "fixtures")
+    (tmp_path / "universe.csv").write_text(UNIVERSE)
+    data_pipeline.build_market_data(
+        universe_path=str(tmp_path / "universe.csv"),
+        output_path=str(tmp_path / "data" / "market_data.csv"),
+        provider=providers.ReplayProvider(tmp_path / "fixtures"),
+    )
+    (tmp_path / "data" / "trading_calendar.json").write_text('{"is_trading_day": true}')
+    (tmp_path / "positions.json").write_text(json.dumps(positions))
+    return tmp_path
+
+
+def read_csv(text):
+    return {row["ticker"]: row for row in csv.DictReader(io.StringIO(text))}
+
+
+def test_compact_keeps_every_eligible_ticker(base_dir, strategy):
+    inputs = decision_engine.read_inputs(base_dir)
+    full = read_csv(inputs["market_data_csv"])
+    market_csv, _, _, _, prefilter_json = decision_engine.compact_inputs(
+        strategy, base_dir, inputs["positions_json"], inputs["universe_csv"],
+        inputs["trading_cal_json"])
+    compact = read_csv(market_csv)
+    excluded = json.loads(prefilter_json)
+
+    assert set(compact) == {"AAA.L", "DDD.L", "FFF.L", "GLEN.L"}
+    assert set(excluded) == {"BBB.L", "CCC.L", "EEE.L"}
+    assert excluded["EEE.L"] == "instrument_type FUND not allowed"
+    assert set(compact) | set(excluded) == set(full)
+
+
+def test_compact_rows_match_the_full_encoding(base_dir, strategy):
+    inputs = decision_engine.read_inputs(base_dir)
+    full = read_csv(inputs["market_data_csv"])
+    market_csv = decision_engine.compact_inputs(
+        strategy, base_dir, inputs["positions_json"], inputs["universe_csv"],
+        inputs["trading_cal_json"])[0]
+
+    for sym, row in read_csv(market_csv).items():
+        for field, decimals in prompt_encoding.MARKET_DATA_PRECISION.items():
+            original = full[sym][field]
+            if decimals is None or original == "":
+                assert row[field] == original, (sym, field)
+            else:
+                tolerance = 0.5 * 10 ** -decimals + 1e-9  # ties may round either way
+                assert float(row[field]) == pytest.approx(float(original), abs=tolerance), (
+                    sym, field)
+
+
+def test_compact_keeps_the_fields_the_prompt_reads():
+    prompt = decision_engine.load_system_prompt()
+    named = {f for f in data_pipeline.MARKET_DATA_FIELDS if re.search(rf"\b{f}\b", prompt)}
+    assert named - UNIVERSE_FIELDS <= set(prompt_encoding.MARKET_DATA_PRECISION)
+    assert UNIVERSE_FIELDS <= set(prompt_encoding.UNIVERSE_COLUMNS)
+
+
+def test_compact_uses_the_table_it_is_given(base_dir, strategy):
+    inputs = decision_engine.read_inputs(base_dir)
+    market_data = data_pipeline.load_market_data(base_dir / "data" / "market_data.csv")
+    expected = decision_engine.compact_inputs(
+        strategy, base_dir, inputs["positions_json"], inputs["universe_csv"],
+        inputs["trading_cal_json"])
+    for path in (base_dir / "data").glob("market_data.*"):
+        path.unlink()
+
+    assert decision_engine.compact_inputs(
+        strategy, base_dir, inputs["positions_json"], inputs["universe_csv"],
+        inputs["trading_cal_json"], market_data) == expected
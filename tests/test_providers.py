@@ -0,0 +1,99 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import bar_store
+import providers
+
+AS_OF = date(2026, 8, 21)
+
+
+@pytest.fixture
+def frames(make_bars):
+    return {"AAA.L": make_bars(400, seed=1, end="2026-10-16"),
+            "BBB.L": make_bars(400, seed=2, end="2026-10-16")}
+
+
+@pytest.fixture
+def fixture_dir(tmp_path, frames):
+    providers.write_fixtures(frames, tmp_path, currencies={"AAA.L": "GBp", "BBB.L": "GBP"})
+    return tmp_path
+
+
+def test_csv_fixtures_load_as_written(fixture_dir, frames):
+    replay = providers.ReplayProvider(fixture_dir)
+    got = replay.history("AAA.L")
+    pd.testing.assert_frame_equal(got, bar_store.normalize_bars(frames["AAA.L"]),
+                                  check_freq=False)
+    assert replay.currency("AAA.L") == "GBp"
+    assert replay.currency("ZZZ.L") is None
+
+
+def test_parquet_fixtures_load_like_csv(tmp_path, fixture_dir, frames):
+    pytest.importorskip("pyarrow")
+    parquet_dir = tmp_path / "parquet"
+    parquet_dir.mkdir()
+    bar_store.normalize_bars(frames["AAA.L"]).to_parquet(parquet_dir / "AAA.L.parquet")
+
+    from_parquet = providers.ReplayProvider(parquet_dir).history("AAA.L")
+    from_csv = providers.ReplayProvider(fixture_dir).history("AAA.L")
+    pd.testing.assert_frame_equal(from_parquet, from_csv, check_freq=False)
+
+
+def test_missing_tickers_are_empty_or_absent(fixture_dir):
+    replay = providers.ReplayProvider(fixture_dir)
+    assert replay.history("ZZZ.L").empty
+    assert list(replay.download(["AAA.L", "ZZZ.L"], period="1y")) == ["AAA.L"]
+
+
+@pytest.mark.parametrize("window", [{}, {"period": "1y"}, {"period": "max"},
+                                    {"start": "2026-08-01"}, {"start": "2026-09-01"}])
+def test_nothing_after_as_of_is_served(fixture_dir, window):
+    replay = providers.ReplayProvider(fixture_dir, as_of=AS_OF.isoformat())
+    frames = [replay.history("AAA.L", **window), *replay.download(["AAA.L", "BBB.L"],
+                                                                  **window).values()]
+    for df in frames:
+        assert df.empty or df.index[-1].date() <= AS_OF
+    if window.get("start") != "2026-09-01":
+        assert all(df.index[-1].date() == AS_OF for df in frames)
+
+
+def test_periods_are_measured_back_from_as_of(fixture_dir):
+    replay = providers.ReplayProvider(fixture_dir, as_of=AS_OF)
+    df = replay.history("AAA.L", period="1mo")
+    assert df.index[-1].date() == AS_OF
+    assert df.index[0].date() >= date(2026, 7, 21)
+
+
+def test_injected_latency_is_added_to_every_request(fixture_dir, monkeypatch):
+    slept = []
+    monkeypatch.setattr(providers.time, "sleep", slept.append)
+    replay = providers.ReplayProvider(fixture_dir, latency_sec=0.25)
+    replay.download(["AAA.L", "BBB.L"], period="1y")
+    replay.history("AAA.L")
+    replay.currency("AAA.L")
+    assert slept == [0.25, 0.25, 0.25]
+
+
+def test_injected_failures_are_seeded(fixture_dir):
+    def outcomes(seed):
+        replay = providers.ReplayProvider(fixture_dir, failure_rate=0.5, seed=seed)
+        results = []
+        for _ in range(40):
+            try:
+                replay.history("AAA.L")
+                results.append(True)
+            except providers.ProviderError:
+                results.append(False)
+        return results
+
+    first = outcomes(seed=7)
+    assert first == outcomes(seed=7)
+    assert 5 < first.count(False) < 35
+
+    always = providers.ReplayProvider(fixture_dir, failure_rate=1.0)
+    for call in (lambda: always.download(["AAA.L"]), lambda: always.history("AAA.L"),
+                 lambda: always.currency("AAA.L")):
+        with pytest.raises(providers.ProviderError):
+            call()
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limit
+
+
+class FakeClock:
+    """Stands in for the time module: sleep advances monotonic()."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit, "time",
+                        SimpleNamespace(monotonic=fake.monotonic, sleep=fake.sleep))
+    return fake
+
+
+def test_burst_is_served_then_tokens_refill_at_rate(clock):
+    bucket = rate_limit.TokenBucket(rate=2.0, burst=3)
+    for _ in range(3):
+        assert bucket.acquire()
+    assert clock.slept == []
+
+    assert bucket.acquire()
+    assert clock.slept == [pytest.approx(0.5)]
+
+    clock.now += 10  # idle: refills only up to the burst size
+    for _ in range(3):
+        assert bucket.acquire()
+    assert len(clock.slept) == 1
+
+
+def test_acquire_gives_up_when_the_deadline_would_pass(clock):
+    bucket = rate_limit.TokenBucket(rate=1.0)
+    assert bucket.acquire(deadline=clock.now + 0.5)
+    assert not bucket.acquire(deadline=clock.now + 0.5)
+    assert clock.slept == []
+    assert bucket.acquire(deadline=clock.now + 2)
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+@pytest.mark.parametrize("attempt, ceiling", [(0, 1.0), (1, 2.0), (3, 8.0), (10, 30.0)])
+def test_backoff_is_jittered_under_an_exponential_cap(attempt, ceiling):
+    delays = [rate_limit.backoff_delay(attempt, base=1.0, cap=30.0) for _ in range(200)]
+    assert all(0 <= d <= ceiling for d in delays)
+    assert max(delays) > ceiling / 2
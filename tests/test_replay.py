@@ -0,0 +1,72 @@
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+import bar_store
+import bot
+import data_pipeline
+import providers
+
+AS_OF = date(2026, 8, 21)
+UNIVERSE = (
+    "ticker,name,sector,instrument_type,currency,exchange,uk_equity_flag,status\n"
+    "AAA.L,Aaa,Energy,EQUITY,GBP,LSE,true,ACTIVE\n"
+    "BBB.L,Bbb,Materials,ETF,GBP,LSE,false,ACTIVE\n"
+)
+
+
+@pytest.fixture
+def fixture_dir(tmp_path, make_bars):
+    frames = {"AAA.L": make_bars(400, seed=1, end="2026-10-16"),
+              "BBB.L": make_bars(400, seed=2, end="2026-10-16")}
+    providers.write_fixtures(frames, tmp_path / "fixtures",
+                             currencies={"AAA.L": "GBp", "BBB.L": "GBP"})
+    (tmp_path / "universe.csv").write_text(UNIVERSE)
+    return tmp_path / "fixtures"
+
+
+def build(tmp_path, store, provider, as_of=None):
+    return data_pipeline.build_market_data(
+        universe_path=str(tmp_path / "universe.csv"),
+        output_path=str(tmp_path / "out" / "market_data.csv"),
+        store_dir=str(store / "bars"),
+        currency_cache_path=str(store / "currency_cache.json"),
+        indicator_state_path=str(store / "indicator_state.json"),
+        provider=provider, as_of=as_of,
+    )
+
+
+@pytest.mark.parametrize("incremental", [True, False])
+def test_replay_never_sees_bars_after_as_of(tmp_path, fixture_dir, incremental):
+    store = tmp_path / "data"
+    # A store already filled by a later live run
+    build(tmp_path, store, providers.ReplayProvider(fixture_dir))
+    assert bar_store.load_arrays(store / "bars", "AAA.L")["day"][-1] == date(2026, 10, 16).toordinal()
+
+    replay = providers.ReplayProvider(fixture_dir, as_of=AS_OF)
+    if incremental:
+        market_data = build(tmp_path, store, replay, as_of=AS_OF)
+    else:
+        market_data = data_pipeline.build_market_data(
+            universe_path=str(tmp_path / "universe.csv"),
+            output_path=str(tmp_path / "out" / "market_data.csv"),
+            store_dir=str(store / "bars"), provider=replay, as_of=AS_OF,
+        )
+
+    assert set(market_data) == {"AAA.L", "BBB.L"}
+    assert max(row["date"] for row in market_data.values()) == AS_OF.isoformat()
+
+    # Same indicators as a replay into an empty store
+    fresh = build(tmp_path, tmp_path / "fresh", replay, as_of=AS_OF)
+    for sym, row in fresh.items():
+        assert market_data[sym] == pytest.approx(row)
+
+
+def test_replay_runs_use_their_own_store(tmp_path, fixture_dir):
+    data_dir = tmp_path / "data"
+    replay = providers.ReplayProvider(fixture_dir, as_of=AS_OF)
+    assert bot.market_store_dir(data_dir, replay) == data_dir / "replay"
+    assert bot.market_store_dir(data_dir, None) == data_dir
+    assert bot.market_store_dir(data_dir, providers.YahooProvider.__new__(
+        providers.YahooProvider)) == Path(data_dir)
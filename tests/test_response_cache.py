@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+import decision_engine
+import response_cache
+
+RESPONSE = ('=== run_status.json ===\n{"status": "NO_TRADES", "as_of_date": "2026-08-21", '
+            '"reason": "quiet"}\n')
+
+
+@pytest.fixture
+def base_dir(tmp_path, positions):
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "market_data.csv").write_text("date,ticker,close_gbp\n"
+                                                       "2026-08-21,GLEN.L,5.2\n")
+    (tmp_path / "data" / "trading_calendar.json").write_text('{"is_trading_day": true}')
+    (tmp_path / "positions.json").write_text(json.dumps(positions))
+    (tmp_path / "universe.csv").write_text("ticker,sector,status\nGLEN.L,Materials,ACTIVE\n")
+    return tmp_path
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Claude calls made, as (model, user message text)."""
+    made = []
+
+    def call_claude(system_prompt, user_message, config, **kwargs):
+        made.append((config["claude_model"], decision_engine.message_text(user_message)))
+        return RESPONSE
+
+    monkeypatch.setattr(decision_engine, "call_claude", call_claude)
+    return made
+
+
+def decide(base_dir, model="model-a", cache_mode="replay"):
+    config = {"strategy_profile": "balanced", "claude_model": model, "claude_max_tokens": 100}
+    text, _ = decision_engine._decide(config, base_dir, cache_mode, "full", False, True,
+                                      "sections")
+    return text
+
+
+def test_identical_inputs_hit_the_cache(base_dir, calls):
+    assert decide(base_dir) == RESPONSE
+    assert decide(base_dir) == RESPONSE
+    assert len(calls) == 1
+    assert len(list((base_dir / "data" / "response_cache").glob("*.json"))) == 1
+
+
+@pytest.mark.parametrize("change", ["model", "system_prompt", "market_data", "positions"])
+def test_changed_inputs_miss(base_dir, calls, monkeypatch, change):
+    decide(base_dir)
+    model = "model-a"
+    if change == "model":
+        model = "model-b"
+    elif change == "system_prompt":
+        prompt = decision_engine.load_system_prompt()
+        monkeypatch.setattr(decision_engine, "load_system_prompt", lambda: prompt + "\nv2")
+    elif change == "market_data":
+        (base_dir / "data" / "market_data.csv").write_text("date,ticker,close_gbp\n"
+                                                           "2026-08-21,GLEN.L,5.3\n")
+    else:
+        positions = json.loads((base_dir / "positions.json").read_text())
+        positions["cash_balance_gbp"] -= 1
+        (base_dir / "positions.json").write_text(json.dumps(positions))
+
+    decide(base_dir, model)
+    assert len(calls) == 2
+    decide(base_dir, model)
+    assert len(calls) == 2  # the new inputs are cached in turn
+
+
+def test_refresh_calls_and_overwrites_bypass_leaves_the_cache(base_dir, calls):
+    decide(base_dir, cache_mode="bypass")
+    assert not (base_dir / "data" / "response_cache").exists()
+    decide(base_dir, cache_mode="refresh")
+    decide(base_dir, cache_mode="refresh")
+    assert len(calls) == 3
+    decide(base_dir)
+    assert len(calls) == 3
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    key = response_cache.cache_key("system", "user", "model", 100)
+    response_cache.store(tmp_path, key, RESPONSE, "model")
+    assert response_cache.load(tmp_path, key) == RESPONSE
+
+    (tmp_path / f"{key}.json").write_text("{truncated")
+    assert response_cache.load(tmp_path, key) is None
+    assert response_cache.load(tmp_path, "0" * 64) is None
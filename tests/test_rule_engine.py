@@ -0,0 +1,203 @@
+import copy
+import csv
+import io
+import json
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+import portfolio
+import rule_engine
+import stop_engine
+
+REPO = Path(__file__).resolve().parent.parent
+TODAY = date(2026, 8, 21)
+CALENDAR = {"is_trading_day": True, "is_half_day": False, "next_trading_day": "2026-08-24"}
+UNIVERSE = [
+    {"ticker": "GLEN.L", "sector": "Materials", "instrument_type": "EQUITY", "status": "ACTIVE"},
+    {"ticker": "RIO.L", "sector": "Materials", "instrument_type": "EQUITY", "status": "ACTIVE"},
+    {"ticker": "AAA.L", "sector": "Energy", "instrument_type": "EQUITY", "status": "ACTIVE"},
+]
+
+
+def row(close, **fields):
+    """A liquid, trend-passing market data row with no entry trigger."""
+    return {"close_gbp": close, "low_gbp": close * 0.98, "open_gbp": close * 0.99,
+            "sma50_gbp": close * 0.95, "sma200_gbp": close * 0.9, "sma50_slope": "positive",
+            "atr14_gbp": close * 0.02, "high_20d_gbp": close * 1.15,
+            "avg_gbp_volume_20d": 1e6, "drawdown_from_20d_high_pct": 0.13,
+            "volume_ratio_20d": 1.0, "consecutive_days_below_sma50": 0,
+            "uk_equity_flag": "true", **fields}
+
+
+@pytest.fixture
+def strategy():
+    with open(REPO / "config.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def book(positions):
+    for p in positions["positions"]:
+        p["unrealised_pnl_gbp"] = 2.0  # no time-stop review
+    return positions
+
+
+@pytest.fixture
+def market_data():
+    return {"GLEN.L": row(5.2), "RIO.L": row(52.0), "AAA.L": row(20.0)}
+
+
+def orders_of(outputs):
+    return list(csv.DictReader(io.StringIO(outputs["orders_csv"])))
+
+
+def test_quiet_day_is_decided_without_claude(strategy, market_data, book):
+    outputs = rule_engine.decide(strategy, market_data, book, UNIVERSE, CALENDAR)
+
+    assert outputs["run_status"]["status"] == "NO_TRADES"
+    assert outputs["run_status"]["decided_by"] == "rule_engine"
+    assert outputs["orders_csv"] == ""
+    assert [d["action"] for d in outputs["trade_plan"]["decisions"]] == ["HOLD", "HOLD"]
+    assert rule_engine.check_constraints(outputs, strategy, market_data, book, UNIVERSE) == []
+
+
+def test_drawdown_over_the_limit_liquidates_everything(strategy, market_data, book):
+    book["equity_value_gbp"] = 900.0  # 25% below the 1200 peak
+
+    outputs = rule_engine.decide(strategy, market_data, book, UNIVERSE, CALENDAR)
+
+    assert outputs["run_status"]["status"] == "OK"
+    assert outputs["run_status"]["data_checks"]["drawdown_limit_breached"] is True
+    orders = [(o["ticker"], o["side"], o["order_type"], o["reason"]) for o in orders_of(outputs)]
+    assert orders == [("GLEN.L", "SELL", "MKT", "DRAWDOWN_EXIT"),
+                      ("RIO.L", "SELL", "MKT", "DRAWDOWN_EXIT")]
+    assert outputs["run_status"]["risk_checks"]["new_entries_blocked"] == "drawdown limit breached"
+
+
+def test_young_position_under_drawdown_goes_to_claude(strategy, market_data, book):
+    book["equity_value_gbp"] = 900.0
+    book["positions"][1]["days_held"] = 1
+
+    assessment = rule_engine.assess(strategy, market_data, book, UNIVERSE)
+    assert [e["ticker"] for e in assessment["exits"]] == ["GLEN.L"]
+    assert "RIO.L" in assessment["needs_claude"][0]
+    assert "min_position_age_days" in assessment["needs_claude"][0]
+    assert rule_engine.decide(strategy, market_data, book, UNIVERSE, CALENDAR) is None
+
+
+def test_young_position_is_not_exited_on_a_trend_break(strategy, market_data, book):
+    book["positions"][0]["days_held"] = 1
+    market_data["GLEN.L"]["consecutive_days_below_sma50"] = 5
+
+    outputs = rule_engine.decide(strategy, market_data, book, UNIVERSE, CALENDAR)
+    glen = outputs["trade_plan"]["decisions"][0]
+    assert (glen["ticker"], glen["action"]) == ("GLEN.L", "HOLD")
+    assert "min_position_age_days" in glen["rationale"][0]
+    assert outputs["orders_csv"] == ""
+
+
+def test_trend_break_defers_to_claude(strategy, market_data, book):
+    market_data["RIO.L"]["consecutive_days_below_sma50"] = 2
+
+    assessment = rule_engine.assess(strategy, market_data, book, UNIVERSE)
+    assert assessment["needs_claude"] == ["RIO.L: close below sma50 for 2 days (trend break)"]
+    assert rule_engine.decide(strategy, market_data, book, UNIVERSE, CALENDAR) is None
+
+
+def test_viable_candidate_defers_to_claude(strategy, market_data, book):
+    market_data["AAA.L"]["drawdown_from_20d_high_pct"] = 0.04  # balanced pullback
+
+    assessment = rule_engine.assess(strategy, market_data, book, UNIVERSE)
+    assert assessment["candidates"] == [{
+        "ticker": "AAA.L", "entry_type": "PULLBACK", "trend_status": "FULL",
+        "close_gbp": 20.0, "rejected_reason": None,
+    }]
+    assert assessment["needs_claude"] == ["entry candidates to judge"]
+    assert rule_engine.decide(strategy, market_data, book, UNIVERSE, CALENDAR) is None
+
+
+@pytest.mark.parametrize("block, expected", [
+    (lambda c, b, u: b.update(cash_balance_gbp=10.0), "no cash available after buffer"),
+    (lambda c, b, u: c.update(max_positions=2), "max_positions 2 reached"),
+    (lambda c, b, u: u[2].update(sector="Materials"), "Materials sector at max_sector"),
+])
+def test_blocked_buy_gate_is_no_trades(strategy, market_data, book, block, expected):
+    market_data["AAA.L"]["drawdown_from_20d_high_pct"] = 0.04
+    strategy["max_sector_exposure_pct"] = 0.10
+    universe = copy.deepcopy(UNIVERSE)
+    block(strategy, book, universe)
+
+    outputs = rule_engine.decide(strategy, market_data, book, universe, CALENDAR)
+
+    assert outputs["run_status"]["status"] == "NO_TRADES"
+    considered = outputs["trade_plan"]["candidates_considered"]
+    assert [c["ticker"] for c in considered] == ["AAA.L"]
+    assert considered[0]["rejected_reason"].startswith(expected)
+
+
+@pytest.mark.parametrize("open_", [4.7, 4.2])  # intraday hit, gap through the stop
+def test_stops_only_fills_like_the_stop_engine(strategy, market_data, book, open_):
+    market_data["GLEN.L"].update(low_gbp=4.1, open_gbp=open_)
+    outputs = rule_engine.manage_stops_only(strategy, market_data, book, UNIVERSE, CALENDAR,
+                                            "overloaded")
+
+    assert outputs["run_status"]["decided_by"] == "rule_engine_fallback"
+    assert outputs["run_status"]["reason"].startswith("Claude unavailable (overloaded).")
+    (order,) = orders_of(outputs)
+    assert (order["ticker"], order["order_type"], order["stop_price_gbp"]) == (
+        "GLEN.L", "STOP", "4.5")
+    entry = outputs["trade_log_update"]["entries"][0]
+    assert entry["planned_price_gbp"] == min(open_, 4.5)
+
+    exits = stop_engine.check_stops(book, market_data, strategy)
+    assert entry == stop_engine.trade_log_entry(exits, TODAY)["entries"][0]
+    via_rules, via_stops = copy.deepcopy(book), copy.deepcopy(book)
+    portfolio.apply_paper_trades(via_rules, outputs["orders_csv"], market_data, strategy)
+    portfolio.apply_paper_trades(via_stops, stop_engine.stop_orders_csv(exits, TODAY), market_data,
+                                 strategy)
+    assert via_rules["positions"] == via_stops["positions"]
+    assert via_rules["settlement_queue"] == via_stops["settlement_queue"]
+
+
+def test_stops_only_holds_positions_due_a_review(strategy, market_data, book):
+    market_data["AAA.L"]["drawdown_from_20d_high_pct"] = 0.04
+    market_data["RIO.L"]["consecutive_days_below_sma50"] = 3
+
+    outputs = rule_engine.manage_stops_only(strategy, market_data, book, UNIVERSE, CALENDAR,
+                                            "breaker open")
+    assert outputs["orders_csv"] == ""
+    rio = outputs["trade_plan"]["decisions"][1]
+    assert rio["action"] == "HOLD"
+    assert rio["rationale"][0].endswith("review deferred, Claude unavailable")
+    assert outputs["trade_plan"]["candidates_considered"][0]["rejected_reason"] == (
+        "Claude unavailable, managing stops only")
+
+
+def buy(ticker, quantity, stop=None):
+    return {
+        "run_status": {"status": "OK"},
+        "orders_csv": f"ticker,side,order_type,quantity\n{ticker},BUY,MKT,{quantity}\n",
+        "trade_plan": {"decisions": [{"ticker": ticker, "action": "BUY",
+                                      "stop": {"price_gbp": stop}}]},
+    }
+
+
+@pytest.mark.parametrize("outputs, violation", [
+    (buy("AAA.L", 5, stop=18.0), None),
+    (buy("AAA.L", 5), "AAA.L: BUY without a stop below the price"),
+    (buy("AAA.L", 100, stop=18.0), "BUY cost"),
+    (buy("AAA.L", 25, stop=18.0), "AAA.L: £"),  # 500 > 30% single-name cap
+    (buy("BBB.L", 1, stop=1.0), "BBB.L: BUY of a ticker not ACTIVE in the universe"),
+    ({"run_status": {"status": "NO_TRADES"},
+      "orders_csv": "ticker,side,quantity\nGLEN.L,SELL,1\n"}, "orders present with status"),
+    ({"run_status": {"status": "OK"},
+      "orders_csv": "ticker,side,quantity\nGLEN.L,SELL,11\n"}, "GLEN.L: SELL 11.0 exceeds"),
+])
+def test_check_constraints(strategy, market_data, book, outputs, violation):
+    violations = rule_engine.check_constraints(outputs, strategy, market_data, book, UNIVERSE)
+    if violation is None:
+        assert violations == []
+    else:
+        assert any(v.startswith(violation) for v in violations), violations
@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+
+import portfolio
+import trading_calendar
+
+
+@pytest.mark.parametrize("start, n, expected", [
+    (date(2026, 8, 20), 1, date(2026, 8, 21)),   # Thursday -> Friday
+    (date(2026, 8, 21), 1, date(2026, 8, 24)),   # Friday -> Monday
+    (date(2026, 8, 28), 1, date(2026, 9, 1)),    # over the summer bank holiday
+    (date(2026, 4, 2), 1, date(2026, 4, 7)),     # over Good Friday and Easter Monday
+    (date(2026, 8, 22), 1, date(2026, 8, 24)),   # from a Saturday
+    (date(2026, 8, 21), 2, date(2026, 8, 25)),
+    (date(2026, 8, 21), 0, date(2026, 8, 21)),
+])
+def test_add_trading_days(start, n, expected):
+    assert trading_calendar.add_trading_days(start, n) == expected
+
+
+def sell(positions, day, config, quantity=1.0):
+    positions["as_of_date"] = day.isoformat()
+    market_data = {"RIO.L": {"close_gbp": 50.0}}
+    portfolio.apply_paper_trades(positions, f"ticker,side,quantity\nRIO.L,SELL,{quantity}\n",
+                                 market_data, config)
+    return round(50.0 * 0.999 * quantity, 4)
+
+
+def test_proceeds_settle_on_their_own_trading_day(positions, config):
+    first = sell(positions, date(2026, 8, 27), config, 0.5)   # Thursday -> Friday 28th
+    second = sell(positions, date(2026, 8, 28), config, 1.0)  # Friday -> Tuesday 1st
+    assert positions["settlement_queue"] == [["2026-08-28", first], ["2026-09-01", second]]
+    assert positions["settlement_due_date"] == "2026-08-28"
+    assert positions["unsettled_sell_proceeds_gbp"] == round(first + second, 4)
+
+    portfolio.settle_proceeds(positions, date(2026, 8, 28))
+    assert positions["cash_balance_gbp"] == 1000.0 + first
+    assert positions["unsettled_sell_proceeds_gbp"] == second
+    assert positions["settlement_due_date"] == "2026-09-01"
+
+    portfolio.settle_proceeds(positions, date(2026, 8, 31))  # bank holiday: nothing due
+    assert positions["cash_balance_gbp"] == 1000.0 + first
+
+    portfolio.settle_proceeds(positions, date(2026, 9, 1))
+    assert positions["cash_balance_gbp"] == 1000.0 + first + second
+    assert positions["unsettled_sell_proceeds_gbp"] == 0.0
+    assert positions["settlement_due_date"] is None
+    assert positions["settlement_queue"] == []
+
+
+def test_overdue_entries_settle_together(positions, config):
+    first = sell(positions, date(2026, 8, 20), config, 0.5)
+    second = sell(positions, date(2026, 8, 21), config, 0.5)
+    pending = positions["unsettled_sell_proceeds_gbp"]
+    assert pending == pytest.approx(first + second)
+
+    portfolio.settle_proceeds(positions, date(2026, 8, 26))
+    assert positions["cash_balance_gbp"] == 1000.0 + pending
+    assert positions["unsettled_sell_proceeds_gbp"] == 0.0
+    assert positions["settlement_queue"] == []
+
+
+def test_legacy_fields_migrate_to_the_queue(positions):
+    positions["unsettled_sell_proceeds_gbp"] = 25.0
+    positions["settlement_due_date"] = "2026-08-24"
+    assert portfolio.settlement_queue(positions) == [["2026-08-24", 25.0]]
+
+    portfolio.settle_proceeds(positions, date(2026, 8, 21))
+    assert positions["cash_balance_gbp"] == 1000.0
+    assert "settlement_queue" not in positions
+
+    portfolio.settle_proceeds(positions, date(2026, 8, 24))
+    assert positions["cash_balance_gbp"] == 1025.0
+    assert positions["unsettled_sell_proceeds_gbp"] == 0.0
+    assert positions["settlement_due_date"] is None
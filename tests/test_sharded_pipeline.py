@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+import bar_store
+import indicator_panel
+import providers
+import sharded_pipeline
+
+LENGTHS = [15, 25, 60, 210, 260, 300]
+DIVISORS = {"T3.L": 100.0}
+
+
+@pytest.fixture
+def frames(make_bars):
+    return {f"T{i}.L": make_bars(n, seed=i, end="2026-08-21") for i, n in enumerate(LENGTHS)}
+
+
+def test_parallel_matches_the_single_process_panel(frames, tmp_path):
+    for sym, df in frames.items():
+        bar_store.save_bars(tmp_path, sym, df)
+    bars = {sym: bar_store.load_arrays(tmp_path, sym) for sym in frames}
+
+    parallel = sharded_pipeline.compute_parallel(bars, DIVISORS, workers=2)
+    assert parallel == indicator_panel.compute_panel_indicators(
+        indicator_panel.align_arrays(bars, DIVISORS))
+
+
+def test_sharded_build_matches_the_panel_to_float32_precision(frames, tmp_path):
+    providers.write_fixtures(frames, tmp_path / "fixtures")
+    (tmp_path / "universe.csv").write_text(
+        "ticker,name,sector,instrument_type,currency,exchange,uk_equity_flag,status\n"
+        + "".join(f"{sym},{sym},Energy,EQUITY,GBP,LSE,true,ACTIVE\n" for sym in frames))
+
+    market_data, stats = sharded_pipeline.build_market_data_sharded(
+        tmp_path / "universe.csv", tmp_path / "data" / "market_data.csv", tmp_path / "bars",
+        provider=providers.ReplayProvider(tmp_path / "fixtures"), shard_size=4, workers=2)
+    expected = indicator_panel.compute_panel_indicators(indicator_panel.align_panel(frames))
+
+    assert stats["shards"] == 2
+    assert set(market_data) == {sym for sym, row in expected.items() if row}
+    for sym, row in market_data.items():
+        for field, value in expected[sym].items():
+            if isinstance(value, float) and not math.isnan(value):
+                # The bar store keeps prices as float32
+                assert row[field] == pytest.approx(value, rel=1e-6, abs=1e-3), (sym, field)
+            else:
+                assert row[field] == value, (sym, field)
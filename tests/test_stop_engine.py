@@ -0,0 +1,79 @@
+import csv
+import io
+from datetime import date
+
+import pytest
+
+import portfolio
+import stop_engine
+
+TODAY = date(2026, 8, 21)
+
+
+def bar(low, open_, close=None):
+    return {"low_gbp": low, "open_gbp": open_, "close_gbp": close or max(low, open_) + 1}
+
+
+def test_untriggered_and_missing_data_do_not_exit(positions, config):
+    positions["positions"][1]["current_stop_gbp"] = None
+    market_data = {"GLEN.L": bar(4.6, 4.8)}  # RIO.L has no stop, and no bar either
+    assert stop_engine.check_stops(positions, market_data, config) == []
+
+
+def test_stop_hit_intraday_fills_at_the_stop(positions, config):
+    exits = stop_engine.check_stops(positions, {"GLEN.L": bar(4.4, 4.7)}, config)
+
+    assert len(exits) == 1
+    glen = exits[0]
+    assert glen["ticker"] == "GLEN.L"
+    assert glen["quantity"] == 10.0
+    assert glen["gapped"] is False
+    assert glen["fill_ref_gbp"] == 4.5
+
+
+@pytest.mark.parametrize("open_, beyond", [(4.2, False), (3.9, True)])
+def test_gap_through_stop_fills_at_the_open(positions, config, open_, beyond):
+    exits = stop_engine.check_stops(positions, {"GLEN.L": bar(3.8, open_)}, config)
+
+    glen = exits[0]
+    assert glen["gapped"] is True
+    assert glen["fill_ref_gbp"] == open_
+    assert glen["beyond_buffer"] is beyond
+    assert ("beyond gap risk buffer" in glen["reason"]) is beyond
+
+
+def test_only_daily_check_mode_enforces_stops(positions, config):
+    config["stop_execution_mode"] = "BROKER_GTC"
+    assert stop_engine.check_stops(positions, {"GLEN.L": bar(4.0, 4.0)}, config) == []
+
+
+def test_stop_orders_fill_like_the_engine(positions, config):
+    market_data = {"GLEN.L": bar(4.4, 4.7, close=4.6), "RIO.L": bar(40.0, 42.0, close=44.0)}
+    exits = stop_engine.check_stops(positions, market_data, config)
+    orders_csv = stop_engine.stop_orders_csv(exits, TODAY)
+
+    rows = list(csv.DictReader(io.StringIO(orders_csv)))
+    assert [(r["order_id"], r["order_type"], r["stop_price_gbp"]) for r in rows] == [
+        ("20260821-S01", "STOP", "4.5"), ("20260821-S02", "STOP", "45.0"),
+    ]
+
+    portfolio.apply_paper_trades(positions, orders_csv, market_data, config)
+    assert positions["positions"] == []
+    expected = sum(e["fill_ref_gbp"] * 0.999 * e["quantity"] for e in exits)
+    assert positions["unsettled_sell_proceeds_gbp"] == round(expected, 4)
+
+
+def test_stop_order_not_reached_is_not_filled(positions, config):
+    orders_csv = stop_engine.stop_orders_csv(
+        [{"ticker": "GLEN.L", "quantity": 10.0, "stop_gbp": 4.5}], TODAY
+    )
+    portfolio.apply_paper_trades(positions, orders_csv, {"GLEN.L": bar(4.6, 4.8)}, config)
+    assert positions["positions"][0]["quantity"] == 10.0
+
+
+def test_trade_log_entry_records_the_fill_reference(positions, config):
+    exits = stop_engine.check_stops(positions, {"GLEN.L": bar(3.8, 4.2)}, config)
+    entry = stop_engine.trade_log_entry(exits, TODAY)
+    assert entry["as_of_date"] == "2026-08-21"
+    assert entry["entries"][0]["planned_price_gbp"] == 4.2
+    assert entry["entries"][0]["entry_type"] == "STOP_EXIT"
@@ -49,6 +49,21 @@ LSE_HALF_DAYS = {
 }
 
 
+def is_trading_day(day):
+    """True for LSE trading days (weekdays that are not bank holidays)."""
+    return day.weekday() < 5 and day not in UK_BANK_HOLIDAYS
+
+
+def add_trading_days(start, n):
+    """The nth trading day after start (start itself need not be one)."""
+    day = start
+    for _ in range(n):
+        day += timedelta(days=1)
+        while not is_trading_day(day):
+            day += timedelta(days=1)
+    return day
+
+
 def get_trading_calendar(as_of_date=None):
     """Return trading calendar info for the given date.
 
@@ -57,15 +72,8 @@ def get_trading_calendar(as_of_date=None):
     if as_of_date is None:
         as_of_date = date.today()
 
-    is_weekend = as_of_date.weekday() >= 5
-    is_holiday = as_of_date in UK_BANK_HOLIDAYS
-    is_trading_day = not is_weekend and not is_holiday
     is_half_day = as_of_date in LSE_HALF_DAYS
-
-    # Find next trading day
-    next_day = as_of_date + timedelta(days=1)
-    while next_day.weekday() >= 5 or next_day in UK_BANK_HOLIDAYS:
-        next_day += timedelta(days=1)
+    next_day = add_trading_days(as_of_date, 1)
 
     # Bank holidays in next 5 calendar days
     upcoming_holidays = []
@@ -76,7 +84,7 @@ def get_trading_calendar(as_of_date=None):
 
     return {
         "as_of_date": as_of_date.isoformat(),
-        "is_trading_day": is_trading_day,
+        "is_trading_day": is_trading_day(as_of_date),
         "is_half_day": is_half_day,
         "next_trading_day": next_day.isoformat(),
         "bank_holidays_next_5_days": upcoming_holidays,